@@ -2,6 +2,11 @@
 #include "modbus_port.h"
 #include <string.h>
 
+/* Enhanced mapping (Configuration Tool v2.0) is a mapping mode with generated lookup */
+#if defined(MODBUS_USE_ENHANCED_REGISTER_MAPPING) && !defined(MODBUS_USE_REGISTER_MAPPING)
+#define MODBUS_USE_REGISTER_MAPPING     (1)
+#endif
+
 /* Sử dụng mapping mode từ modbus_registers.h nếu có define */
 #ifdef MODBUS_USE_REGISTER_MAPPING
     /* Mapping mode: register data được define trong modbus_registers.c */
@@ -93,7 +98,15 @@ static inline bool get_bit(const uint8_t *array, uint16_t bit_pos) {
     return (array[bit_pos >> 3] & (1 << (bit_pos & 0x07))) != 0;
 }
 
-#ifdef MODBUS_USE_REGISTER_MAPPING
+#if defined(MODBUS_USE_ENHANCED_REGISTER_MAPPING)
+/**
+ * @brief   Get array index from internal address using generated lookup tables
+ * @note    Returns -1 if the address is not mapped, so it also validates the address
+ */
+static inline int16_t get_register_index(uint16_t addr, uint8_t reg_type) {
+    return (int16_t)modbus_get_register_index(addr, reg_type);
+}
+#elif defined(MODBUS_USE_REGISTER_MAPPING)
 /**
  * @brief   Get array index from internal address using mapping
  */
@@ -289,6 +302,25 @@ process_received_frame(modbus_rtu_ctx_t *ctx) {
                 return;
             }
 
+#if defined(MODBUS_USE_ENHANCED_REGISTER_MAPPING)
+            /* One run lookup validates the whole block, bits are then copied in place */
+            int32_t base = modbus_get_register_block(addr, count, reg_type);
+            if (base < 0) {
+                build_exception_response(ctx, MODBUS_EX_ILLEGAL_DATA_ADDRESS);
+                return;
+            }
+
+            const uint8_t *src = (reg_type == 0) ? g_coils : g_discrete_inputs;
+
+            ctx->tx_buffer[2] = byte_count;
+            ctx->tx_length = 3;
+            memset(&ctx->tx_buffer[3], 0, byte_count);
+
+            for (uint16_t i = 0; i < count; i++) {
+                if (get_bit(src, (uint16_t)(base + i)))
+                    ctx->tx_buffer[3 + (i >> 3)] |= (1 << (i & 0x07));
+            }
+#else
             for (uint16_t i = 0; i < count; i++) {
                 if (!modbus_is_register_valid(addr + i, reg_type)) {
                     build_exception_response(ctx, MODBUS_EX_ILLEGAL_DATA_ADDRESS);
@@ -298,6 +330,7 @@ process_received_frame(modbus_rtu_ctx_t *ctx) {
 
             ctx->tx_buffer[2] = byte_count;
             ctx->tx_length = 3;
+            memset(&ctx->tx_buffer[3], 0, byte_count);
 
             for (uint16_t i = 0; i < count; i++) {
                 bool value;
@@ -309,6 +342,7 @@ process_received_frame(modbus_rtu_ctx_t *ctx) {
                 if (value)
                     ctx->tx_buffer[3 + (i >> 3)] |= (1 << (i & 0x07));
             }
+#endif
             ctx->tx_length += byte_count;
             break;
         }
@@ -322,6 +356,23 @@ process_received_frame(modbus_rtu_ctx_t *ctx) {
                 return;
             }
 
+#if defined(MODBUS_USE_ENHANCED_REGISTER_MAPPING)
+            int32_t base = modbus_get_register_block(addr, count, reg_type);
+            if (base < 0) {
+                build_exception_response(ctx, MODBUS_EX_ILLEGAL_DATA_ADDRESS);
+                return;
+            }
+
+            const uint16_t *src = ((reg_type == 4) ? g_holding_registers : g_input_registers) + base;
+            uint8_t *dst = &ctx->tx_buffer[3];
+
+            ctx->tx_buffer[2] = count * 2;
+            for (uint16_t i = 0; i < count; i++) {
+                *dst++ = src[i] >> 8;
+                *dst++ = src[i] & 0xFF;
+            }
+            ctx->tx_length = 3 + count * 2;
+#else
             for (uint16_t i = 0; i < count; i++) {
                 if (!modbus_is_register_valid(addr + i, reg_type)) {
                     build_exception_response(ctx, MODBUS_EX_ILLEGAL_DATA_ADDRESS);
@@ -342,6 +393,7 @@ process_received_frame(modbus_rtu_ctx_t *ctx) {
                 ctx->tx_buffer[ctx->tx_length++] = value >> 8;
                 ctx->tx_buffer[ctx->tx_length++] = value & 0xFF;
             }
+#endif
             break;
         }
 
@@ -386,6 +438,17 @@ process_received_frame(modbus_rtu_ctx_t *ctx) {
                 return;
             }
 
+#if defined(MODBUS_USE_ENHANCED_REGISTER_MAPPING)
+            int32_t base = modbus_get_register_block(addr, count, 0);
+            if (base < 0) {
+                build_exception_response(ctx, MODBUS_EX_ILLEGAL_DATA_ADDRESS);
+                return;
+            }
+
+            for (uint16_t i = 0; i < count; i++) {
+                set_bit(g_coils, (uint16_t)(base + i), get_bit(&ctx->rx_buffer[7], i));
+            }
+#else
             for (uint16_t i = 0; i < count; i++) {
                 if (!modbus_is_register_valid(addr + i, 0)) {
                     build_exception_response(ctx, MODBUS_EX_ILLEGAL_DATA_ADDRESS);
@@ -397,6 +460,7 @@ process_received_frame(modbus_rtu_ctx_t *ctx) {
                 bool value = (ctx->rx_buffer[7 + (i >> 3)] & (1 << (i & 0x07))) != 0;
                 modbus_rtu_set_coil(addr + i, value);
             }
+#endif
 
             memcpy(&ctx->tx_buffer[2], &ctx->rx_buffer[2], 4);
             ctx->tx_length = 6;
@@ -411,6 +475,19 @@ process_received_frame(modbus_rtu_ctx_t *ctx) {
                 return;
             }
 
+#if defined(MODBUS_USE_ENHANCED_REGISTER_MAPPING)
+            int32_t base = modbus_get_register_block(addr, count, 4);
+            if (base < 0) {
+                build_exception_response(ctx, MODBUS_EX_ILLEGAL_DATA_ADDRESS);
+                return;
+            }
+
+            uint16_t *dst = &g_holding_registers[base];
+            const uint8_t *src = &ctx->rx_buffer[7];
+            for (uint16_t i = 0; i < count; i++, src += 2) {
+                dst[i] = (src[0] << 8) | src[1];
+            }
+#else
             for (uint16_t i = 0; i < count; i++) {
                 if (!modbus_is_register_valid(addr + i, 4)) {
                     build_exception_response(ctx, MODBUS_EX_ILLEGAL_DATA_ADDRESS);
@@ -422,6 +499,7 @@ process_received_frame(modbus_rtu_ctx_t *ctx) {
                 uint16_t value = (ctx->rx_buffer[7 + i * 2] << 8) | ctx->rx_buffer[8 + i * 2];
                 modbus_rtu_set_holding_register(addr + i, value);
             }
+#endif
 
             memcpy(&ctx->tx_buffer[2], &ctx->rx_buffer[2], 4);
             ctx->tx_length = 6;
@@ -465,13 +543,12 @@ send_response(modbus_rtu_ctx_t *ctx) {
 
 /* Data Access Functions */
 bool modbus_rtu_get_coil(uint16_t addr, bool *value) {
-    if (!modbus_is_register_valid(addr, 0)) return false;
-
 #ifdef MODBUS_USE_REGISTER_MAPPING
     int16_t idx = get_register_index(addr, 0);
     if (idx < 0) return false;
     *value = get_bit(g_coils, idx);
 #else
+    if (!modbus_is_register_valid(addr, 0)) return false;
     if (addr >= MODBUS_MAX_COILS) return false;
     *value = get_bit(g_coils, addr);
 #endif
@@ -479,13 +556,12 @@ bool modbus_rtu_get_coil(uint16_t addr, bool *value) {
 }
 
 bool modbus_rtu_set_coil(uint16_t addr, bool value) {
-    if (!modbus_is_register_valid(addr, 0)) return false;
-
 #ifdef MODBUS_USE_REGISTER_MAPPING
     int16_t idx = get_register_index(addr, 0);
     if (idx < 0) return false;
     set_bit(g_coils, idx, value);
 #else
+    if (!modbus_is_register_valid(addr, 0)) return false;
     if (addr >= MODBUS_MAX_COILS) return false;
     set_bit(g_coils, addr, value);
 #endif
@@ -493,13 +569,12 @@ bool modbus_rtu_set_coil(uint16_t addr, bool value) {
 }
 
 bool modbus_rtu_get_discrete_input(uint16_t addr, bool *value) {
-    if (!modbus_is_register_valid(addr, 1)) return false;
-
 #ifdef MODBUS_USE_REGISTER_MAPPING
     int16_t idx = get_register_index(addr, 1);
     if (idx < 0) return false;
     *value = get_bit(g_discrete_inputs, idx);
 #else
+    if (!modbus_is_register_valid(addr, 1)) return false;
     if (addr >= MODBUS_MAX_DISCRETE_INPUTS) return false;
     *value = get_bit(g_discrete_inputs, addr);
 #endif
@@ -507,13 +582,12 @@ bool modbus_rtu_get_discrete_input(uint16_t addr, bool *value) {
 }
 
 bool modbus_rtu_set_discrete_input(uint16_t addr, bool value) {
-    if (!modbus_is_register_valid(addr, 1)) return false;
-
 #ifdef MODBUS_USE_REGISTER_MAPPING
     int16_t idx = get_register_index(addr, 1);
     if (idx < 0) return false;
     set_bit(g_discrete_inputs, idx, value);
 #else
+    if (!modbus_is_register_valid(addr, 1)) return false;
     if (addr >= MODBUS_MAX_DISCRETE_INPUTS) return false;
     set_bit(g_discrete_inputs, addr, value);
 #endif
@@ -521,13 +595,12 @@ bool modbus_rtu_set_discrete_input(uint16_t addr, bool value) {
 }
 
 bool modbus_rtu_get_holding_register(uint16_t addr, uint16_t *value) {
-    if (!modbus_is_register_valid(addr, 4)) return false;
-
 #ifdef MODBUS_USE_REGISTER_MAPPING
     int16_t idx = get_register_index(addr, 4);
     if (idx < 0) return false;
     *value = g_holding_registers[idx];
 #else
+    if (!modbus_is_register_valid(addr, 4)) return false;
     if (addr >= MODBUS_MAX_HOLDING_REGISTERS) return false;
     *value = g_holding_registers[addr];
 #endif
@@ -535,13 +608,12 @@ bool modbus_rtu_get_holding_register(uint16_t addr, uint16_t *value) {
 }
 
 bool modbus_rtu_set_holding_register(uint16_t addr, uint16_t value) {
-    if (!modbus_is_register_valid(addr, 4)) return false;
-
 #ifdef MODBUS_USE_REGISTER_MAPPING
     int16_t idx = get_register_index(addr, 4);
     if (idx < 0) return false;
     g_holding_registers[idx] = value;
 #else
+    if (!modbus_is_register_valid(addr, 4)) return false;
     if (addr >= MODBUS_MAX_HOLDING_REGISTERS) return false;
     g_holding_registers[addr] = value;
 #endif
@@ -549,13 +621,12 @@ bool modbus_rtu_set_holding_register(uint16_t addr, uint16_t value) {
 }
 
 bool modbus_rtu_get_input_register(uint16_t addr, uint16_t *value) {
-    if (!modbus_is_register_valid(addr, 3)) return false;
-
 #ifdef MODBUS_USE_REGISTER_MAPPING
     int16_t idx = get_register_index(addr, 3);
     if (idx < 0) return false;
     *value = g_input_registers[idx];
 #else
+    if (!modbus_is_register_valid(addr, 3)) return false;
     if (addr >= MODBUS_MAX_INPUT_REGISTERS) return false;
     *value = g_input_registers[addr];
 #endif
@@ -563,13 +634,12 @@ bool modbus_rtu_get_input_register(uint16_t addr, uint16_t *value) {
 }
 
 bool modbus_rtu_set_input_register(uint16_t addr, uint16_t value) {
-    if (!modbus_is_register_valid(addr, 3)) return false;
-
 #ifdef MODBUS_USE_REGISTER_MAPPING
     int16_t idx = get_register_index(addr, 3);
     if (idx < 0) return false;
     g_input_registers[idx] = value;
 #else
+    if (!modbus_is_register_valid(addr, 3)) return false;
     if (addr >= MODBUS_MAX_INPUT_REGISTERS) return false;
     g_input_registers[addr] = value;
 #endif
@@ -31,6 +31,7 @@
 #define MODBUS_MAX_PDU_LENGTH                   (253)
 #define MODBUS_MAX_ADU_LENGTH                   (256)
 #define MODBUS_RTU_FRAME_MIN_SIZE               (4)
+#define MODBUS_RTU_READ_REQUEST_LENGTH          (8)
 
 /* Timing Constants */
 #define MODBUS_RTU_T15_US(baudrate)             ((15000000UL) / (baudrate))
@@ -122,6 +123,7 @@ bool modbus_rtu_master_read_coils(modbus_rtu_ctx_t *ctx, uint8_t slave_id, uint1
 bool modbus_rtu_master_read_discrete_inputs(modbus_rtu_ctx_t *ctx, uint8_t slave_id, uint16_t addr, uint16_t count, uint8_t *dest);
 bool modbus_rtu_master_read_holding_registers(modbus_rtu_ctx_t *ctx, uint8_t slave_id, uint16_t addr, uint16_t count, uint16_t *dest);
 bool modbus_rtu_master_read_input_registers(modbus_rtu_ctx_t *ctx, uint8_t slave_id, uint16_t addr, uint16_t count, uint16_t *dest);
+bool modbus_rtu_master_read_frame(modbus_rtu_ctx_t *ctx, const uint8_t *adu, uint16_t response_length);
 bool modbus_rtu_master_write_single_coil(modbus_rtu_ctx_t *ctx, uint8_t slave_id, uint16_t addr, bool value);
 bool modbus_rtu_master_write_single_register(modbus_rtu_ctx_t *ctx, uint8_t slave_id, uint16_t addr, uint16_t value);
 bool modbus_rtu_master_write_multiple_coils(modbus_rtu_ctx_t *ctx, uint8_t slave_id, uint16_t addr, uint16_t count, const uint8_t *values);
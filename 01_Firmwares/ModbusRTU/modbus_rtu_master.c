@@ -7,6 +7,9 @@
  * @brief   Modbus RTU Master mode implementation
  */
 
+/* Forward Declarations */
+static bool master_transact(modbus_rtu_ctx_t *ctx, uint8_t slave_id, uint8_t function_code, uint16_t response_length);
+
 /* Helper function to send request and wait for response */
 static bool
 master_send_request(modbus_rtu_ctx_t *ctx, uint8_t slave_id, uint8_t function_code,
@@ -31,6 +34,16 @@ master_send_request(modbus_rtu_ctx_t *ctx, uint8_t slave_id, uint8_t function_co
     ctx->tx_buffer[ctx->tx_length++] = crc & 0xFF;
     ctx->tx_buffer[ctx->tx_length++] = crc >> 8;
 
+    return master_transact(ctx, slave_id, function_code, 0);
+}
+
+/**
+ * @brief   Send the request in tx_buffer and wait for the response
+ * @param   response_length: Expected response length, the frame ends as soon as it
+ *                           arrives; 0 waits for the T3.5 silence
+ */
+static bool
+master_transact(modbus_rtu_ctx_t *ctx, uint8_t slave_id, uint8_t function_code, uint16_t response_length) {
     /* Clear RX buffer */
     ctx->rx_length = 0;
     ctx->state = MODBUS_STATE_TRANSMITTING;
@@ -57,10 +70,10 @@ master_send_request(modbus_rtu_ctx_t *ctx, uint8_t slave_id, uint8_t function_co
             return false;
         }
 
-        /* Check if frame received (T3.5 timeout) */
+        /* Check if frame received (expected length or T3.5 timeout) */
         if (ctx->state == MODBUS_STATE_RECEIVING) {
             uint32_t elapsed_us = modbus_port_get_time_us() - ctx->rx_timestamp;
-            if (elapsed_us >= ctx->t35_us) {
+            if ((response_length > 0 && ctx->rx_length >= response_length) || elapsed_us >= ctx->t35_us) {
                 ctx->state = MODBUS_STATE_PROCESSING;
                 break;
             }
@@ -188,6 +201,30 @@ modbus_rtu_master_read_input_registers(modbus_rtu_ctx_t *ctx, uint8_t slave_id,
     return true;
 }
 
+/**
+ * @brief   Master: Send a pre-built read request (FC 0x01-0x04)
+ * @param   adu: Request ADU with CRC, e.g. g_modbus_read_frames[i].adu
+ * @param   response_length: Expected response ADU length, e.g. g_modbus_read_frames[i].response_length
+ * @note    No header or CRC is built; the response is left in ctx->rx_buffer, data from rx_buffer[3]
+ */
+bool
+modbus_rtu_master_read_frame(modbus_rtu_ctx_t *ctx, const uint8_t *adu, uint16_t response_length) {
+    if (!ctx->is_master || !adu)
+        return false;
+
+    memcpy(ctx->tx_buffer, adu, MODBUS_RTU_READ_REQUEST_LENGTH);
+    ctx->tx_length = MODBUS_RTU_READ_REQUEST_LENGTH;
+
+    if (!master_transact(ctx, adu[0], adu[1], response_length))
+        return false;
+
+    if (ctx->rx_length != response_length)
+        return false;
+
+    ctx->state = MODBUS_STATE_IDLE;
+    return true;
+}
+
 /**
  * @brief   Master: Write Single Coil (FC 0x05)
  */
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+bench_bus_simulation.py
+Wall time of simulating a day of polling on the virtual bus clock, with and without random faults
+
+Usage: python bench_bus_simulation.py [--hours 24] [--registers 400] [--slaves 8]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_project import make_config
+from modbus_bus_model import BusCostModel
+from modbus_bus_simulation import BusSimulation
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the virtual clock bus simulation')
+    parser.add_argument('--hours', type=float, default=24.0, help='Virtual time per scenario')
+    parser.add_argument('--registers', type=int, default=400, help='Registers in the Master config')
+    parser.add_argument('--slaves', type=int, default=8, help='Target slaves the registers are spread over')
+    args = parser.parse_args()
+    
+    config = make_config(args.registers, args.slaves)
+    print(f"{'Baud':>7} {'Loss rate':>10} {'Cycles':>9} {'Transactions':>13} {'Wall (s)':>9} {'x real time':>12}")
+    for baudrate in (9600, 115200):
+        for loss_rate in (0.0, 0.001):
+            simulation = BusSimulation(config, cost_model=BusCostModel(baudrate=baudrate), loss_rate=loss_rate)
+            start = time.perf_counter()
+            report = simulation.run(duration_s=args.hours * 3600.0)
+            elapsed = time.perf_counter() - start
+            print(f"{baudrate:>7} {loss_rate:>10} {report['cycles']:>9} {report['transactions']:>13} "
+                  f"{elapsed:>9.3f} {report['simulated_s'] / elapsed:>12.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+bench_codec.py
+Frames encoded and decoded per second by modbus_rtu_codec, and CRC check throughput
+
+Usage: python bench_codec.py [--frames 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import modbus_rtu_codec as codec
+
+
+def rate(func, frames):
+    """Frames per second of calling func() once per frame"""
+    start = time.perf_counter()
+    for _ in range(frames):
+        func()
+    return frames / (time.perf_counter() - start)
+
+
+def make_cases():
+    """(name, encode, decode) of a request and its response for each function code"""
+    buf = codec.new_adu_buffer()
+    response = codec.new_adu_buffer()
+    dest = [0] * 2000
+    registers = list(range(100, 225))
+    bits = [i % 3 == 0 for i in range(2000)]
+    cases = []
+    
+    for name, fc, count, values, encode_response in (
+            ('FC01 read 2000 coils', codec.FC_READ_COILS, 2000, bits, codec.encode_read_bits_response),
+            ('FC02 read 16 inputs', codec.FC_READ_DISCRETE_INPUTS, 16, bits[:16], codec.encode_read_bits_response),
+            ('FC03 read 10 registers', codec.FC_READ_HOLDING_REGISTERS, 10, registers[:10], codec.encode_read_registers_response),
+            ('FC04 read 125 registers', codec.FC_READ_INPUT_REGISTERS, 125, registers, codec.encode_read_registers_response)):
+        length = encode_response(response, 1, fc, values)
+        cases.append((name,
+                      lambda fc=fc, count=count: codec.encode_read_request(buf, 1, fc, 0, count),
+                      lambda fc=fc, count=count, length=length, adu=bytes(response[:length]):
+                          codec.decode_response(adu, length, 1, fc, 0, count, dest)))
+    
+    for name, fc, encode, value in (
+            ('FC05 write coil', codec.FC_WRITE_SINGLE_COIL, lambda: codec.encode_write_single_coil(buf, 1, 7, True), 1),
+            ('FC06 write register', codec.FC_WRITE_SINGLE_REGISTER, lambda: codec.encode_write_single_register(buf, 1, 7, 1234), 1234),
+            ('FC0F write 64 coils', codec.FC_WRITE_MULTIPLE_COILS, lambda: codec.encode_write_multiple_coils(buf, 1, 7, bits[:64]), 64),
+            ('FC10 write 20 registers', codec.FC_WRITE_MULTIPLE_REGISTERS, lambda: codec.encode_write_multiple_registers(buf, 1, 7, registers[:20]), 20)):
+        if fc == codec.FC_WRITE_SINGLE_COIL:
+            length = codec.encode_write_single_coil(response, 1, 7, True)
+        else:
+            length = codec.encode_write_response(response, 1, fc, 7, value)
+        cases.append((name, encode,
+                      lambda fc=fc, value=value, length=length, adu=bytes(response[:length]):
+                          codec.decode_response(adu, length, 1, fc, 7, value)))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Modbus RTU codec')
+    parser.add_argument('--frames', type=int, default=20000, help='Frames per measurement')
+    args = parser.parse_args()
+    
+    print(f"{'Case':<26} {'Encode (frames/s)':>18} {'Decode (frames/s)':>18}")
+    for name, encode, decode in make_cases():
+        print(f"{name:<26} {rate(encode, args.frames):>18.0f} {rate(decode, args.frames):>18.0f}")
+    
+    # A capture of FC03 responses of one length with every 10th frame corrupted
+    frames = []
+    buf = codec.new_adu_buffer()
+    for i in range(args.frames):
+        length = codec.encode_read_registers_response(buf, 1 + i % 32, codec.FC_READ_HOLDING_REGISTERS,
+                                                      [(i * 7 + n) & 0xFFFF for n in range(10)])
+        frame = bytes(buf[:length])
+        frames.append(frame if i % 10 else frame[:-1] + b'\x00')
+    
+    start = time.perf_counter()
+    single = [codec.check_crc(frame) for frame in frames]
+    single_time = time.perf_counter() - start
+    start = time.perf_counter()
+    bulk = codec.check_crc_many(frames)
+    bulk_time = time.perf_counter() - start
+    assert single == bulk
+    
+    print()
+    print(f"CRC check of {len(frames)} frames of {len(frames[0])} bytes:")
+    print(f"  check_crc()      {len(frames) / single_time:>12.0f} frames/s")
+    print(f"  check_crc_many() {len(frames) / bulk_time:>12.0f} frames/s ({single_time / bulk_time:.1f}x)")
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+bench_firmware.py
+Host benchmark of the generated modbus_registers.c built with the firmware's modbus_rtu.c (needs gcc)
+
+Synthetic FC01/03/05/06/0F/10 request streams are fed byte by byte through
+modbus_rtu_rx_byte(), the T3.5 timer callback and modbus_rtu_slave_process()
+against a stub modbus_port layer, so ns per frame covers reception, the
+request, and the response CRC.
+
+Usage: python bench_firmware.py [--sizes 100,1000,10000] [--frames 200000] [--repeat 3] [--cflags "-O2"]
+"""
+
+import argparse
+import os
+import random
+import shlex
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from bench_generator import make_config
+from modbus_code_generator import ModbusCodeGenerator
+from modbus_register_model import RegisterTable, normalize_config
+from modbus_rtu_codec import (FC_READ_COILS, FC_READ_HOLDING_REGISTERS, FC_WRITE_MULTIPLE_COILS,
+                              FC_WRITE_MULTIPLE_REGISTERS, FC_WRITE_SINGLE_COIL, FC_WRITE_SINGLE_REGISTER,
+                              MAX_QUANTITY, encode_read_request, encode_write_multiple_coils,
+                              encode_write_multiple_registers, encode_write_single_coil,
+                              encode_write_single_register, new_adu_buffer)
+
+
+FIRMWARE_DIR = os.path.join(ROOT, '..', '..', '01_Firmwares', 'ModbusRTU')
+FIRMWARE_FILES = ['modbus_rtu.c', 'modbus_rtu.h', 'modbus_port.h']
+
+SLAVE_ID = 1
+STRATEGIES = ('dense', 'range', 'eytzinger', 'auto')
+
+# (function code, Modbus type of the addressed registers)
+STREAMS = [
+    (FC_READ_COILS, 0),
+    (FC_READ_HOLDING_REGISTERS, 4),
+    (FC_WRITE_SINGLE_COIL, 0),
+    (FC_WRITE_SINGLE_REGISTER, 4),
+    (FC_WRITE_MULTIPLE_COILS, 0),
+    (FC_WRITE_MULTIPLE_REGISTERS, 4)
+]
+
+# Forced into every translation unit: modbus_easy_poll() calls the CubeMX Error_Handler()
+STUB_HEADER = '''void Error_Handler(void);
+'''
+
+STUB_PORT_SOURCE = '''#include <stddef.h>
+#include "modbus_port.h"
+
+/* Stub porting layer: time only moves when the driver advances it, sent frames are counted */
+uint32_t bench_time_us;
+uint32_t bench_responses;
+uint32_t bench_exceptions;
+
+void
+modbus_port_uart_init(uint32_t baudrate, uint8_t parity, uint8_t stop_bits) {
+    (void)baudrate;
+    (void)parity;
+    (void)stop_bits;
+}
+
+void
+modbus_port_send(const uint8_t* data, uint16_t length) {
+    (void)length;
+    bench_responses++;
+    if (data[1] & 0x80) {
+        bench_exceptions++;
+    }
+}
+
+uint32_t
+modbus_port_get_time_ms(void) {
+    return bench_time_us / 1000;
+}
+
+uint32_t
+modbus_port_get_time_us(void) {
+    return bench_time_us;
+}
+
+void
+modbus_port_delay_us(uint32_t us) {
+    bench_time_us += us;
+}
+
+void
+modbus_port_set_interrupts(bool enable) {
+    (void)enable;
+}
+
+void
+modbus_port_timer_init(uint32_t period_us) {
+    (void)period_us;
+}
+
+void
+modbus_port_timer_enable(bool enable) {
+    (void)enable;
+}
+
+void*
+modbus_port_get_timer_handle(void) {
+    return NULL;
+}
+
+uint8_t
+modbus_port_get_rx_byte(void) {
+    return 0;
+}
+
+void
+modbus_port_uart_receive_next(void) {
+}
+
+void
+modbus_port_rs485_tx_enable(void) {
+}
+
+void
+modbus_port_rs485_rx_enable(void) {
+}
+
+void
+Error_Handler(void) {
+}
+'''
+
+DRIVER_SOURCE = '''#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+#include "modbus_rtu.h"
+
+extern uint32_t bench_time_us;
+extern uint32_t bench_responses;
+extern uint32_t bench_exceptions;
+
+typedef struct {
+    uint8_t fc;
+    uint8_t length;
+    uint16_t registers;
+    uint8_t adu[MODBUS_MAX_ADU_LENGTH];
+} bench_frame_t;
+
+static void
+replay(modbus_rtu_ctx_t* ctx, const bench_frame_t* frame) {
+    for (uint16_t i = 0; i < frame->length; i++) {
+        modbus_rtu_rx_byte(ctx, frame->adu[i]);
+    }
+    bench_time_us += ctx->t35_us;
+    modbus_rtu_timer_callback(ctx);
+    modbus_rtu_slave_process(ctx);
+}
+
+int
+main(int argc, char** argv) {
+    FILE* f = fopen(argv[1], "rb");
+    long target = atol(argv[2]);
+    int repeats = atoi(argv[3]), repeat;
+    static bench_frame_t frames[8192];
+    size_t count = 0, first, last, i;
+    long passes, pass, registers;
+    modbus_rtu_ctx_t ctx;
+    struct timespec t0, t1;
+    double elapsed, best = 0;
+
+    if (argc < 4 || f == NULL) {
+        return 1;
+    }
+    while (count < 8192 && fread(&frames[count], 4, 1, f) == 1
+           && fread(frames[count].adu, 1, frames[count].length, f) == frames[count].length) {
+        count++;
+    }
+    fclose(f);
+
+    modbus_rtu_init(&ctx, 1, false, 115200);
+    for (first = 0; first < count; first = last) {
+        for (last = first; last < count && frames[last].fc == frames[first].fc; last++) {
+        }
+        registers = 0;
+        for (i = first; i < last; i++) {
+            registers += frames[i].registers;
+            replay(&ctx, &frames[i]);
+        }
+        bench_responses = 0;
+        bench_exceptions = 0;
+        passes = (target + (long)(last - first) - 1) / (long)(last - first);
+
+        /* Best of the repeats, so a scheduler hiccup does not show up as a regression */
+        for (repeat = 0; repeat < repeats; repeat++) {
+            clock_gettime(CLOCK_MONOTONIC, &t0);
+            for (pass = 0; pass < passes; pass++) {
+                for (i = first; i < last; i++) {
+                    replay(&ctx, &frames[i]);
+                }
+            }
+            clock_gettime(CLOCK_MONOTONIC, &t1);
+            elapsed = (t1.tv_sec - t0.tv_sec) + (t1.tv_nsec - t0.tv_nsec) / 1e9;
+            if (repeat == 0 || elapsed < best) {
+                best = elapsed;
+            }
+        }
+        printf("%u %ld %ld %.9f %u %u\\n", frames[first].fc, passes * (long)(last - first), passes * registers, best,
+               (unsigned)(bench_responses / repeats), (unsigned)(bench_exceptions / repeats));
+    }
+    return 0;
+}
+'''
+
+
+def make_frames(table, stream_frames, rng):
+    """Valid request frames per stream, staying inside contiguous runs so none is answered with an exception"""
+    buf = new_adu_buffer()
+    frames = []
+    for function_code, modbus_type in STREAMS:
+        runs = table.runs[modbus_type]
+        if not runs:
+            continue
+        weights = [count for _, count, _ in runs]
+        for _ in range(stream_frames):
+            start, run_count, _ = rng.choices(runs, weights)[0]
+            offset = rng.randrange(run_count)
+            addr = start + offset
+            count = rng.randint(1, min(MAX_QUANTITY.get(function_code, 1), run_count - offset))
+            if function_code == FC_WRITE_SINGLE_COIL:
+                length = encode_write_single_coil(buf, SLAVE_ID, addr, rng.random() < 0.5)
+            elif function_code == FC_WRITE_SINGLE_REGISTER:
+                length = encode_write_single_register(buf, SLAVE_ID, addr, rng.randrange(65536))
+            elif function_code == FC_WRITE_MULTIPLE_COILS:
+                length = encode_write_multiple_coils(buf, SLAVE_ID, addr, [rng.random() < 0.5 for _ in range(count)])
+            elif function_code == FC_WRITE_MULTIPLE_REGISTERS:
+                length = encode_write_multiple_registers(buf, SLAVE_ID, addr,
+                                                         [rng.randrange(65536) for _ in range(count)])
+            else:
+                length = encode_read_request(buf, SLAVE_ID, function_code, addr, count)
+            frames.append(struct.pack('=BBH', function_code, length, count) + bytes(buf[:length]))
+    return frames
+
+
+def build(workdir, config, strategy, cflags):
+    """Generate the register files for one strategy and link them with the firmware, returns (binary, generator)"""
+    generator = ModbusCodeGenerator(config, lookup_strategy=strategy)
+    generator.generate_files(workdir)
+    
+    # modbus_rtu.c includes "modbus_registers.h" from its own directory, so it is built from a copy
+    for filename in FIRMWARE_FILES:
+        shutil.copy(os.path.join(FIRMWARE_DIR, filename), workdir)
+    sources = {'bench_stub.h': STUB_HEADER, 'bench_port.c': STUB_PORT_SOURCE, 'bench_main.c': DRIVER_SOURCE}
+    for filename, source in sources.items():
+        with open(os.path.join(workdir, filename), 'w') as f:
+            f.write(source)
+    
+    binary = os.path.join(workdir, 'bench')
+    subprocess.run(['gcc', *cflags, '-include', os.path.join(workdir, 'bench_stub.h'),
+                    '-I', workdir] + [os.path.join(workdir, filename) for filename in
+                                      ('modbus_registers.c', 'modbus_rtu.c', 'bench_port.c', 'bench_main.c')]
+                   + ['-o', binary], check=True)
+    return binary, generator
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the generated register files with modbus_rtu.c on the host')
+    parser.add_argument('--sizes', default='100,1000,10000', help='Comma separated register counts of the Slave config')
+    parser.add_argument('--frames', type=int, default=200000, help='Frames replayed per stream')
+    parser.add_argument('--repeat', type=int, default=3, help='Measurements per stream, the fastest is reported')
+    parser.add_argument('--stream-frames', type=int, default=1024, help='Distinct frames per stream')
+    parser.add_argument('--cflags', default='-O2', help='Compiler flags of the measured build')
+    args = parser.parse_args()
+    
+    if shutil.which('gcc') is None:
+        print('gcc not found, cannot build the benchmark')
+        return 1
+    
+    cflags = shlex.split(args.cflags)
+    print(f"{'Registers':>10} {'Strategy':<16} {'FC':<5} {'Frames':>9} {'ns/frame':>10} {'ns/register':>12}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        config = make_config(size, False)
+        table = RegisterTable.from_config(normalize_config(config))
+        frames = make_frames(table, args.stream_frames, random.Random(size))
+        
+        for strategy in STRATEGIES:
+            with tempfile.TemporaryDirectory() as workdir:
+                binary, generator = build(workdir, config, strategy, cflags)
+                frame_file = os.path.join(workdir, 'frames.bin')
+                with open(frame_file, 'wb') as f:
+                    f.write(b''.join(frames))
+                output = subprocess.run([binary, frame_file, str(args.frames), str(args.repeat)], check=True,
+                                        capture_output=True, text=True).stdout
+            
+            label = f'auto={generator.lookup_strategies[4]}' if strategy == 'auto' else strategy
+            for line in output.splitlines():
+                function_code, frame_count, registers, elapsed, responses, exceptions = line.split()
+                frame_count = int(frame_count)
+                elapsed_ns = float(elapsed) * 1e9
+                note = ''
+                if int(responses) != frame_count or int(exceptions):
+                    note = f'  ({responses} responses, {exceptions} exceptions)'
+                print(f"{size:>10} {label:<16} {'FC' + format(int(function_code), '02X'):<5} {frame_count:>9} "
+                      f"{elapsed_ns / frame_count:>10.1f} {elapsed_ns / int(registers):>12.2f}{note}")
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
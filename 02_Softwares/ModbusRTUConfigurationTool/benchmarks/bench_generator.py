@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+bench_generator.py
+Generation time and peak memory of ModbusCodeGenerator.generate_files() versus register count
+
+Usage: python bench_generator.py [--sizes 100,1000,10000,100000] [--master]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from modbus_bus_model import MAX_READ_COUNT
+from modbus_code_generator import ModbusCodeGenerator
+from modbus_range_engine import get_ranges
+
+
+TYPE_NAMES = ['Coil (0x)', 'Discrete Input (1x)', 'Input Register (3x)', 'Holding Register (4x)']
+TYPE_PREFIXES = ['COIL', 'DI', 'IR', 'HR']
+
+
+def make_registers(count, first_addr=0):
+    """Spread registers evenly over the four types with small address gaps"""
+    registers = []
+    for i in range(count):
+        combo_index = i % 4
+        addr = first_addr + (i // 4) + (i // 64)
+        registers.append({
+            'tag_name': f'{TYPE_PREFIXES[combo_index]}_{i:06d}',
+            'internal_address': addr % 65536,
+            'mapped_address': [1, 10001, 30001, 40001][combo_index] + addr % 65536,
+            'type': combo_index,
+            'modbus_type': [0, 1, 3, 4][combo_index],
+            'type_name': TYPE_NAMES[combo_index],
+            'operation': 'Write' if combo_index in (0, 3) and i % 5 == 0 else 'Read',
+            'mode': 'Cyclic' if i % 10 == 0 else 'One-time'
+        })
+    return registers
+
+
+def make_config(count, is_master):
+    config = {
+        'slave_id': 1,
+        'is_master': is_master,
+        'target_slaves': [],
+        'slave_registers': {},
+        'registers': [],
+        'settings': ModbusCodeGenerator({})._get_default_settings()
+    }
+    if is_master:
+        slave_ids = [1, 2, 3, 4]
+        config['target_slaves'] = slave_ids
+        for n, slave_id in enumerate(slave_ids):
+            share = count // len(slave_ids) + (1 if n < count % len(slave_ids) else 0)
+            config['slave_registers'][slave_id] = make_registers(share, first_addr=n * 1000)
+    else:
+        config['registers'] = make_registers(count)
+    return config
+
+
+def count_strict_ranges(config):
+    """Read ranges of consecutive addresses only, per slave and register type"""
+    total = 0
+    for registers in config['slave_registers'].values():
+        by_type = {}
+        for reg in registers:
+            if reg['operation'] == 'Read':
+                by_type.setdefault(reg['modbus_type'], set()).add(reg['internal_address'])
+        for modbus_type, addresses in by_type.items():
+            total += len(get_ranges(sorted(addresses), modbus_type, max_count=MAX_READ_COUNT[modbus_type]))
+    return total
+
+
+def run_case(config):
+    """Return (seconds, peak bytes, output bytes) of one generation run"""
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        ModbusCodeGenerator(config).generate_files(workdir)
+        elapsed = time.perf_counter() - start
+        
+        # Separate run for memory: tracing allocations slows generation several times
+        tracemalloc.start()
+        ModbusCodeGenerator(config).generate_files(workdir)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        
+        output_bytes = sum(os.path.getsize(os.path.join(workdir, name)) for name in os.listdir(workdir))
+    return elapsed, peak, output_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark code generation scaling')
+    parser.add_argument('--sizes', default='100,1000,10000,100000', help='Comma separated register counts')
+    parser.add_argument('--master', action='store_true', help='Generate a Master config with 4 slaves')
+    args = parser.parse_args()
+    
+    sizes = [int(size) for size in args.sizes.split(',')]
+    
+    print(f"{'Registers':>10} {'Time (s)':>10} {'us/reg':>8} {'Peak (KiB)':>11} {'B/reg':>7} {'Output (KiB)':>13}")
+    for size in sizes:
+        config = make_config(size, args.master)
+        if args.master:
+            # The registers leave gaps, which default settings must not read across
+            generator = ModbusCodeGenerator(config)
+            generator._get_optimized_ranges(generator._get_all_registers())
+            assert len(generator.read_frames) == count_strict_ranges(config)
+        elapsed, peak, output_bytes = run_case(config)
+        print(f"{size:>10} {elapsed:>10.3f} {elapsed * 1e6 / size:>8.1f} "
+              f"{peak / 1024:>11.0f} {peak / size:>7.0f} {output_bytes / 1024:>13.0f}")
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
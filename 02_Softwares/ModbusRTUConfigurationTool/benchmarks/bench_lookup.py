@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+bench_lookup.py
+Host micro-benchmark of the generated address lookup strategies (needs gcc)
+
+Usage: python bench_lookup.py [--registers N] [--queries N]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from modbus_code_generator import ModbusCodeGenerator
+
+
+DRIVER_SOURCE = '''#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+#include "modbus_registers.h"
+
+/* Baseline: the binary search the generator used before lookup strategies */
+static int32_t
+binary_search_index(uint16_t addr) {
+    int32_t left = 0, right = MODBUS_HOLDING_REGISTER_COUNT - 1, mid;
+    while (left <= right) {
+        mid = (left + right) / 2;
+        if (g_modbus_holding_register_map[mid].internal_addr == addr) {
+            return g_modbus_holding_register_map[mid].array_index;
+        } else if (g_modbus_holding_register_map[mid].internal_addr < addr) {
+            left = mid + 1;
+        } else {
+            right = mid - 1;
+        }
+    }
+    return -1;
+}
+
+int
+main(int argc, char** argv) {
+    FILE* f = fopen(argv[1], "rb");
+    long queries = atol(argv[2]);
+    int baseline = argc > 3;
+    static uint16_t addrs[4096];
+    size_t n = fread(addrs, sizeof(uint16_t), 4096, f);
+    struct timespec t0, t1;
+    volatile int32_t sink = 0;
+    long i;
+
+    fclose(f);
+    clock_gettime(CLOCK_MONOTONIC, &t0);
+    for (i = 0; i < queries; ++i) {
+        uint16_t addr = addrs[i & (n - 1)];
+        sink += baseline ? binary_search_index(addr) : modbus_get_register_index(addr, 4);
+    }
+    clock_gettime(CLOCK_MONOTONIC, &t1);
+    printf("%.6f\\n", (t1.tv_sec - t0.tv_sec) + (t1.tv_nsec - t0.tv_nsec) / 1e9);
+    return sink == 12345;
+}
+'''
+
+
+def make_register(addr):
+    return {
+        'tag_name': f'HR_{addr:05d}',
+        'internal_address': addr,
+        'mapped_address': 40001 + addr,
+        'type': 3,
+        'modbus_type': 4,
+        'type_name': 'Holding Register (4x)',
+        'operation': 'N/A',
+        'mode': 'N/A'
+    }
+
+
+def make_layouts(count):
+    """Compact, clustered and sparse holding register address sets"""
+    rng = random.Random(1234)
+    clustered = []
+    base = 0
+    while len(clustered) < count:
+        clustered.extend(range(base, base + 16))
+        base += 16 + rng.randrange(64, 512)
+    return {
+        'compact': list(range(count)),
+        'clustered': [addr for addr in clustered[:count] if addr < 65536],
+        'sparse': sorted(rng.sample(range(65536), count))
+    }
+
+
+def run_case(workdir, addresses, strategy, queries):
+    config = {
+        'slave_id': 1,
+        'is_master': False,
+        'target_slaves': [],
+        'slave_registers': {},
+        'registers': [make_register(addr) for addr in addresses],
+        'settings': ModbusCodeGenerator({})._get_default_settings()
+    }
+    
+    generator = ModbusCodeGenerator(config, lookup_strategy=strategy if strategy != 'binary' else 'auto')
+    generator.generate_files(workdir)
+    
+    with open(os.path.join(workdir, 'bench_main.c'), 'w') as f:
+        f.write(DRIVER_SOURCE)
+    
+    # 3 hits for every miss, 4096 entries so the driver can mask the index
+    rng = random.Random(99)
+    query_addrs = [rng.choice(addresses) if rng.random() < 0.75 else rng.randrange(65536) for _ in range(4096)]
+    query_file = os.path.join(workdir, 'queries.bin')
+    with open(query_file, 'wb') as f:
+        f.write(b''.join(addr.to_bytes(2, sys.byteorder) for addr in query_addrs))
+    
+    binary = os.path.join(workdir, 'bench')
+    subprocess.run(['gcc', '-O2', '-I', workdir,
+                    os.path.join(workdir, 'modbus_registers.c'), os.path.join(workdir, 'bench_main.c'),
+                    '-o', binary], check=True)
+    
+    args = [binary, query_file, str(queries)]
+    if strategy == 'binary':
+        args.append('baseline')
+    elapsed = float(subprocess.run(args, check=False, capture_output=True, text=True).stdout)
+    return queries / elapsed, generator.lookup_strategies[4]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark generated register lookup strategies')
+    parser.add_argument('--registers', type=int, default=2000, help='Holding registers per layout')
+    parser.add_argument('--queries', type=int, default=20000000, help='Lookups per measurement')
+    args = parser.parse_args()
+    
+    if shutil.which('gcc') is None:
+        print('gcc not found, cannot build the benchmark')
+        return 1
+    
+    print(f"{'Layout':<10} {'Strategy':<16} {'Mlookups/s':>11}")
+    for layout, addresses in make_layouts(args.registers).items():
+        for strategy in ('binary', 'dense', 'range', 'eytzinger', 'auto'):
+            with tempfile.TemporaryDirectory() as workdir:
+                rate, chosen = run_case(workdir, addresses, strategy, args.queries)
+            label = f'auto={chosen}' if strategy == 'auto' else strategy
+            print(f"{layout:<10} {label:<16} {rate / 1e6:>11.1f}")
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+bench_project.py
+File size and open time of JSON configs versus project files for large Master configs
+
+Usage: python bench_project.py [--sizes 1000,10000,100000] [--slaves 32]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_generator import make_registers
+from modbus_code_generator import ModbusCodeGenerator
+from modbus_project_store import PROJECT_EXTENSION, load_config_file, save_config_file
+
+
+def make_config(count, slave_count):
+    slave_ids = list(range(1, slave_count + 1))
+    config = {
+        'slave_id': 1,
+        'is_master': True,
+        'target_slaves': slave_ids,
+        'slave_registers': {},
+        'registers': [],
+        'settings': ModbusCodeGenerator({})._get_default_settings()
+    }
+    for n, slave_id in enumerate(slave_ids):
+        share = count // slave_count + (1 if n < count % slave_count else 0)
+        config['slave_registers'][slave_id] = make_registers(share)
+    return config
+
+
+def time_call(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON configs against project files')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='Comma separated register counts')
+    parser.add_argument('--slaves', type=int, default=32, help='Target slaves the registers are spread over')
+    args = parser.parse_args()
+    
+    print(f"{'Registers':>10} {'JSON (KiB)':>11} {'Open (ms)':>10} {'Project (KiB)':>14} "
+          f"{'Open (ms)':>10} {'+1 slave (ms)':>14} {'All (ms)':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        json_file = os.path.join(workdir, 'config.json')
+        project_file = os.path.join(workdir, 'config' + PROJECT_EXTENSION)
+        for size in (int(size) for size in args.sizes.split(',')):
+            config = make_config(size, args.slaves)
+            save_config_file(config, json_file)
+            save_config_file(config, project_file)
+            
+            json_time, _ = time_call(lambda: load_config_file(json_file))
+            open_time, project = time_call(lambda: load_config_file(project_file))
+            slave_time, _ = time_call(lambda: project['slave_registers'][1])
+            all_time, _ = time_call(project['slave_registers'].close)
+            
+            print(f"{size:>10} {os.path.getsize(json_file) / 1024:>11.0f} {json_time * 1000:>10.1f} "
+                  f"{os.path.getsize(project_file) / 1024:>14.0f} {open_time * 1000:>10.1f} "
+                  f"{slave_time * 1000:>14.1f} {(open_time + slave_time + all_time) * 1000:>9.1f}")
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+bench_simulator.py
+Transactions per second a slave simulator farm answers on its pty, against the wire limit at a baud rate
+
+Usage: python bench_simulator.py [--slaves 247] [--registers 20] [--baudrate 115200] [--seconds 5] [--native]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tty
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from bench_project import make_config
+from modbus_bus_model import BusCostModel
+from modbus_frame_delimiter import FrameDelimiter
+from modbus_poll_planner import PollPlanner
+from modbus_project_store import save_config_file
+from modbus_register_model import normalize_config
+from modbus_rtu_codec import MAX_ADU_LENGTH, decode_response, encode_read_request, new_adu_buffer
+
+
+def run_master(fd, requests, cost_model, seconds):
+    """Send the requests round robin for seconds, one at a time, returns (transactions, elapsed seconds)"""
+    delimiter = FrameDelimiter(cost_model)
+    buf = new_adu_buffer()
+    adus = []
+    for req in requests:
+        length = encode_read_request(buf, req.slave_id, req.function_code, req.start_addr, req.count)
+        adus.append((bytes(buf[:length]), req, [0] * req.count))
+    
+    transactions = 0
+    start = time.perf_counter()
+    end = start + seconds
+    while time.perf_counter() < end:
+        adu, req, dest = adus[transactions % len(adus)]
+        os.write(fd, adu)
+        frames = []
+        while not frames:
+            frames = delimiter.feed(os.read(fd, MAX_ADU_LENGTH), time.monotonic() * 1e6)
+        decode_response(frames[0], len(frames[0]), req.slave_id, req.function_code, req.start_addr, req.count, dest)
+        transactions += 1
+    return transactions, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pty slave simulator farm')
+    parser.add_argument('--slaves', type=int, default=247, help='Simulated slaves')
+    parser.add_argument('--registers', type=int, default=20, help='Registers per slave')
+    parser.add_argument('--baudrate', type=int, default=115200, help='Baud rate the wire limit is computed for')
+    parser.add_argument('--seconds', type=float, default=5.0, help='Measurement time')
+    parser.add_argument('--native', action='store_true', help='Serve with the firmware compiled for the host')
+    args = parser.parse_args()
+    
+    config = make_config(args.slaves * args.registers, args.slaves)
+    requests = [req for req in PollPlanner(normalize_config(config)).plan() if req.is_read()]
+    cost_model = BusCostModel(baudrate=args.baudrate, frame_interval_ms=0)
+    wire_us = sum(cost_model.read_transaction_us(req.reg_type, req.count) for req in requests) / len(requests)
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        config_file = os.path.join(workdir, 'farm.json')
+        link = os.path.join(workdir, 'ttyFARM')
+        save_config_file(config, config_file)
+        farm_args = [sys.executable, os.path.join(ROOT, 'modbus_slave_simulator.py'), config_file,
+                     '--link', link, '--no-wire-time']
+        if args.native:
+            farm_args.append('--native')
+        farm = subprocess.Popen(farm_args, stdout=subprocess.PIPE, text=True)
+        try:
+            print(farm.stdout.readline().strip())
+            fd = os.open(link, os.O_RDWR | os.O_NOCTTY)
+            tty.setraw(fd)
+            try:
+                transactions, elapsed = run_master(fd, requests, cost_model, args.seconds)
+            finally:
+                os.close(fd)
+        finally:
+            farm.terminate()
+            farm.wait()
+    
+    achieved = transactions / elapsed
+    wire_limit = 1e6 / wire_us
+    print(f"{len(requests)} read requests, {wire_us / 1000.0:.2f} ms mean wire time at {args.baudrate} baud")
+    print(f"  Wire limit        {wire_limit:>10.0f} transactions/s")
+    label = 'Native on pty' if args.native else 'Simulator on pty'
+    print(f"  {label:<17} {achieved:>10.0f} transactions/s ({achieved / wire_limit:.1f}x the wire limit)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+"""
+modbus_async_master.py
+Asyncio Modbus RTU master polling the requests PollPlanner builds from a saved config
+
+Usage: python modbus_async_master.py CONFIG (--tcp HOST:PORT | --serial PORT) [--cycles N]
+"""
+
+import argparse
+import asyncio
+import sys
+
+from modbus_bus_model import BusCostModel, get_setting_values
+from modbus_frame_delimiter import EXPECT_RESPONSES, FrameDelimiter
+from modbus_poll_planner import PollPlanner
+from modbus_project_store import load_config_file
+from modbus_register_model import normalize_config
+from modbus_rtu_codec import (FC_WRITE_MULTIPLE_COILS, FC_WRITE_SINGLE_COIL, FC_WRITE_SINGLE_REGISTER,
+                              MAX_ADU_LENGTH, FrameError, ModbusException, decode_response,
+                              encode_read_request, encode_write_multiple_coils, encode_write_multiple_registers,
+                              encode_write_single_coil, encode_write_single_register, get_response_length,
+                              new_adu_buffer)
+
+
+# pyserial parity letters for MODBUS_PARITY (0=None, 1=Even, 2=Odd)
+SERIAL_PARITIES = {0: 'N', 1: 'E', 2: 'O'}
+
+
+def get_master_timing(settings):
+    """Master timing settings as non-negative ints: timeout_ms, frame_interval_ms, cycle_interval_ms, max_retries"""
+    values = get_setting_values(settings)
+    
+    def get_int(var_name, default):
+        try:
+            return max(int(values.get(var_name, default)), 0)
+        except (TypeError, ValueError):
+            return default
+    
+    return {
+        'timeout_ms': get_int('MODBUS_TIMEOUT_MS', 1000),
+        'frame_interval_ms': get_int('MODBUS_FRAME_INTERVAL_MS', 10),
+        'cycle_interval_ms': get_int('MODBUS_CYCLE_INTERVAL_MS', 100),
+        'max_retries': get_int('MODBUS_MAX_RETRIES', 3)
+    }
+
+
+class StreamTransport:
+    """
+    Request/response exchange over an asyncio stream pair
+    Works with a TCP serial server (RTU over TCP) or pyserial-asyncio streams;
+    responses are delimited with FrameDelimiter.
+    """
+    
+    def __init__(self, reader, writer, cost_model=None):
+        self.reader = reader
+        self.writer = writer
+        self.delimiter = FrameDelimiter(cost_model, EXPECT_RESPONSES)
+    
+    async def exchange(self, adu, response_length, timeout_s):
+        """Send a request ADU and return the first complete frame received, raises asyncio.TimeoutError"""
+        loop = asyncio.get_running_loop()
+        # Anything left from an earlier, timed out exchange is stale
+        self.delimiter.reset()
+        
+        self.writer.write(adu)
+        await self.writer.drain()
+        
+        deadline = loop.time() + timeout_s
+        silence_s = self.delimiter.t35_us / 1e6
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            try:
+                data = await asyncio.wait_for(self.reader.read(MAX_ADU_LENGTH), min(remaining, silence_s))
+            except asyncio.TimeoutError:
+                frames = self.delimiter.poll(loop.time() * 1e6)
+            else:
+                if not data:
+                    raise ConnectionError('Transport closed')
+                frames = self.delimiter.feed(data, loop.time() * 1e6)
+            if frames:
+                return frames[0]
+    
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def open_tcp_transport(host, port, cost_model=None):
+    reader, writer = await asyncio.open_connection(host, port)
+    return StreamTransport(reader, writer, cost_model)
+
+
+async def open_serial_transport(port, cost_model=None):
+    """Serial port transport, needs the optional pyserial-asyncio package"""
+    try:
+        import serial_asyncio
+    except ImportError:
+        raise RuntimeError('Serial ports need pyserial-asyncio: pip install pyserial-asyncio')
+    cost_model = cost_model or BusCostModel()
+    reader, writer = await serial_asyncio.open_serial_connection(
+        url=port, baudrate=cost_model.baudrate, bytesize=cost_model.data_bits,
+        parity=SERIAL_PARITIES.get(cost_model.parity, 'N'), stopbits=cost_model.stop_bits)
+    return StreamTransport(reader, writer, cost_model)
+
+
+class RegisterImage:
+    """Values of one slave's registers of one type, covering every polled or written address"""
+    
+    __slots__ = ('slave_id', 'reg_type', 'base', 'values', 'updated_at')
+    
+    def __init__(self, slave_id, reg_type, base, size):
+        self.slave_id = slave_id
+        self.reg_type = reg_type
+        self.base = base
+        self.values = [0] * size
+        self.updated_at = None
+    
+    def _index(self, addr):
+        index = addr - self.base
+        if not 0 <= index < len(self.values):
+            raise KeyError(f'Slave {self.slave_id} type {self.reg_type} address {addr} is not polled')
+        return index
+    
+    def get(self, addr):
+        return self.values[self._index(addr)]
+    
+    def set(self, addr, value):
+        self.values[self._index(addr)] = value
+
+
+class CompiledRequest:
+    """A planned request with its ADU prebuilt (reads) and the image it reads or writes"""
+    
+    __slots__ = ('request', 'image', 'offset', 'adu', 'response_length', 'pending')
+    
+    def __init__(self, request, image):
+        self.request = request
+        self.image = image
+        self.offset = request.start_addr - image.base
+        self.response_length = get_response_length(request.function_code, request.count)
+        self.adu = None
+        if request.is_read():
+            buf = new_adu_buffer()
+            length = encode_read_request(buf, request.slave_id, request.function_code,
+                                         request.start_addr, request.count)
+            self.adu = bytes(buf[:length])
+        # One-time writes go out when a value they cover is set
+        self.pending = False
+
+
+class CycleStats:
+    """Achieved cycle timing and transaction outcomes"""
+    
+    def __init__(self):
+        self.cycles = 0
+        self.overruns = 0
+        self.first_start = None
+        self.last_start = None
+        self.busy_total_s = 0.0
+        self.busy_max_s = 0.0
+        self.max_lateness_s = 0.0
+        self.transactions = 0
+        self.timeouts = 0
+        self.frame_errors = 0
+        self.exceptions = 0
+        self.retries = 0
+        self.failed = 0
+    
+    def record_cycle(self, scheduled, start, end):
+        if self.first_start is None:
+            self.first_start = start
+        self.last_start = start
+        self.cycles += 1
+        busy = end - start
+        self.busy_total_s += busy
+        self.busy_max_s = max(self.busy_max_s, busy)
+        self.max_lateness_s = max(self.max_lateness_s, start - scheduled)
+    
+    def report(self, interval_s):
+        """Achieved against configured timing in ms, plus transaction counters"""
+        period_s = 0.0
+        if self.cycles > 1:
+            period_s = (self.last_start - self.first_start) / (self.cycles - 1)
+        busy_s = self.busy_total_s / self.cycles if self.cycles else 0.0
+        return {
+            'cycles': self.cycles,
+            'configured_interval_ms': interval_s * 1000.0,
+            'achieved_period_ms': period_s * 1000.0,
+            'mean_busy_ms': busy_s * 1000.0,
+            'max_busy_ms': self.busy_max_s * 1000.0,
+            'max_lateness_ms': self.max_lateness_s * 1000.0,
+            'utilization': busy_s / interval_s if interval_s else 0.0,
+            'overruns': self.overruns,
+            'transactions': self.transactions,
+            'timeouts': self.timeouts,
+            'frame_errors': self.frame_errors,
+            'exceptions': self.exceptions,
+            'retries': self.retries,
+            'failed': self.failed
+        }
+
+
+class AsyncMaster:
+    """
+    Poll every target slave of a Master config over a transport
+    MODBUS_CYCLE_INTERVAL_MS is the period from cycle start to cycle start; cycles
+    are scheduled on absolute deadlines so timing errors do not accumulate, and an
+    overrun restarts the schedule instead of bursting to catch up.
+    MODBUS_FRAME_INTERVAL_MS separates consecutive frames. Read values are
+    published into images; values to write are kept in separate output images, so
+    with MODBUS_BRIDGE_GAPS a read bridging over a write address cannot overwrite
+    them before they are sent. Cyclic writes are sent every cycle, One-time writes
+    after set_value().
+    """
+    
+    def __init__(self, config, transport, cost_model=None):
+        self.config = normalize_config(config)
+        self.transport = transport
+        self.cost_model = cost_model or BusCostModel.from_settings(self.config.get('settings', {}))
+        
+        timing = get_master_timing(self.config.get('settings', {}))
+        self.timeout_s = timing['timeout_ms'] / 1000.0
+        self.frame_interval_s = timing['frame_interval_ms'] / 1000.0
+        self.cycle_interval_s = timing['cycle_interval_ms'] / 1000.0
+        self.max_retries = timing['max_retries']
+        
+        self.planner = PollPlanner(self.config, self.cost_model)
+        requests = self.planner.plan()
+        
+        # Known values per (slave, type) spanning all of its requests, and
+        # values to write spanning its write requests
+        self.images = self._make_images(requests)
+        self.outputs = self._make_images([req for req in requests if req.operation == 'Write'])
+        self.requests = []
+        self.write_requests = {}
+        for req in requests:
+            key = (req.slave_id, req.reg_type)
+            if req.operation == 'Write':
+                compiled = CompiledRequest(req, self.outputs[key])
+                self.write_requests.setdefault(key, []).append(compiled)
+            else:
+                compiled = CompiledRequest(req, self.images[key])
+            self.requests.append(compiled)
+        
+        self.listeners = []
+        self.stats = CycleStats()
+        self.buffer = new_adu_buffer()
+        self.last_frame_end = None
+        self.running = False
+    
+    @staticmethod
+    def _make_images(requests):
+        spans = {}
+        for req in requests:
+            key = (req.slave_id, req.reg_type)
+            end = req.start_addr + req.count
+            low, high = spans.get(key, (req.start_addr, end))
+            spans[key] = (min(low, req.start_addr), max(high, end))
+        return {key: RegisterImage(key[0], key[1], low, high - low) for key, (low, high) in spans.items()}
+    
+    def get_value(self, slave_id, reg_type, addr):
+        """Last value read or successfully written"""
+        return self.images[(slave_id, reg_type)].get(addr)
+    
+    def set_value(self, slave_id, reg_type, addr, value):
+        """Set a value to write; One-time writes covering addr are sent next cycle"""
+        self.outputs[(slave_id, reg_type)].set(addr, value)
+        for compiled in self.write_requests[(slave_id, reg_type)]:
+            req = compiled.request
+            if req.start_addr <= addr < req.start_addr + req.count:
+                compiled.pending = True
+    
+    def add_listener(self, listener):
+        """Call listener(image, start_addr, count) after each successful read or write"""
+        self.listeners.append(listener)
+    
+    def _encode_write(self, compiled):
+        req = compiled.request
+        values = compiled.image.values
+        offset = compiled.offset
+        if req.function_code == FC_WRITE_SINGLE_COIL:
+            length = encode_write_single_coil(self.buffer, req.slave_id, req.start_addr, values[offset])
+        elif req.function_code == FC_WRITE_SINGLE_REGISTER:
+            length = encode_write_single_register(self.buffer, req.slave_id, req.start_addr, values[offset])
+        elif req.function_code == FC_WRITE_MULTIPLE_COILS:
+            length = encode_write_multiple_coils(self.buffer, req.slave_id, req.start_addr,
+                                                 values[offset:offset + req.count])
+        else:
+            length = encode_write_multiple_registers(self.buffer, req.slave_id, req.start_addr,
+                                                     values[offset:offset + req.count])
+        return bytes(self.buffer[:length])
+    
+    async def execute(self, compiled):
+        """One request with retries, True when the slave answered it correctly"""
+        loop = asyncio.get_running_loop()
+        req = compiled.request
+        if compiled.adu is not None:
+            adu = compiled.adu
+            expected = req.count
+        else:
+            adu = self._encode_write(compiled)
+            # Echo of address and value (FC05/FC06) or quantity (FC0F/FC10)
+            if req.function_code == FC_WRITE_SINGLE_COIL or req.function_code == FC_WRITE_SINGLE_REGISTER:
+                expected = compiled.image.values[compiled.offset]
+            else:
+                expected = req.count
+        
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats.retries += 1
+            if self.last_frame_end is not None:
+                delay = self.last_frame_end + self.frame_interval_s - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            
+            self.stats.transactions += 1
+            try:
+                response = await self.transport.exchange(adu, compiled.response_length, self.timeout_s)
+            except asyncio.TimeoutError:
+                self.stats.timeouts += 1
+                continue
+            finally:
+                self.last_frame_end = loop.time()
+            
+            try:
+                decode_response(response, len(response), req.slave_id, req.function_code, req.start_addr,
+                                expected, compiled.image.values, compiled.offset)
+            except ModbusException:
+                # The slave answered: retrying would get the same exception
+                self.stats.exceptions += 1
+                break
+            except FrameError:
+                self.stats.frame_errors += 1
+                continue
+            
+            image = self.images[(req.slave_id, req.reg_type)]
+            if not req.is_read():
+                # The slave now holds the written values
+                start = req.start_addr - image.base
+                image.values[start:start + req.count] = compiled.image.values[compiled.offset:compiled.offset + req.count]
+            image.updated_at = self.last_frame_end
+            for listener in self.listeners:
+                listener(image, req.start_addr, req.count)
+            return True
+        
+        self.stats.failed += 1
+        return False
+    
+    async def run_cycle(self):
+        for compiled in self.requests:
+            req = compiled.request
+            if req.operation == 'Write' and not req.is_cyclic():
+                if not compiled.pending:
+                    continue
+                compiled.pending = False
+            await self.execute(compiled)
+    
+    async def run(self, cycles=None):
+        """Poll until stop() or for a number of cycles, returns report()"""
+        loop = asyncio.get_running_loop()
+        self.running = True
+        scheduled = loop.time()
+        done = 0
+        while self.running and (cycles is None or done < cycles):
+            start = loop.time()
+            await self.run_cycle()
+            end = loop.time()
+            self.stats.record_cycle(scheduled, start, end)
+            done += 1
+            
+            scheduled += self.cycle_interval_s
+            if scheduled < end:
+                self.stats.overruns += 1
+                scheduled = end
+            if self.running and (cycles is None or done < cycles):
+                await asyncio.sleep(scheduled - loop.time())
+        self.running = False
+        return self.report()
+    
+    def stop(self):
+        self.running = False
+    
+    def report(self):
+        return self.stats.report(self.cycle_interval_s)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Poll the target slaves of a Master config')
+    parser.add_argument('config', help='JSON config or project file')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--tcp', metavar='HOST:PORT', help='RTU over TCP serial server')
+    target.add_argument('--serial', metavar='PORT', help='Serial port (needs pyserial-asyncio)')
+    parser.add_argument('--cycles', type=int, default=10, help='Polling cycles to run')
+    args = parser.parse_args(argv)
+    
+    config = load_config_file(args.config)
+    if not config.get('is_master'):
+        print('Error: not a Master config', file=sys.stderr)
+        return 1
+    cost_model = BusCostModel.from_settings(config.get('settings', {}))
+    
+    async def run():
+        if args.tcp:
+            host, _, port = args.tcp.rpartition(':')
+            transport = await open_tcp_transport(host, int(port), cost_model)
+        else:
+            transport = await open_serial_transport(args.serial, cost_model)
+        try:
+            return await AsyncMaster(config, transport, cost_model).run(args.cycles)
+        finally:
+            await transport.close()
+    
+    report = asyncio.run(run())
+    for key, value in report.items():
+        print(f'{key:>24}: {value:.3f}' if isinstance(value, float) else f'{key:>24}: {value}')
+    return 0 if not report['failed'] else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
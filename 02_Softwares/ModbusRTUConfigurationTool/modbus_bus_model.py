@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+modbus_bus_model.py
+RS485 bus cost model used to decide how register ranges become Modbus RTU requests
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+
+
+# Read function code for each Modbus register type (0=coil, 1=DI, 3=IR, 4=HR)
+READ_FUNCTION_CODES = {0: 0x01, 1: 0x02, 3: 0x04, 4: 0x03}
+
+# Maximum quantity a single read request may carry (Modbus Application Protocol)
+MAX_READ_COUNT = {0: 2000, 1: 2000, 3: 125, 4: 125}
+
+# slave_id + function_code + start_addr(2) + count(2) + crc(2)
+READ_REQUEST_BYTES = 8
+
+# slave_id + function_code + byte_count + crc(2)
+READ_RESPONSE_OVERHEAD_BYTES = 5
+
+# Single writes: slave_id + function_code + addr(2) + value(2) + crc(2), echoed back by the slave;
+# multiple writes get the same echo with the quantity instead of the value
+WRITE_SINGLE_REQUEST_BYTES = 8
+WRITE_RESPONSE_BYTES = 8
+
+# slave_id + function_code + start_addr(2) + count(2) + byte_count + crc(2)
+WRITE_MULTIPLE_OVERHEAD_BYTES = 9
+
+
+def get_setting_values(settings):
+    """Flatten the settings groups into a {var_name: value} dictionary"""
+    values = {}
+    for group in ('common', 'master', 'slave'):
+        for setting in settings.get(group, []):
+            values[setting['var_name']] = setting['value']
+    return values
+
+
+class BusCostModel:
+    """Wire-time cost of Modbus RTU read transactions for one serial line setup"""
+    
+    def __init__(self, baudrate=9600, data_bits=8, parity=0, stop_bits=1, frame_interval_ms=10, response_delay_ms=0):
+        self.baudrate = baudrate
+        self.data_bits = data_bits
+        self.parity = parity
+        self.stop_bits = stop_bits
+        self.frame_interval_ms = frame_interval_ms
+        # Slave turnaround only; gap bridging compares request counts, which it does not change
+        self.response_delay_ms = response_delay_ms
+        
+        # start bit + data bits + optional parity bit + stop bits
+        self.char_bits = 1 + data_bits + (1 if parity else 0) + stop_bits
+        self.char_time_us = self.char_bits * 1000000.0 / baudrate
+        self.t35_us = 3.5 * self.char_time_us
+    
+    @classmethod
+    def from_settings(cls, settings):
+        """Build the model from the configuration tool settings dictionary"""
+        values = get_setting_values(settings or {})
+        
+        def get_int(var_name, default):
+            try:
+                return int(values.get(var_name, default))
+            except (TypeError, ValueError):
+                return default
+        
+        baudrate = get_int('MODBUS_BAUDRATE', 9600)
+        return cls(
+            baudrate=baudrate if baudrate > 0 else 9600,
+            data_bits=get_int('MODBUS_DATA_BITS', 8),
+            parity=get_int('MODBUS_PARITY', 0),
+            stop_bits=get_int('MODBUS_STOP_BITS', 1),
+            frame_interval_ms=get_int('MODBUS_FRAME_INTERVAL_MS', 10),
+            response_delay_ms=get_int('MODBUS_RESPONSE_DELAY_MS', 0)
+        )
+    
+    def payload_bytes(self, reg_type, count):
+        """Number of data bytes carried by a read response"""
+        if reg_type in (0, 1):
+            return (count + 7) // 8
+        return count * 2
+    
+    def read_transaction_us(self, reg_type, count):
+        """Wire time of one read request, its response and the inter-frame gaps"""
+        frame_bytes = READ_REQUEST_BYTES + READ_RESPONSE_OVERHEAD_BYTES + self.payload_bytes(reg_type, count)
+        return (frame_bytes * self.char_time_us
+                + 2 * self.t35_us
+                + self.frame_interval_ms * 1000.0)
+    
+    def write_frame_bytes(self, reg_type, count):
+        """(request, response) bytes of writing count coils or holding registers"""
+        if count == 1:
+            return WRITE_SINGLE_REQUEST_BYTES, WRITE_RESPONSE_BYTES
+        return WRITE_MULTIPLE_OVERHEAD_BYTES + self.payload_bytes(reg_type, count), WRITE_RESPONSE_BYTES
+    
+    def transaction_us(self, reg_type, count, is_write=False):
+        """
+        Bus time of one request of either direction as a master cycle spends it
+        Both frames, the T3.5 silence after each, the slave's response delay and
+        the frame interval.
+        """
+        if is_write:
+            request_bytes, response_bytes = self.write_frame_bytes(reg_type, count)
+            frames_us = (request_bytes + response_bytes) * self.char_time_us
+            return frames_us + 2 * self.t35_us + (self.response_delay_ms + self.frame_interval_ms) * 1000.0
+        return self.read_transaction_us(reg_type, count) + self.response_delay_ms * 1000.0
+    
+    def read_transactions_us(self, requests, payload_bytes):
+        """Wire time of several read transactions from their summed payload bytes"""
+        frame_bytes = requests * (READ_REQUEST_BYTES + READ_RESPONSE_OVERHEAD_BYTES) + payload_bytes
+        return frame_bytes * self.char_time_us + requests * (2 * self.t35_us + self.frame_interval_ms * 1000.0)
+    
+    def ranges_time_us(self, ranges):
+        """Total wire time of reading every range once"""
+        return sum(self.read_transaction_us(rng['type'], rng['count']) for rng in ranges)
+    
+    def should_bridge(self, reg_type, start, end, next_addr):
+        """Return True when reading the gap before next_addr is cheaper than a new request"""
+        merged = self.read_transaction_us(reg_type, next_addr - start + 1)
+        separate = (self.read_transaction_us(reg_type, end - start + 1)
+                    + self.read_transaction_us(reg_type, 1))
+        return merged < separate
+
+
+def iter_coalesced_ranges(addresses, reg_type, cost_model=None, max_count=None, first=0):
+    """Yield the (start, end) ranges coalesce_addresses() builds from addresses[first:]"""
+    if first >= len(addresses):
+        return
+    
+    bridge_limit = max_count or MAX_READ_COUNT.get(reg_type, 125)
+    start = addresses[first]
+    end = addresses[first]
+    
+    for addr in islice(addresses, first + 1, None):
+        if addr == end:
+            continue
+        if max_count is not None and addr - start + 1 > max_count:
+            yield start, end
+            start = addr
+            end = addr
+        elif addr == end + 1:
+            end = addr
+        elif (cost_model is not None
+              and addr - start + 1 <= bridge_limit
+              and cost_model.should_bridge(reg_type, start, end, addr)):
+            end = addr
+        else:
+            yield start, end
+            start = addr
+            end = addr
+    
+    yield start, end
+
+
+def coalesce_addresses(addresses, reg_type, cost_model=None, max_count=None):
+    """
+    Group sorted addresses into ranges
+    Without a cost model only strictly adjacent addresses are merged, otherwise
+    gaps are bridged whenever padding is cheaper than an extra round-trip. Reads
+    only get a cost model with MODBUS_BRIDGE_GAPS: generated slaves reject reads
+    of addresses they do not map.
+    With max_count every range is split so it fits into a single request.
+    """
+    return [{'start': start, 'count': end - start + 1, 'type': reg_type}
+            for start, end in iter_coalesced_ranges(addresses, reg_type, cost_model, max_count)]
+
+
+class RangeSet:
+    """
+    Addresses of one register type and their coalesced ranges, kept up to date per address
+    An edit re-coalesces from the range before the address until a range starts
+    where an old one did; from there on the greedy scan would repeat itself.
+    """
+    
+    def __init__(self, reg_type, cost_model=None, max_count=None, addresses=(), ranges=None):
+        self.reg_type = reg_type
+        self.cost_model = cost_model
+        self.max_count = max_count
+        
+        # Duplicate addresses are counted so removing one copy keeps the range
+        self.counts = {}
+        for addr in addresses:
+            self.counts[addr] = self.counts.get(addr, 0) + 1
+        self.addresses = sorted(self.counts)
+        
+        # ranges may be passed in when already known, e.g. from the range engine
+        if ranges is None:
+            ranges = iter_coalesced_ranges(self.addresses, reg_type, cost_model, max_count)
+        self.starts = []
+        self.ends = []
+        for start, end in ranges:
+            self.starts.append(start)
+            self.ends.append(end)
+    
+    def __len__(self):
+        return len(self.starts)
+    
+    def ranges(self):
+        return list(zip(self.starts, self.ends))
+    
+    def add(self, addr):
+        """Insert addr, returns (first range index, removed ranges, new ranges) or None"""
+        count = self.counts.get(addr, 0)
+        self.counts[addr] = count + 1
+        if count:
+            return None
+        insort(self.addresses, addr)
+        return self._recoalesce(addr)
+    
+    def remove(self, addr):
+        """Remove one copy of addr, returns (first range index, removed ranges, new ranges) or None"""
+        count = self.counts.get(addr, 0)
+        if count > 1:
+            self.counts[addr] = count - 1
+        if count != 1:
+            return None
+        del self.counts[addr]
+        del self.addresses[bisect_left(self.addresses, addr)]
+        return self._recoalesce(addr)
+    
+    def _recoalesce(self, addr):
+        # The range before the one holding addr may bridge into it once addr changes
+        first = max(bisect_right(self.starts, addr) - 2, 0)
+        scan_from = min(self.starts[first], addr) if self.starts else addr
+        
+        starts = []
+        ends = []
+        last = len(self.starts)
+        for start, end in iter_coalesced_ranges(self.addresses, self.reg_type, self.cost_model, self.max_count,
+                                                bisect_left(self.addresses, scan_from)):
+            if start > addr:
+                old = bisect_left(self.starts, start)
+                if old < len(self.starts) and self.starts[old] == start:
+                    last = old
+                    break
+            starts.append(start)
+            ends.append(end)
+        
+        removed = list(zip(self.starts[first:last], self.ends[first:last]))
+        self.starts[first:last] = starts
+        self.ends[first:last] = ends
+        return first, removed, list(zip(starts, ends))
+
+
+def compare_ranges(strict_ranges, coalesced_ranges, cost_model):
+    """Report requests and wire time per cycle saved by coalescing"""
+    strict_time_us = cost_model.ranges_time_us(strict_ranges)
+    coalesced_time_us = cost_model.ranges_time_us(coalesced_ranges)
+    
+    return {
+        'strict_requests': len(strict_ranges),
+        'requests': len(coalesced_ranges),
+        'saved_requests': len(strict_ranges) - len(coalesced_ranges),
+        'strict_time_us': strict_time_us,
+        'time_us': coalesced_time_us,
+        'saved_time_us': strict_time_us - coalesced_time_us
+    }
@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+"""
+modbus_bus_simulation.py
+Discrete-event simulation of a Master config polling simulated slaves on a virtual RS485 clock
+
+Time is an integer number of ticks fine enough for whole half bits and whole
+microseconds, so wire times, T1.5/T3.5 silences and the millisecond settings are
+exact and a scenario always replays to the same statistics. A fault-free steady
+state is fast-forwarded a cycle pattern at a time.
+
+Usage: python modbus_bus_simulation.py CONFIG [SLAVE_CONFIG ...] [--hours H | --cycles N] [--loss-rate P] [--tolerant]
+"""
+
+import argparse
+import random
+import sys
+import time
+from math import lcm
+
+from modbus_async_master import get_master_timing
+from modbus_bus_model import BusCostModel
+from modbus_frame_delimiter import FIXED_INTERVAL_BAUDRATE, FIXED_T15_US, FIXED_T35_US
+from modbus_poll_planner import PollPlanner
+from modbus_project_store import load_config_file
+from modbus_register_model import normalize_config
+from modbus_rtu_codec import (FC_WRITE_MULTIPLE_COILS, FC_WRITE_MULTIPLE_REGISTERS,
+                              FC_WRITE_SINGLE_COIL, FC_WRITE_SINGLE_REGISTER, encode_read_request,
+                              encode_write_multiple_coils, encode_write_multiple_registers, encode_write_single_coil,
+                              encode_write_single_register, new_adu_buffer)
+from modbus_slave_simulator import get_config_slaves
+
+
+# Transaction outcomes as seen by the master
+OK = 'ok'
+EXCEPTION = 'exception'
+FRAME_ERROR = 'frame_error'
+TIMEOUT = 'timeout'
+
+
+class VirtualClock:
+    """Integer tick timing of one serial line"""
+    
+    def __init__(self, cost_model):
+        self.cost_model = cost_model
+        # Whole half bits for T1.5/T3.5 below 19200 baud, whole microseconds for everything else
+        self.ticks_per_second = lcm(2 * cost_model.baudrate, 1000000)
+        self.bit_ticks = self.ticks_per_second // cost_model.baudrate
+        self.char_ticks = cost_model.char_bits * self.bit_ticks
+        if cost_model.baudrate > FIXED_INTERVAL_BAUDRATE:
+            self.t15 = self.us(FIXED_T15_US)
+            self.t35 = self.us(FIXED_T35_US)
+        else:
+            self.t15 = 3 * self.char_ticks // 2
+            self.t35 = 7 * self.char_ticks // 2
+    
+    def us(self, us):
+        return us * self.ticks_per_second // 1000000
+    
+    def ms(self, ms):
+        return ms * self.ticks_per_second // 1000
+    
+    def to_ms(self, ticks):
+        return ticks * 1000.0 / self.ticks_per_second
+    
+    def frame_ticks(self, length, gap=0):
+        """Wire time of a frame of length characters with gap ticks between characters"""
+        return length * self.char_ticks + (length - 1) * gap
+
+
+class SlaveTiming:
+    """When a simulated slave answers: processing time, MODBUS_RESPONSE_DELAY_MS and gaps between characters"""
+    
+    def __init__(self, clock, response_delay_ms=0, processing_us=0, char_gap_us=0):
+        self.turnaround = clock.us(processing_us) + clock.ms(response_delay_ms)
+        self.char_gap = clock.us(char_gap_us)
+
+
+class SimulatedTransaction:
+    """A planned request with its request and response frames worked out once"""
+    
+    __slots__ = ('request', 'slave_id', 'pending', 'request_ticks', 'response_length', 'response_ticks',
+                 'is_exception', 'timing', 'done_ticks', 'simple')
+    
+    def __init__(self, request, slave, timing, clock, timeout):
+        self.request = request
+        self.slave_id = request.slave_id
+        self.timing = timing
+        # One-time writes are sent once, in the first cycle
+        self.pending = True
+        
+        buf = new_adu_buffer()
+        length = encode_request(buf, request)
+        self.request_ticks = clock.frame_ticks(length)
+        
+        # Register values never change frame lengths, so each slave answers a request once
+        self.response_length = 0
+        self.is_exception = False
+        if slave is not None:
+            response = slave.handle_request(bytes(buf[:length]))
+            self.response_length = len(response)
+            self.is_exception = bool(response[1] & 0x80)
+        
+        # Request start to the master seeing the T3.5 silence after the response
+        self.response_ticks = 0
+        self.done_ticks = None
+        self.simple = False
+        if slave is not None:
+            self.response_ticks = clock.frame_ticks(self.response_length, timing.char_gap)
+            self.done_ticks = self.request_ticks + clock.t35 + timing.turnaround + self.response_ticks + clock.t35
+            self.simple = (timing.char_gap <= clock.t15
+                           and self.done_ticks - self.request_ticks <= timeout)
+
+
+def encode_request(buf, request):
+    """Request ADU of a planned request with all values 0, returns its length"""
+    fc = request.function_code
+    if request.is_read():
+        return encode_read_request(buf, request.slave_id, fc, request.start_addr, request.count)
+    if fc == FC_WRITE_SINGLE_COIL:
+        return encode_write_single_coil(buf, request.slave_id, request.start_addr, False)
+    if fc == FC_WRITE_SINGLE_REGISTER:
+        return encode_write_single_register(buf, request.slave_id, request.start_addr, 0)
+    if fc == FC_WRITE_MULTIPLE_COILS:
+        return encode_write_multiple_coils(buf, request.slave_id, request.start_addr, [0] * request.count)
+    if fc == FC_WRITE_MULTIPLE_REGISTERS:
+        return encode_write_multiple_registers(buf, request.slave_id, request.start_addr, [0] * request.count)
+    raise ValueError(f'FC{fc:02X} is not a planned function code')
+
+
+class SimulationStats:
+    """Cycle timing in ticks and transaction outcomes, recorded like CycleStats"""
+    
+    COUNTERS = ('transactions', 'timeouts', 'frame_errors', 'exceptions', 'retries', 'failed', 'collisions')
+    
+    def __init__(self):
+        self.cycles = 0
+        self.overruns = 0
+        self.first_start = None
+        self.last_start = None
+        self.busy_total = 0
+        self.busy_min = None
+        self.busy_max = 0
+        self.max_lateness = 0
+        self.wire_ticks = 0
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+    
+    def get_counters(self):
+        return tuple(getattr(self, name) for name in self.COUNTERS) + (self.wire_ticks,)
+    
+    def add_counters(self, deltas, repeat):
+        for name, delta in zip(self.COUNTERS, deltas):
+            setattr(self, name, getattr(self, name) + delta * repeat)
+        self.wire_ticks += deltas[-1] * repeat
+    
+    def record_cycle(self, scheduled, start, end, period=0, repeat=1):
+        """Record repeat identical cycles, each starting period ticks after the previous one"""
+        if self.first_start is None:
+            self.first_start = start
+        self.last_start = start + (repeat - 1) * period
+        self.cycles += repeat
+        busy = end - start
+        self.busy_total += busy * repeat
+        self.busy_min = busy if self.busy_min is None else min(self.busy_min, busy)
+        self.busy_max = max(self.busy_max, busy)
+        self.max_lateness = max(self.max_lateness, start - scheduled)
+
+
+class BusSimulation:
+    """
+    A Master config's poll cycles on a virtual bus, with the cycle schedule of AsyncMaster
+    The master follows modbus_rtu_master.c: the response timeout runs from the end
+    of the request and the first frame it delimits decides the transaction. Each
+    frame needs T3.5 of silence on both sides, so a late response running into
+    the next request corrupts both, and a gap above T1.5 inside a frame invalidates
+    it. loss_rate drops requests, corrupt_rate damages responses, both drawn
+    from a generator seeded with seed. Slaves built from the config are strict
+    like the firmware unless tolerant=True, which only a config with
+    MODBUS_BRIDGE_GAPS polling third-party devices calls for.
+    """
+    
+    def __init__(self, config, slaves=None, cost_model=None, loss_rate=0.0, corrupt_rate=0.0, seed=0,
+                 processing_us=0, char_gap_us=0, tolerant=False):
+        self.config = normalize_config(config)
+        if not self.config.get('is_master'):
+            raise ValueError('Bus simulation needs a Master config')
+        settings = self.config.get('settings', {})
+        self.cost_model = cost_model or BusCostModel.from_settings(settings)
+        self.clock = VirtualClock(self.cost_model)
+        
+        timing = get_master_timing(settings)
+        self.timeout = self.clock.ms(timing['timeout_ms'])
+        self.frame_interval = self.clock.ms(timing['frame_interval_ms'])
+        self.cycle_interval = self.clock.ms(timing['cycle_interval_ms'])
+        self.max_retries = timing['max_retries']
+        
+        if slaves is None:
+            slaves = get_config_slaves(self.config, tolerant=tolerant)
+        self.slaves = {slave.slave_id: slave for slave in slaves}
+        self.slave_timings = {
+            slave.slave_id: SlaveTiming(self.clock, slave.response_delay_ms, processing_us, char_gap_us)
+            for slave in slaves
+        }
+        
+        self.transactions = [
+            SimulatedTransaction(req, self.slaves.get(req.slave_id), self.slave_timings.get(req.slave_id),
+                                 self.clock, self.timeout)
+            for req in PollPlanner(self.config, self.cost_model).plan()
+        ]
+        
+        self.loss_rate = loss_rate
+        self.corrupt_rate = corrupt_rate
+        self.random = random.Random(seed)
+        
+        self.stats = SimulationStats()
+        self.now = 0
+        self.scheduled = 0
+        self.last_frame_end = None
+        # Slave transmissions still on the bus or within T3.5 of it: (start, end, sender, valid)
+        self.transmissions = []
+    
+    def _draw(self, rate):
+        return rate > 0 and self.random.random() < rate
+    
+    def _transact(self, transaction, start):
+        """Send one request at tick start, returns (outcome, tick the master is done)"""
+        clock = self.clock
+        t35 = clock.t35
+        request_end = start + transaction.request_ticks
+        self.stats.wire_ticks += transaction.request_ticks
+        lost = self._draw(self.loss_rate)
+        
+        if self.transmissions:
+            self.transmissions = [tr for tr in self.transmissions if tr[1] + t35 > start]
+        if not self.transmissions and transaction.simple:
+            # Idle bus and a slave answering in time: no frame can interfere
+            if lost:
+                return TIMEOUT, request_end + self.timeout
+            self.stats.wire_ticks += transaction.response_ticks
+            if self._draw(self.corrupt_rate):
+                return FRAME_ERROR, start + transaction.done_ticks
+            return (EXCEPTION if transaction.is_exception else OK), start + transaction.done_ticks
+        
+        # The request reaches its slave only with T3.5 of silence around it
+        if any(tr[0] < request_end + t35 and tr[1] + t35 > start for tr in self.transmissions):
+            self.stats.collisions += 1
+            lost = True
+        
+        timing = transaction.timing
+        if timing is not None and not lost:
+            response_start = request_end + t35 + timing.turnaround
+            length = transaction.response_length
+            gap = timing.char_gap
+            if gap >= t35:
+                # Every character is a frame of its own
+                for n in range(length):
+                    char_start = response_start + n * (clock.char_ticks + gap)
+                    self.transmissions.append((char_start, char_start + clock.char_ticks, transaction.slave_id, False))
+            else:
+                valid = gap <= clock.t15 and not self._draw(self.corrupt_rate)
+                end = response_start + clock.frame_ticks(length, gap)
+                self.transmissions.append((response_start, end, transaction.slave_id, valid))
+            self.stats.wire_ticks += length * clock.char_ticks
+            self.transmissions.sort()
+        
+        # The first frame delimited after the request decides, unless the timeout ends the wait first
+        deadline = request_end + self.timeout
+        frame = None
+        for tr in self.transmissions:
+            if tr[1] <= request_end:
+                continue
+            if frame is None:
+                # A transmission already running when the master started listening is a torn frame
+                frame = [tr[1], tr[0] >= request_end and tr[2] == transaction.slave_id and tr[3]]
+            elif tr[0] < frame[0] + t35:
+                frame = [max(frame[0], tr[1]), False]
+            else:
+                break
+        if frame is None or frame[0] + t35 > deadline:
+            return TIMEOUT, deadline
+        if not frame[1]:
+            return FRAME_ERROR, frame[0] + t35
+        return (EXCEPTION if transaction.is_exception else OK), frame[0] + t35
+    
+    def _execute(self, transaction):
+        """One request with retries like AsyncMaster.execute()"""
+        stats = self.stats
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                stats.retries += 1
+            if self.last_frame_end is not None:
+                self.now = max(self.now, self.last_frame_end + self.frame_interval)
+            stats.transactions += 1
+            outcome, self.now = self._transact(transaction, self.now)
+            self.last_frame_end = self.now
+            if outcome == OK:
+                return True
+            if outcome == EXCEPTION:
+                stats.exceptions += 1
+                break
+            if outcome == TIMEOUT:
+                stats.timeouts += 1
+            else:
+                stats.frame_errors += 1
+        stats.failed += 1
+        return False
+    
+    def _run_cycle(self):
+        for transaction in self.transactions:
+            req = transaction.request
+            if req.operation == 'Write' and not req.is_cyclic():
+                if not transaction.pending:
+                    continue
+                transaction.pending = False
+            self._execute(transaction)
+    
+    def run(self, duration_s=None, cycles=None):
+        """
+        Simulate cycles starting within duration_s of virtual time, or a number of cycles
+        Returns report().
+        """
+        if duration_s is None and cycles is None:
+            raise ValueError('Give a duration or a number of cycles')
+        end_tick = None if duration_s is None else round(duration_s * self.clock.ticks_per_second)
+        stats = self.stats
+        scheduled = self.scheduled
+        done = 0
+        previous = None
+        fast_forward = self.loss_rate == 0 and self.corrupt_rate == 0
+        
+        while (cycles is None or done < cycles) and (end_tick is None or scheduled < end_tick):
+            self.now = max(self.now, scheduled)
+            start = self.now
+            counters = stats.get_counters()
+            self._run_cycle()
+            end = self.now
+            stats.record_cycle(scheduled, start, end)
+            done += 1
+            
+            next_scheduled = scheduled + self.cycle_interval
+            overrun = next_scheduled < end
+            if overrun:
+                stats.overruns += 1
+                next_scheduled = end
+            
+            # Without random faults a cycle repeating the previous one relative to its
+            # start, on an idle bus, repeats forever: skip ahead by whole cycles
+            deltas = tuple(after - before for after, before in zip(stats.get_counters(), counters))
+            pattern = (start - scheduled, end - start, next_scheduled - start,
+                       self.last_frame_end - start, overrun, deltas)
+            if fast_forward and pattern == previous and not self.transmissions:
+                period = next_scheduled - start
+                repeat = None if cycles is None else cycles - done
+                if end_tick is not None and period > 0:
+                    # Cycles whose schedule point falls before end_tick
+                    fit = (end_tick - next_scheduled + period - 1) // period
+                    repeat = fit if repeat is None else min(repeat, fit)
+                if repeat and repeat > 0 and period > 0:
+                    first = next_scheduled + (start - scheduled)
+                    stats.record_cycle(next_scheduled, first, first + end - start, period, repeat)
+                    stats.add_counters(deltas, repeat)
+                    if overrun:
+                        stats.overruns += repeat
+                    done += repeat
+                    shift = period * repeat
+                    next_scheduled += shift
+                    self.now = end + shift
+                    self.last_frame_end += shift
+            previous = pattern
+            scheduled = next_scheduled
+        self.scheduled = scheduled
+        return self.report()
+    
+    def report(self):
+        """Achieved against configured timing like AsyncMaster.report(), plus exact tick values"""
+        stats = self.stats
+        clock = self.clock
+        period = 0
+        if stats.cycles > 1:
+            period = (stats.last_start - stats.first_start) / (stats.cycles - 1)
+        busy = stats.busy_total / stats.cycles if stats.cycles else 0
+        simulated = (stats.last_start or 0) - (stats.first_start or 0) + (busy if stats.cycles else 0)
+        return {
+            'cycles': stats.cycles,
+            'simulated_s': simulated / clock.ticks_per_second,
+            'configured_interval_ms': clock.to_ms(self.cycle_interval),
+            'achieved_period_ms': clock.to_ms(period),
+            'mean_busy_ms': clock.to_ms(busy),
+            'min_busy_ms': clock.to_ms(stats.busy_min or 0),
+            'max_busy_ms': clock.to_ms(stats.busy_max),
+            'max_lateness_ms': clock.to_ms(stats.max_lateness),
+            'utilization': busy / self.cycle_interval if self.cycle_interval else 0.0,
+            'wire_utilization': stats.wire_ticks / self.now if self.now else 0.0,
+            'overruns': stats.overruns,
+            'transactions': stats.transactions,
+            'timeouts': stats.timeouts,
+            'frame_errors': stats.frame_errors,
+            'exceptions': stats.exceptions,
+            'collisions': stats.collisions,
+            'retries': stats.retries,
+            'failed': stats.failed,
+            'ticks_per_second': clock.ticks_per_second,
+            'busy_total_ticks': stats.busy_total,
+            'wire_ticks': stats.wire_ticks
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate the poll cycles of a Master config on a virtual clock')
+    parser.add_argument('config', help='Master JSON config or project file')
+    parser.add_argument('slave_configs', nargs='*',
+                        help='Configs of the slaves, built from the Master config\'s slave lists by default')
+    length = parser.add_mutually_exclusive_group()
+    length.add_argument('--hours', type=float, default=24.0, help='Virtual time to simulate')
+    length.add_argument('--cycles', type=int, help='Cycles to simulate')
+    parser.add_argument('--loss-rate', type=float, default=0.0, help='Probability a request is lost')
+    parser.add_argument('--corrupt-rate', type=float, default=0.0, help='Probability a response is damaged')
+    parser.add_argument('--seed', type=int, default=0, help='Fault generator seed')
+    parser.add_argument('--processing-us', type=int, default=0, help='Slave processing time before the response delay')
+    parser.add_argument('--char-gap-us', type=int, default=0, help='Gap between the characters of responses')
+    parser.add_argument('--tolerant', action='store_true',
+                        help='Slaves answer unconfigured addresses like third-party devices; the firmware rejects them')
+    args = parser.parse_args(argv)
+    
+    config = load_config_file(args.config)
+    slaves = None
+    if args.slave_configs:
+        slaves = []
+        for filename in args.slave_configs:
+            slaves.extend(get_config_slaves(load_config_file(filename), tolerant=args.tolerant))
+    try:
+        simulation = BusSimulation(config, slaves, loss_rate=args.loss_rate, corrupt_rate=args.corrupt_rate,
+                                   seed=args.seed, processing_us=args.processing_us, char_gap_us=args.char_gap_us,
+                                   tolerant=args.tolerant)
+    except ValueError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    
+    start = time.perf_counter()
+    if args.cycles is not None:
+        report = simulation.run(cycles=args.cycles)
+    else:
+        report = simulation.run(duration_s=args.hours * 3600.0)
+    elapsed = time.perf_counter() - start
+    
+    for key, value in report.items():
+        print(f'{key:>24}: {value:.6f}' if isinstance(value, float) else f'{key:>24}: {value}')
+    print(f"{'wall_time_s':>24}: {elapsed:.3f}")
+    return 0 if not report['failed'] else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
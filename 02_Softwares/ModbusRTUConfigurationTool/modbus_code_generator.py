@@ -4,97 +4,303 @@ modbus_code_generator.py
 Enhanced Generate C/H files for Modbus RTU Configuration with Operation/Mode support
 """
 
-import re
+import base64
+import hashlib
+import io
+import itertools
+import json
+import os
+import tempfile
+import zlib
+
+from modbus_poll_planner import PollPlanner
+from modbus_range_engine import get_register_ranges
+from modbus_register_model import (MODBUS_TYPES, RegisterTable, compact_to_config, config_to_compact,
+                                   config_to_json, get_config_registers, make_register, normalize_config)
+from modbus_rtu_codec import encode_read_request, get_response_length, new_adu_buffer
+
+
+# Source files whose content decides the generated output
+GENERATOR_MODULES = ['modbus_code_generator.py', 'modbus_bus_model.py', 'modbus_poll_planner.py',
+                     'modbus_range_engine.py', 'modbus_register_model.py', 'modbus_rtu_codec.py']
+
+# Written next to the outputs, maps the input hash to the hashes of the generated files
+MANIFEST_FILENAME = 'modbus_registers.manifest.json'
+
+OUTPUT_FILENAMES = ['modbus_registers.h', 'modbus_registers.c']
+
+# Config block at the end of the header, read back by parse_header()
+CONFIG_BLOCK_VERSION = 1
+CONFIG_BLOCK_BEGIN = 'MODBUS_CONFIG_BEGIN'
+CONFIG_BLOCK_END = 'MODBUS_CONFIG_END'
+
+# "<Type> internal addresses" section comments of the header
+SECTION_TYPES = {'Holding Register': 4, 'Input Register': 3, 'Coil': 0, 'Discrete Input': 1}
+
+
+def hash_file(path):
+    """SHA-256 of a file's bytes, None if it does not exist"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+_generator_fingerprint = None
+
+
+def get_generator_fingerprint():
+    """Hash of the generator sources, so editing the generator invalidates manifests"""
+    global _generator_fingerprint
+    if _generator_fingerprint is None:
+        digest = hashlib.sha256()
+        module_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in GENERATOR_MODULES:
+            digest.update(name.encode('utf-8'))
+            digest.update((hash_file(os.path.join(module_dir, name)) or '').encode('ascii'))
+        _generator_fingerprint = digest.hexdigest()
+    return _generator_fingerprint
+
+
+def write_config_block(write, config):
+    """
+    Stream the config as a C comment: zlib compressed compact JSON in base64 lines
+    The END line carries the version, the payload length and a CRC-32 of the JSON,
+    so a reader can seek straight to the payload from the end of the file.
+    """
+    data = json.dumps(config_to_compact(config), separators=(',', ':')).encode('utf-8')
+    encoded = base64.b64encode(zlib.compress(data, 9)).decode('ascii')
+    payload = ''.join(encoded[i:i + 76] + '\n' for i in range(0, len(encoded), 76))
+    
+    write('\n/* Configuration tool data for Import Header, do not edit\n')
+    write(f'{CONFIG_BLOCK_BEGIN} v{CONFIG_BLOCK_VERSION}\n')
+    write(payload)
+    write(f'{CONFIG_BLOCK_END} v{CONFIG_BLOCK_VERSION} bytes={len(payload)} crc32={zlib.crc32(data):08x} */\n')
+
+
+def read_config_block(filename):
+    """Config stored by write_config_block(), None when missing, unsupported or corrupted"""
+    with open(filename, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 256))
+        tail = f.read()
+        
+        end = tail.rfind(CONFIG_BLOCK_END.encode('ascii'))
+        if end < 0:
+            return None
+        try:
+            _, version, length, crc = tail[end:].split()[:4]
+            if version != f'v{CONFIG_BLOCK_VERSION}'.encode('ascii'):
+                return None
+            length = int(length[len(b'bytes='):])
+            crc = int(crc[len(b'crc32='):], 16)
+        except ValueError:
+            return None
+        
+        # The payload sits between the BEGIN line and the END line
+        begin = f'{CONFIG_BLOCK_BEGIN} v{CONFIG_BLOCK_VERSION}\n'.encode('ascii')
+        payload_start = size - len(tail) + end - length
+        if payload_start < len(begin):
+            return None
+        f.seek(payload_start - len(begin))
+        if f.read(len(begin)) != begin:
+            return None
+        payload = f.read(length)
+    
+    try:
+        data = zlib.decompress(base64.b64decode(payload))
+    except (ValueError, zlib.error):
+        return None
+    if zlib.crc32(data) != crc:
+        return None
+    return compact_to_config(json.loads(data.decode('utf-8')))
 
 
 class ModbusCodeGenerator:
-    def __init__(self, config):
-        self.config = config
+    # (modbus_type, C name stem, title) for the per-type lookup and run tables
+    LOOKUP_TYPES = [
+        (4, 'holding_register', 'Holding Register'),
+        (3, 'input_register', 'Input Register'),
+        (0, 'coil', 'Coil'),
+        (1, 'discrete_input', 'Discrete Input')
+    ]
+    
+    # Function code names for poll plan and read frame comments
+    FUNCTION_NAMES = {
+        0x01: 'Read Coils',
+        0x02: 'Read DI',
+        0x03: 'Read Holding Regs',
+        0x04: 'Read Input Regs',
+        0x05: 'Write Coil',
+        0x06: 'Write Holding Reg',
+        0x0F: 'Write Coils',
+        0x10: 'Write Holding Regs'
+    }
     
-    def generate_files(self, output_dir):
-        """Generate enhanced .h and .c files"""
+    def __init__(self, config, lookup_strategy='auto', lookup_flash_budget=1024, bridge_gaps=None):
+        self.config = normalize_config(config)
+        self.lookup_strategy = lookup_strategy
+        self.lookup_flash_budget = lookup_flash_budget
+        # None follows the config's MODBUS_BRIDGE_GAPS setting
+        self.bridge_gaps = bridge_gaps
+        self.lookup_strategies = {}
+        self.range_report = None
+        self.poll_plan = []
+        self.read_frames = []
+    
+    def generate_files(self, output_dir, manifest=False):
+        """
+        Generate enhanced .h and .c files
+        Files whose content is unchanged are left untouched so their timestamps
+        do not trigger a firmware rebuild. With manifest=True the input and
+        output hashes are recorded for is_up_to_date().
+        Returns the names of the files that were (re)written.
+        """
         all_registers = self._get_all_registers()
         optimized_ranges = self._get_optimized_ranges(all_registers)
+        layout = RegisterTable(all_registers, self.config['is_master'])
+        
+        writers = [
+            lambda write: self._write_header(write, optimized_ranges, all_registers, layout),
+            lambda write: self._write_source(write, optimized_ranges, layout)
+        ]
+        
+        written = []
+        output_hashes = {}
+        for filename, writer in zip(OUTPUT_FILENAMES, writers):
+            output_hashes[filename], changed = self._write_if_changed(os.path.join(output_dir, filename), writer)
+            if changed:
+                written.append(filename)
         
-        header_content = self._generate_header(optimized_ranges, all_registers)
-        with open(f'{output_dir}/modbus_registers.h', 'w', encoding='utf-8') as f:
-            f.write(header_content)
+        if manifest:
+            self._write_manifest(output_dir, output_hashes)
+        
+        return written
+    
+    def get_input_hash(self):
+        """Hash of everything the output depends on: config, options and generator sources"""
+        digest = hashlib.sha256()
+        digest.update(get_generator_fingerprint().encode('ascii'))
+        digest.update(f'{self.lookup_strategy}:{self.lookup_flash_budget}:{self.bridge_gaps}'.encode('utf-8'))
+        # Key order is kept: the order of slaves and registers decides array indices
+        digest.update(json.dumps(config_to_json(self.config), separators=(',', ':')).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def is_up_to_date(self, output_dir):
+        """True when the manifest matches this config and the outputs on disk are unmodified"""
+        try:
+            with open(os.path.join(output_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+                recorded = json.load(f)
+        except (OSError, ValueError):
+            return False
         
-        source_content = self._generate_source(optimized_ranges, all_registers)
-        with open(f'{output_dir}/modbus_registers.c', 'w', encoding='utf-8') as f:
-            f.write(source_content)
+        if recorded.get('input_hash') != self.get_input_hash():
+            return False
+        outputs = recorded.get('outputs', {})
+        return all(outputs.get(filename) is not None
+                   and hash_file(os.path.join(output_dir, filename)) == outputs[filename]
+                   for filename in OUTPUT_FILENAMES)
+    
+    def _write_manifest(self, output_dir, output_hashes):
+        manifest = {
+            'input_hash': self.get_input_hash(),
+            'outputs': output_hashes
+        }
+        self._write_if_changed(os.path.join(output_dir, MANIFEST_FILENAME),
+                               lambda write: write(json.dumps(manifest, indent=2, sort_keys=True) + '\n'))
+    
+    def _write_if_changed(self, path, writer):
+        """
+        Stream writer's output to a temporary file next to path and replace path
+        only if the content hash differs. Returns (hash, changed).
+        Output is encoded as UTF-8 with LF line endings on every platform.
+        """
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                         prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                def write(text):
+                    data = text.encode('utf-8')
+                    digest.update(data)
+                    f.write(data)
+                writer(write)
+            
+            new_hash = digest.hexdigest()
+            if hash_file(path) == new_hash:
+                os.remove(temp_path)
+                return new_hash, False
+            os.replace(temp_path, path)
+            return new_hash, True
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    def _generate_header(self, optimized_ranges, all_registers):
+        """Generate enhanced .h file content"""
+        out = io.StringIO()
+        self._write_header(out.write, optimized_ranges, all_registers,
+                           RegisterTable(all_registers, self.config['is_master']))
+        return out.getvalue()
+    
+    def _generate_source(self, optimized_ranges, all_registers):
+        """Generate enhanced .c file content"""
+        out = io.StringIO()
+        self._write_source(out.write, optimized_ranges, RegisterTable(all_registers, self.config['is_master']))
+        return out.getvalue()
     
     def _get_all_registers(self):
         """Get all registers from config"""
-        all_registers = []
-        
-        if self.config['is_master']:
-            if 'slave_registers' in self.config:
-                for slave_id, registers in self.config['slave_registers'].items():
-                    for reg in registers:
-                        reg_with_slave = reg.copy()
-                        reg_with_slave['slave_id'] = slave_id
-                        all_registers.append(reg_with_slave)
-        else:
-            all_registers = self.config['registers']
-        
-        return all_registers
+        return get_config_registers(self.config)
     
     def _get_optimized_ranges(self, registers):
         """Calculate optimized register ranges"""
+        self.range_report = None
+        self.poll_plan = []
+        self.read_frames = []
         if not registers:
             return []
         
-        type_groups = {}
-        for reg in registers:
-            modbus_type = reg.get('modbus_type', [0, 1, 3, 4][reg['type']])
-            
-            if modbus_type not in type_groups:
-                type_groups[modbus_type] = []
-            type_groups[modbus_type].append(reg['internal_address'])
-        
-        optimized_ranges = []
-        for modbus_type, addresses in type_groups.items():
-            addresses.sort()
-            ranges = self._create_ranges(addresses, modbus_type)
-            optimized_ranges.extend(ranges)
+        # Master ranges are the planned requests: per slave, per function code, PDU-limited
+        if self.config['is_master']:
+            planner = PollPlanner(self.config, bridge_gaps=self.bridge_gaps)
+            self.poll_plan = planner.plan()
+            self.read_frames = self._get_read_frames()
+            self.range_report = planner.report
+            # Generated slaves reject unmapped addresses: unless bridging was asked for,
+            # every read frame must be exactly one strict range
+            if not planner.bridge_gaps and len(self.read_frames) != planner.strict_read_count:
+                raise ValueError(f'{len(self.read_frames)} read frames for {planner.strict_read_count} strict ranges')
+            return [request.to_range() for request in self.poll_plan]
         
-        return optimized_ranges
+        return get_register_ranges(registers)
     
-    def _create_ranges(self, addresses, reg_type):
-        """Create register ranges from addresses"""
-        if not addresses:
-            return []
-        
-        ranges = []
-        start = addresses[0]
-        count = 1
-        
-        for i in range(1, len(addresses)):
-            if addresses[i] == addresses[i-1] + 1:
-                count += 1
-            else:
-                ranges.append({'start': start, 'count': count, 'type': reg_type})
-                start = addresses[i]
-                count = 1
-        
-        ranges.append({'start': start, 'count': count, 'type': reg_type})
-        
-        return ranges
+    def _get_read_frames(self):
+        """(poll plan index, request, ADU with CRC, expected response length) of every planned read"""
+        buf = new_adu_buffer()
+        frames = []
+        for index, req in enumerate(self.poll_plan):
+            if req.is_read():
+                length = encode_read_request(buf, req.slave_id, req.function_code, req.start_addr, req.count)
+                frames.append((index, req, bytes(buf[:length]), get_response_length(req.function_code, req.count)))
+        return frames
     
-    def _generate_header(self, optimized_ranges, all_registers):
-        """Generate enhanced .h file content"""
-        reg_by_type = {0: [], 1: [], 3: [], 4: []}
-        for reg in all_registers:
-            modbus_type = reg.get('modbus_type', [0, 1, 3, 4][reg['type']])
-            reg_by_type[modbus_type].append(reg)
+    def _write_header(self, write, optimized_ranges, all_registers, layout):
+        """Stream the enhanced .h file content"""
+        reg_by_type = layout.by_type
         
         coil_count = len(reg_by_type[0])
         di_count = len(reg_by_type[1])
         ir_count = len(reg_by_type[3])
         hr_count = len(reg_by_type[4])
         
-        header = '''/**
+        write('''/**
  * \\file            modbus_registers.h
  * \\brief           Enhanced Modbus register mapping definitions with Operation/Mode support
  */
@@ -129,6 +335,7 @@ class ModbusCodeGenerator:
 #ifndef MODBUS_REGISTERS_H
 #define MODBUS_REGISTERS_H
 
+#include <stddef.h>
 #include <stdint.h>
 
 #ifdef __cplusplus
@@ -141,181 +348,130 @@ extern "C" {
 #define MODBUS_USE_ENHANCED_REGISTER_MAPPING        (1)
 
 /* Configuration settings - Variables (can be modified at runtime) */
-'''
+''')
         
         settings = self.config.get('settings', {})
         
         # Generate extern declarations for variables instead of #defines
-        header += "\n/* External variable declarations for configuration */\n"
+        write("\n/* External variable declarations for configuration */\n")
         for setting in settings.get('common', []):
             var_name = setting['var_name'].lower()
-            header += f"extern uint32_t {var_name};\n"
+            write(f"extern uint32_t {var_name};\n")
         
         if self.config['is_master']:
-            header += "\n/* Device type */\n"
-            header += "#define MODBUS_DEVICE_TYPE_MASTER                   (1)\n"
+            write("\n/* Device type */\n")
+            write("#define MODBUS_DEVICE_TYPE_MASTER                   (1)\n")
             if self.config.get('target_slaves'):
-                header += f"/* Target slave IDs: {', '.join(map(str, self.config['target_slaves']))} */\n"
-            header += "\n/* Enhanced Master-specific configuration variables */\n"
+                write(f"/* Target slave IDs: {', '.join(map(str, self.config['target_slaves']))} */\n")
+            write("\n/* Enhanced Master-specific configuration variables */\n")
             for setting in settings.get('master', []):
                 var_name = setting['var_name'].lower()
-                header += f"extern uint32_t {var_name};\n"
+                write(f"extern uint32_t {var_name};\n")
         else:
-            header += "\n/* Device type */\n"
-            header += "#define MODBUS_DEVICE_TYPE_SLAVE                    (1)\n"
-            header += "\n/* Slave-specific configuration variables */\n"
+            write("\n/* Device type */\n")
+            write("#define MODBUS_DEVICE_TYPE_SLAVE                    (1)\n")
+            write("\n/* Slave-specific configuration variables */\n")
             for setting in settings.get('slave', []):
                 var_name = setting['var_name'].lower()
-                header += f"extern uint32_t {var_name};\n"
+                write(f"extern uint32_t {var_name};\n")
         
-        header += f"\n/* Register counts (optimized memory) */\n"
-        header += f"#define MODBUS_COIL_COUNT                           ({coil_count})\n"
-        header += f"#define MODBUS_DISCRETE_INPUT_COUNT                 ({di_count})\n"
-        header += f"#define MODBUS_INPUT_REGISTER_COUNT                 ({ir_count})\n"
-        header += f"#define MODBUS_HOLDING_REGISTER_COUNT               ({hr_count})\n"
+        write(f"\n/* Register counts (optimized memory) */\n")
+        write(f"#define MODBUS_COIL_COUNT                           ({coil_count})\n")
+        write(f"#define MODBUS_DISCRETE_INPUT_COUNT                 ({di_count})\n")
+        write(f"#define MODBUS_INPUT_REGISTER_COUNT                 ({ir_count})\n")
+        write(f"#define MODBUS_HOLDING_REGISTER_COUNT               ({hr_count})\n")
         
-        header += "\n/* Register internal address definitions */\n"
+        write(f"\n/* Contiguous address run counts (see g_modbus_xxx_runs[]) */\n")
+        for modbus_type, name, title in self.LOOKUP_TYPES:
+            define = f"MODBUS_{name.upper()}_RUN_COUNT"
+            write(f"#define {define}{' ' * max(1, 44 - len(define))}({len(layout.runs[modbus_type])})\n")
         
+        write("\n/* Register internal address definitions */\n")
+        
+        type_names = {0: 'Coil', 1: 'Discrete Input', 3: 'Input Register', 4: 'Holding Register'}
         for modbus_type in [4, 3, 0, 1]:
             if not reg_by_type[modbus_type]:
                 continue
             
-            type_names = {0: 'Coil', 1: 'Discrete Input', 3: 'Input Register', 4: 'Holding Register'}
-            header += f"\n/* {type_names[modbus_type]} internal addresses */\n"
+            write(f"\n/* {type_names[modbus_type]} internal addresses */\n")
             
-            for reg in sorted(reg_by_type[modbus_type], key=lambda x: x['internal_address']):
-                if self.config['is_master'] and 'slave_id' in reg:
-                    # For master mode: include slave ID in define name to avoid conflicts
-                    base_tag = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                    # Remove any existing slave prefix if present
-                    if base_tag.startswith(('S1_', 'S2_', 'S3_', 'S4_', 'S5_', 'S6_', 'S7_', 'S8_', 'S9_')):
-                        base_tag = base_tag[3:]  # Remove "SX_" prefix
-                    tag_name = f'S{reg["slave_id"]}_{base_tag}'
-                    comment = f'/* Slave {reg["slave_id"]}, Addr {reg["internal_address"]}, Op: {reg.get("operation", "N/A")}, Mode: {reg.get("mode", "N/A")} */'
+            for reg, tag_name in zip(reg_by_type[modbus_type], layout.tag_names[modbus_type]):
+                if self.config['is_master'] and reg.slave_id is not None:
+                    comment = f'/* Slave {reg.slave_id}, Addr {reg.internal_address}, Op: {reg.operation or "N/A"}, Mode: {reg.mode or "N/A"} */'
                 else:
-                    # For slave mode: use original tag name
-                    tag_name = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                    comment = f'/* Internal addr {reg["internal_address"]} */'
+                    comment = f'/* Internal addr {reg.internal_address} */'
                 
-                header += f"#define {tag_name}_ADDR{' ' * max(1, 35 - len(tag_name))} ({reg['internal_address']:<5})  {comment}\n"
+                write(f"#define {tag_name}_ADDR{' ' * max(1, 35 - len(tag_name))} ({reg.internal_address:<5})  {comment}\n")
         
-        header += f"\n/* Register mapping indices */\n"
-        header += "/* Use these indices to access g_modbus_xxx_registers[] arrays */\n"
+        write(f"\n/* Register mapping indices */\n")
+        write("/* Use these indices to access g_modbus_xxx_registers[] arrays */\n")
         
         for modbus_type in [4, 3, 0, 1]:
-            if not reg_by_type[modbus_type]:
-                continue
-            
-            sorted_regs = sorted(reg_by_type[modbus_type], key=lambda x: x['internal_address'])
-            for idx, reg in enumerate(sorted_regs):
-                if self.config['is_master'] and 'slave_id' in reg:
-                    # For master mode: include slave ID in define name to avoid conflicts
-                    base_tag = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                    # Remove any existing slave prefix if present
-                    if base_tag.startswith(('S1_', 'S2_', 'S3_', 'S4_', 'S5_', 'S6_', 'S7_', 'S8_', 'S9_')):
-                        base_tag = base_tag[3:]  # Remove "SX_" prefix
-                    tag_name = f'S{reg["slave_id"]}_{base_tag}'
-                else:
-                    # For slave mode: use original tag name
-                    tag_name = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                
-                header += f"#define {tag_name}_IDX{' ' * max(1, 36 - len(tag_name))} ({idx})\n"
+            for idx, tag_name in enumerate(layout.tag_names[modbus_type]):
+                write(f"#define {tag_name}_IDX{' ' * max(1, 36 - len(tag_name))} ({idx})\n")
         
-        header += "\n/* Direct access macros - use these for easy register access */\n"
-        header += "/* Example: TEMPERATURE = 34; instead of g_modbus_holding_registers[TEMPERATURE_IDX] = 34; */\n\n"
+        write("\n/* Direct access macros - use these for easy register access */\n")
+        write("/* Example: TEMPERATURE = 34; instead of g_modbus_holding_registers[TEMPERATURE_IDX] = 34; */\n\n")
         
         if reg_by_type[4]:
-            header += "/* Holding Register access macros */\n"
-            sorted_regs = sorted(reg_by_type[4], key=lambda x: x['internal_address'])
-            for idx, reg in enumerate(sorted_regs):
-                if self.config['is_master'] and 'slave_id' in reg:
-                    # For master mode: include slave ID in define name
-                    base_tag = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                    if base_tag.startswith(('S1_', 'S2_', 'S3_', 'S4_', 'S5_', 'S6_', 'S7_', 'S8_', 'S9_')):
-                        base_tag = base_tag[3:]
-                    tag_name = f'S{reg["slave_id"]}_{base_tag}'
-                else:
-                    tag_name = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                header += f"#define {tag_name:<40} g_modbus_holding_registers[{tag_name}_IDX]\n"
+            write("/* Holding Register access macros */\n")
+            for tag_name in layout.tag_names[4]:
+                write(f"#define {tag_name:<40} g_modbus_holding_registers[{tag_name}_IDX]\n")
         
         if reg_by_type[3]:
-            header += "\n/* Input Register access macros */\n"
-            sorted_regs = sorted(reg_by_type[3], key=lambda x: x['internal_address'])
-            for idx, reg in enumerate(sorted_regs):
-                if self.config['is_master'] and 'slave_id' in reg:
-                    # For master mode: include slave ID in define name
-                    base_tag = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                    if base_tag.startswith(('S1_', 'S2_', 'S3_', 'S4_', 'S5_', 'S6_', 'S7_', 'S8_', 'S9_')):
-                        base_tag = base_tag[3:]
-                    tag_name = f'S{reg["slave_id"]}_{base_tag}'
-                else:
-                    tag_name = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                header += f"#define {tag_name:<40} g_modbus_input_registers[{tag_name}_IDX]\n"
-        
-        if reg_by_type[0]:
-            header += "\n/* Coil access macros (bit access) */\n"
-            sorted_regs = sorted(reg_by_type[0], key=lambda x: x['internal_address'])
-            for idx, reg in enumerate(sorted_regs):
-                if self.config['is_master'] and 'slave_id' in reg:
-                    # For master mode: include slave ID in define name
-                    base_tag = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                    if base_tag.startswith(('S1_', 'S2_', 'S3_', 'S4_', 'S5_', 'S6_', 'S7_', 'S8_', 'S9_')):
-                        base_tag = base_tag[3:]
-                    tag_name = f'S{reg["slave_id"]}_{base_tag}'
-                else:
-                    tag_name = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                byte_idx = idx // 8
-                bit_idx = idx % 8
-                header += f"#define {tag_name}_SET(){' ' * max(1, 32 - len(tag_name))} (g_modbus_coils[{byte_idx}] |= (1 << {bit_idx}))\n"
-                header += f"#define {tag_name}_CLR(){' ' * max(1, 32 - len(tag_name))} (g_modbus_coils[{byte_idx}] &= ~(1 << {bit_idx}))\n"
-                header += f"#define {tag_name}_READ(){' ' * max(1, 31 - len(tag_name))} ((g_modbus_coils[{byte_idx}] >> {bit_idx}) & 1)\n"
-        
-        if reg_by_type[1]:
-            header += "\n/* Discrete Input access macros (bit access) */\n"
-            sorted_regs = sorted(reg_by_type[1], key=lambda x: x['internal_address'])
-            for idx, reg in enumerate(sorted_regs):
-                if self.config['is_master'] and 'slave_id' in reg:
-                    # For master mode: include slave ID in define name
-                    base_tag = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                    if base_tag.startswith(('S1_', 'S2_', 'S3_', 'S4_', 'S5_', 'S6_', 'S7_', 'S8_', 'S9_')):
-                        base_tag = base_tag[3:]
-                    tag_name = f'S{reg["slave_id"]}_{base_tag}'
-                else:
-                    tag_name = reg.get('tag_name', f'REG_{reg["internal_address"]}')
+            write("\n/* Input Register access macros */\n")
+            for tag_name in layout.tag_names[3]:
+                write(f"#define {tag_name:<40} g_modbus_input_registers[{tag_name}_IDX]\n")
+        
+        for modbus_type, title, array in ((0, 'Coil', 'g_modbus_coils'),
+                                          (1, 'Discrete Input', 'g_modbus_discrete_inputs')):
+            if not reg_by_type[modbus_type]:
+                continue
+            write(f"\n/* {title} access macros (bit access) */\n")
+            for idx, tag_name in enumerate(layout.tag_names[modbus_type]):
                 byte_idx = idx // 8
                 bit_idx = idx % 8
-                header += f"#define {tag_name}_SET(){' ' * max(1, 32 - len(tag_name))} (g_modbus_discrete_inputs[{byte_idx}] |= (1 << {bit_idx}))\n"
-                header += f"#define {tag_name}_CLR(){' ' * max(1, 32 - len(tag_name))} (g_modbus_discrete_inputs[{byte_idx}] &= ~(1 << {bit_idx}))\n"
-                header += f"#define {tag_name}_READ(){' ' * max(1, 31 - len(tag_name))} ((g_modbus_discrete_inputs[{byte_idx}] >> {bit_idx}) & 1)\n"
+                write(f"#define {tag_name}_SET(){' ' * max(1, 32 - len(tag_name))} ({array}[{byte_idx}] |= (1 << {bit_idx}))\n")
+                write(f"#define {tag_name}_CLR(){' ' * max(1, 32 - len(tag_name))} ({array}[{byte_idx}] &= ~(1 << {bit_idx}))\n")
+                write(f"#define {tag_name}_READ(){' ' * max(1, 31 - len(tag_name))} (({array}[{byte_idx}] >> {bit_idx}) & 1)\n")
         
         # Add operation/mode information for Master mode
         if self.config['is_master']:
-            header += f"\n/* Master Mode: Operation and Mode Information */\n"
+            write(f"\n/* Master Mode: Operation and Mode Information */\n")
             
-            # Group by operation type
-            read_regs = []
-            write_once_regs = []
-            write_cyclic_regs = []
+            # Count by operation type
+            read_count = 0
+            write_once_count = 0
+            write_cyclic_count = 0
+            write_count = 0
             
             for reg in all_registers:
-                operation = reg.get('operation', 'Read')
-                mode = reg.get('mode', 'N/A')
+                operation = reg.operation or 'Read'
+                mode = reg.mode or 'N/A'
                 
                 if operation == 'Read':
-                    read_regs.append(reg)
-                elif operation == 'Write' and mode == 'One-time':
-                    write_once_regs.append(reg)
-                elif operation == 'Write' and mode == 'Cyclic':
-                    write_cyclic_regs.append(reg)
+                    read_count += 1
+                else:
+                    write_count += 1
+                    if operation == 'Write' and mode == 'One-time':
+                        write_once_count += 1
+                    elif operation == 'Write' and mode == 'Cyclic':
+                        write_cyclic_count += 1
             
-            header += f"#define MODBUS_READ_REGISTERS_COUNT                 ({len(read_regs)})\n"
-            header += f"#define MODBUS_WRITE_ONCE_REGISTERS_COUNT           ({len(write_once_regs)})\n"
-            header += f"#define MODBUS_WRITE_CYCLIC_REGISTERS_COUNT         ({len(write_cyclic_regs)})\n"
+            write(f"#define MODBUS_READ_REGISTERS_COUNT                 ({read_count})\n")
+            write(f"#define MODBUS_WRITE_ONCE_REGISTERS_COUNT           ({write_once_count})\n")
+            write(f"#define MODBUS_WRITE_CYCLIC_REGISTERS_COUNT         ({write_cyclic_count})\n")
+            write(f"#define MODBUS_WRITE_REGISTERS_COUNT                ({write_count})\n")
         
-        header += f"\n/* Register ranges configuration */\n"
-        header += f"#define MODBUS_REGISTER_RANGES_COUNT                ({len(optimized_ranges)})\n\n"
+        write(f"\n/* Register ranges configuration */\n")
+        write(f"#define MODBUS_REGISTER_RANGES_COUNT                ({len(optimized_ranges)})\n")
+        if self.config['is_master']:
+            write(f"#define MODBUS_POLL_PLAN_COUNT                      ({len(self.poll_plan)})\n")
+            write(f"#define MODBUS_READ_FRAME_COUNT                     ({len(self.read_frames)})\n")
+            write(f"#define MODBUS_READ_FRAME_LENGTH                    (8)\n")
+        write("\n")
         
-        header += '''/**
+        write('''/**
  * \\brief           Enhanced register range structure
  */
 typedef struct {
@@ -334,20 +490,66 @@ typedef struct {
     uint8_t  mode;                                  /* 0=One-time, 1=Cyclic (Write operations only) */
 } modbus_register_map_enhanced_t;
 
+/**
+ * \\brief           Contiguous run of internal addresses stored at consecutive array indices
+ */
+typedef struct {
+    uint16_t start_addr;                            /* First internal address of the run */
+    uint16_t count;                                 /* Number of consecutive addresses */
+    uint16_t base_index;                            /* Array index of start_addr */
+} modbus_register_run_t;
+''')
+        
+        if self.config['is_master']:
+            write('''
+/**
+ * \\brief           Master poll plan entry: one Modbus request to one slave
+ */
+typedef struct {
+    uint8_t  slave_id;                              /* Target slave ID */
+    uint8_t  function_code;                         /* Modbus function code */
+    uint16_t start_addr;                            /* Starting internal address */
+    uint16_t count;                                 /* Number of registers/coils */
+    uint8_t  mode;                                  /* 0=Read/One-time, 1=Cyclic write */
+} modbus_poll_request_t;
+
+/**
+ * \\brief           Pre-built master read request: complete ADU with CRC, sent as is every cycle
+ */
+typedef struct {
+    uint8_t  adu[MODBUS_READ_FRAME_LENGTH];         /* Request ADU, CRC low byte first */
+    uint16_t response_length;                       /* Length of a normal response ADU */
+    uint16_t plan_index;                            /* Entry of g_modbus_poll_plan it was built from */
+} modbus_read_frame_t;
+''')
+        
+        write('''
 /* External variable declarations */
 extern const modbus_register_range_t g_modbus_register_ranges[];
 extern const modbus_register_map_enhanced_t g_modbus_holding_register_map[];
 extern const modbus_register_map_enhanced_t g_modbus_input_register_map[];
 extern const modbus_register_map_enhanced_t g_modbus_coil_map[];
 extern const modbus_register_map_enhanced_t g_modbus_discrete_input_map[];
+extern const modbus_register_run_t g_modbus_holding_register_runs[];
+extern const modbus_register_run_t g_modbus_input_register_runs[];
+extern const modbus_register_run_t g_modbus_coil_runs[];
+extern const modbus_register_run_t g_modbus_discrete_input_runs[];
 
 extern uint16_t g_modbus_holding_registers[];
 extern uint16_t g_modbus_input_registers[];
 extern uint8_t  g_modbus_coils[];
 extern uint8_t  g_modbus_discrete_inputs[];
-
+''')
+        
+        if self.config['is_master']:
+            write("extern const modbus_poll_request_t g_modbus_poll_plan[];\n")
+            write("extern const modbus_read_frame_t g_modbus_read_frames[];\n")
+        
+        write('''
 /* Function prototypes */
 uint8_t     modbus_is_register_valid(uint16_t addr, uint8_t reg_type);
+int32_t     modbus_get_register_index(uint16_t addr, uint8_t reg_type);
+int32_t     modbus_get_register_block(uint16_t addr, uint16_t count, uint8_t reg_type);
 int32_t     modbus_get_register_ranges(const modbus_register_range_t** ranges);
 void        modbus_registers_init(void);
 
@@ -358,6 +560,8 @@ uint8_t     modbus_is_write_register(uint16_t addr, uint8_t reg_type);
 uint8_t     modbus_is_cyclic_write_register(uint16_t addr, uint8_t reg_type);
 int32_t     modbus_get_read_registers_count(void);
 int32_t     modbus_get_write_registers_count(void);
+int32_t     modbus_get_poll_plan(const modbus_poll_request_t** plan);
+int32_t     modbus_get_read_frames(const modbus_read_frame_t** frames);
 #endif
 
 #ifdef __cplusplus
@@ -365,21 +569,15 @@ int32_t     modbus_get_write_registers_count(void);
 #endif /* __cplusplus */
 
 #endif /* MODBUS_REGISTERS_H */
-'''
+''')
         
-        return header
+        write_config_block(write, self.config)
     
-    def _generate_source(self, optimized_ranges, all_registers):
-        """Generate enhanced .c file content"""
-        reg_by_type = {0: [], 1: [], 3: [], 4: []}
-        for reg in all_registers:
-            modbus_type = reg.get('modbus_type', [0, 1, 3, 4][reg['type']])
-            reg_by_type[modbus_type].append(reg)
-        
-        for t in reg_by_type:
-            reg_by_type[t].sort(key=lambda x: x['internal_address'])
+    def _write_source(self, write, optimized_ranges, layout):
+        """Stream the enhanced .c file content"""
+        reg_by_type = layout.by_type
         
-        source = '''/**
+        write('''/**
  * \\file            modbus_registers.c
  * \\brief           Enhanced Modbus register mapping implementation with Operation/Mode support
  */
@@ -414,31 +612,31 @@ int32_t     modbus_get_write_registers_count(void);
 #include "modbus_registers.h"
 
 /* Configuration variables - can be modified at runtime */
-'''
+''')
         
         settings = self.config.get('settings', {})
         
         # Generate variable definitions instead of #defines
-        source += "\n/* Common configuration variables */\n"
+        write("\n/* Common configuration variables */\n")
         for setting in settings.get('common', []):
             var_name = setting['var_name'].lower()
             value = setting['value']
-            source += f"uint32_t {var_name} = {value};\n"
+            write(f"uint32_t {var_name} = {value};\n")
         
         if self.config['is_master']:
-            source += "\n/* Enhanced Master-specific configuration variables */\n"
+            write("\n/* Enhanced Master-specific configuration variables */\n")
             for setting in settings.get('master', []):
                 var_name = setting['var_name'].lower()
                 value = setting['value']
-                source += f"uint32_t {var_name} = {value};\n"
+                write(f"uint32_t {var_name} = {value};\n")
         else:
-            source += "\n/* Slave-specific configuration variables */\n"
+            write("\n/* Slave-specific configuration variables */\n")
             for setting in settings.get('slave', []):
                 var_name = setting['var_name'].lower()
                 value = setting['value']
-                source += f"uint32_t {var_name} = {value};\n"
+                write(f"uint32_t {var_name} = {value};\n")
         
-        source += "\n/* Data arrays - only allocate what we actually use */\n"
+        write("\n/* Data arrays - only allocate what we actually use */\n")
         
         hr_count = len(reg_by_type[4])
         ir_count = len(reg_by_type[3])
@@ -446,139 +644,38 @@ int32_t     modbus_get_write_registers_count(void);
         di_count = len(reg_by_type[1])
         
         if hr_count > 0:
-            source += f"uint16_t g_modbus_holding_registers[{hr_count}];\n"
+            write(f"uint16_t g_modbus_holding_registers[{hr_count}];\n")
         else:
-            source += f"uint16_t g_modbus_holding_registers[1];            /* Placeholder */\n"
+            write(f"uint16_t g_modbus_holding_registers[1];            /* Placeholder */\n")
         
         if ir_count > 0:
-            source += f"uint16_t g_modbus_input_registers[{ir_count}];\n"
+            write(f"uint16_t g_modbus_input_registers[{ir_count}];\n")
         else:
-            source += f"uint16_t g_modbus_input_registers[1];              /* Placeholder */\n"
+            write(f"uint16_t g_modbus_input_registers[1];              /* Placeholder */\n")
         
         if coil_count > 0:
             coil_bytes = (coil_count + 7) // 8
-            source += f"uint8_t  g_modbus_coils[{coil_bytes}];\n"
+            write(f"uint8_t  g_modbus_coils[{coil_bytes}];\n")
         else:
-            source += f"uint8_t  g_modbus_coils[1];                        /* Placeholder */\n"
+            write(f"uint8_t  g_modbus_coils[1];                        /* Placeholder */\n")
         
         if di_count > 0:
             di_bytes = (di_count + 7) // 8
-            source += f"uint8_t  g_modbus_discrete_inputs[{di_bytes}];\n"
+            write(f"uint8_t  g_modbus_discrete_inputs[{di_bytes}];\n")
         else:
-            source += f"uint8_t  g_modbus_discrete_inputs[1];              /* Placeholder */\n"
+            write(f"uint8_t  g_modbus_discrete_inputs[1];              /* Placeholder */\n")
         
-        source += "\n/* Enhanced address to array index mapping with operation/mode info */\n"
+        write("\n/* Enhanced address to array index mapping with operation/mode info */\n")
         
-        if hr_count > 0:
-            source += f"const modbus_register_map_enhanced_t g_modbus_holding_register_map[{hr_count}] = {{\n"
-            # Calculate max width for data part to align comments
-            max_addr_width = max(len(str(reg['internal_address'])) for reg in reg_by_type[4])
-            max_idx_width = max(len(str(idx)) for idx in range(hr_count))
-            
-            for idx, reg in enumerate(reg_by_type[4]):
-                if self.config['is_master'] and 'slave_id' in reg:
-                    # For master mode: include slave ID in comment
-                    base_tag = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                    if base_tag.startswith(('S1_', 'S2_', 'S3_', 'S4_', 'S5_', 'S6_', 'S7_', 'S8_', 'S9_')):
-                        base_tag = base_tag[3:]
-                    tag_name = f'S{reg["slave_id"]}_{base_tag}'
-                else:
-                    tag_name = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                
-                operation = 0 if reg.get('operation', 'Read') == 'Read' else 1
-                mode = 0 if reg.get('mode', 'One-time') == 'One-time' else 1
-                
-                # Format with dynamic padding to align commas
-                data_str = f"{{{reg['internal_address']}, {idx}, {operation}, {mode}}}"
-                padding = max_addr_width + max_idx_width + 12  # Base padding for {}, spaces, commas
-                source += f"    {data_str},{'':>{padding - len(data_str)}} /* {tag_name} - {reg.get('operation', 'N/A')}/{reg.get('mode', 'N/A')} */\n"
-            source += "};\n\n"
-        else:
-            source += "const modbus_register_map_enhanced_t g_modbus_holding_register_map[1] = {{0, 0, 0, 0}};\n\n"
+        for modbus_type, name, title in self.LOOKUP_TYPES:
+            self._write_register_map(write, name, reg_by_type[modbus_type], layout.tag_names[modbus_type])
         
-        if ir_count > 0:
-            source += f"const modbus_register_map_enhanced_t g_modbus_input_register_map[{ir_count}] = {{\n"
-            # Calculate max width for data part to align comments
-            max_addr_width = max(len(str(reg['internal_address'])) for reg in reg_by_type[3])
-            max_idx_width = max(len(str(idx)) for idx in range(ir_count))
-            
-            for idx, reg in enumerate(reg_by_type[3]):
-                if self.config['is_master'] and 'slave_id' in reg:
-                    # For master mode: include slave ID in comment
-                    base_tag = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                    if base_tag.startswith(('S1_', 'S2_', 'S3_', 'S4_', 'S5_', 'S6_', 'S7_', 'S8_', 'S9_')):
-                        base_tag = base_tag[3:]
-                    tag_name = f'S{reg["slave_id"]}_{base_tag}'
-                else:
-                    tag_name = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                
-                operation = 0 if reg.get('operation', 'Read') == 'Read' else 1
-                mode = 0 if reg.get('mode', 'One-time') == 'One-time' else 1
-                
-                # Format with dynamic padding to align commas
-                data_str = f"{{{reg['internal_address']}, {idx}, {operation}, {mode}}}"
-                padding = max_addr_width + max_idx_width + 12  # Base padding for {}, spaces, commas
-                source += f"    {data_str},{'':>{padding - len(data_str)}} /* {tag_name} - {reg.get('operation', 'N/A')}/{reg.get('mode', 'N/A')} */\n"
-            source += "};\n\n"
-        else:
-            source += "const modbus_register_map_enhanced_t g_modbus_input_register_map[1] = {{0, 0, 0, 0}};\n\n"
-        
-        if coil_count > 0:
-            source += f"const modbus_register_map_enhanced_t g_modbus_coil_map[{coil_count}] = {{\n"
-            # Calculate max width for data part to align comments
-            max_addr_width = max(len(str(reg['internal_address'])) for reg in reg_by_type[0])
-            max_idx_width = max(len(str(idx)) for idx in range(coil_count))
-            
-            for idx, reg in enumerate(reg_by_type[0]):
-                if self.config['is_master'] and 'slave_id' in reg:
-                    # For master mode: include slave ID in comment
-                    base_tag = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                    if base_tag.startswith(('S1_', 'S2_', 'S3_', 'S4_', 'S5_', 'S6_', 'S7_', 'S8_', 'S9_')):
-                        base_tag = base_tag[3:]
-                    tag_name = f'S{reg["slave_id"]}_{base_tag}'
-                else:
-                    tag_name = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                
-                operation = 0 if reg.get('operation', 'Read') == 'Read' else 1
-                mode = 0 if reg.get('mode', 'One-time') == 'One-time' else 1
-                
-                # Format with dynamic padding to align commas
-                data_str = f"{{{reg['internal_address']}, {idx}, {operation}, {mode}}}"
-                padding = max_addr_width + max_idx_width + 12  # Base padding for {}, spaces, commas
-                source += f"    {data_str},{'':>{padding - len(data_str)}} /* {tag_name} - {reg.get('operation', 'N/A')}/{reg.get('mode', 'N/A')} */\n"
-            source += "};\n\n"
-        else:
-            source += "const modbus_register_map_enhanced_t g_modbus_coil_map[1] = {{0, 0, 0, 0}};\n\n"
-        
-        if di_count > 0:
-            source += f"const modbus_register_map_enhanced_t g_modbus_discrete_input_map[{di_count}] = {{\n"
-            # Calculate max width for data part to align comments
-            max_addr_width = max(len(str(reg['internal_address'])) for reg in reg_by_type[1])
-            max_idx_width = max(len(str(idx)) for idx in range(di_count))
-            
-            for idx, reg in enumerate(reg_by_type[1]):
-                if self.config['is_master'] and 'slave_id' in reg:
-                    # For master mode: include slave ID in comment
-                    base_tag = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                    if base_tag.startswith(('S1_', 'S2_', 'S3_', 'S4_', 'S5_', 'S6_', 'S7_', 'S8_', 'S9_')):
-                        base_tag = base_tag[3:]
-                    tag_name = f'S{reg["slave_id"]}_{base_tag}'
-                else:
-                    tag_name = reg.get('tag_name', f'REG_{reg["internal_address"]}')
-                
-                operation = 0 if reg.get('operation', 'Read') == 'Read' else 1
-                mode = 0 if reg.get('mode', 'One-time') == 'One-time' else 1
-                
-                # Format with dynamic padding to align commas
-                data_str = f"{{{reg['internal_address']}, {idx}, {operation}, {mode}}}"
-                padding = max_addr_width + max_idx_width + 12  # Base padding for {}, spaces, commas
-                source += f"    {data_str},{'':>{padding - len(data_str)}} /* {tag_name} - {reg.get('operation', 'N/A')}/{reg.get('mode', 'N/A')} */\n"
-            source += "};\n\n"
-        else:
-            source += "const modbus_register_map_enhanced_t g_modbus_discrete_input_map[1] = {{0, 0, 0, 0}};\n\n"
-        
-        source += f"/* Optimized register ranges ({len(optimized_ranges)} ranges) */\n"
-        source += f"const modbus_register_range_t g_modbus_register_ranges[{max(1, len(optimized_ranges))}] = {{\n"
+        write(f"/* Optimized register ranges ({len(optimized_ranges)} ranges) */\n")
+        if self.range_report is not None:
+            report = self.range_report
+            write(f"/* Gap-tolerant coalescing: {report['strict_requests']} -> {report['requests']} requests, "
+                  f"{report['saved_time_us'] / 1000.0:.2f} ms wire time saved per cycle */\n")
+        write(f"const modbus_register_range_t g_modbus_register_ranges[{max(1, len(optimized_ranges))}] = {{\n")
         
         if optimized_ranges:
             # Calculate max width for alignment
@@ -588,13 +685,19 @@ int32_t     modbus_get_write_registers_count(void);
             for i, rng in enumerate(optimized_ranges):
                 data_str = f"{{{rng['start']}, {rng['count']}, {rng['type']}}}"
                 padding = max_start_width + max_count_width + 12  # Base padding
-                source += f"    {data_str}{',' if i < len(optimized_ranges) - 1 else ' '}{'':>{padding - len(data_str)}} /* {self._get_range_comment(rng)} */\n"
+                write(f"    {data_str}{',' if i < len(optimized_ranges) - 1 else ' '}{'':>{padding - len(data_str)}} /* {self._get_range_comment(rng)} */\n")
         else:
-            source += "    {0, 0, 0}                                   /* No registers defined */\n"
+            write("    {0, 0, 0}                                   /* No registers defined */\n")
         
-        source += "};\n\n"
+        write("};\n\n")
         
-        source += '''/**
+        if self.config['is_master']:
+            self._write_poll_plan(write)
+            self._write_read_frames(write)
+        
+        self._write_lookup(write, layout)
+        
+        write('''/**
  * \\brief           Check if register address is valid for given type
  * \\param[in]       addr: Internal register address (0-based)
  * \\param[in]       reg_type: Register type (0=coil, 1=DI, 3=IR, 4=HR)
@@ -602,51 +705,7 @@ int32_t     modbus_get_write_registers_count(void);
  */
 uint8_t
 modbus_is_register_valid(uint16_t addr, uint8_t reg_type) {
-    const modbus_register_map_enhanced_t* map;
-    int32_t count;
-    int32_t left, right, mid;
-    
-    /* Select appropriate map */
-    switch (reg_type) {
-        case 0:                                     /* Coil */
-            map = g_modbus_coil_map;
-            count = MODBUS_COIL_COUNT;
-            break;
-        case 1:                                     /* Discrete Input */
-            map = g_modbus_discrete_input_map;
-            count = MODBUS_DISCRETE_INPUT_COUNT;
-            break;
-        case 3:                                     /* Input Register */
-            map = g_modbus_input_register_map;
-            count = MODBUS_INPUT_REGISTER_COUNT;
-            break;
-        case 4:                                     /* Holding Register */
-            map = g_modbus_holding_register_map;
-            count = MODBUS_HOLDING_REGISTER_COUNT;
-            break;
-        default:
-            return 0;
-    }
-    
-    /* Binary search in sorted map */
-    if (count == 0) {
-        return 0;
-    }
-    
-    left = 0;
-    right = count - 1;
-    while (left <= right) {
-        mid = (left + right) / 2;
-        if (map[mid].internal_addr == addr) {
-            return 1;
-        } else if (map[mid].internal_addr < addr) {
-            left = mid + 1;
-        } else {
-            right = mid - 1;
-        }
-    }
-    
-    return 0;
+    return (modbus_get_register_index(addr, reg_type) >= 0) ? 1 : 0;
 }
 
 /**
@@ -675,59 +734,42 @@ modbus_registers_init(void) {
 /* Enhanced functions for Master mode */
 #if defined(MODBUS_DEVICE_TYPE_MASTER)
 
-/**
- * \\brief           Check if register is configured for Read operation
+''')
+        
+        self._write_attribute_bitmaps(write, reg_by_type)
+        
+        write('''/**
+ * \\brief           Test a per-register attribute bit
  * \\param[in]       addr: Internal register address (0-based)
  * \\param[in]       reg_type: Register type (0=coil, 1=DI, 3=IR, 4=HR)
- * \\return          `1` if register is Read type, `0` otherwise
+ * \\param[in]       bitmaps: Attribute bitmaps indexed by register type
+ * \\return          Attribute bit, `-1` if register is not defined
  */
-uint8_t
-modbus_is_read_register(uint16_t addr, uint8_t reg_type) {
-    const modbus_register_map_enhanced_t* map;
-    int32_t count;
-    int32_t left, right, mid;
+static int32_t
+get_attribute_bit(uint16_t addr, uint8_t reg_type, const uint8_t* const* bitmaps) {
+    int32_t idx;
     
-    /* Select appropriate map */
-    switch (reg_type) {
-        case 0:
-            map = g_modbus_coil_map;
-            count = MODBUS_COIL_COUNT;
-            break;
-        case 1:
-            map = g_modbus_discrete_input_map;
-            count = MODBUS_DISCRETE_INPUT_COUNT;
-            break;
-        case 3:
-            map = g_modbus_input_register_map;
-            count = MODBUS_INPUT_REGISTER_COUNT;
-            break;
-        case 4:
-            map = g_modbus_holding_register_map;
-            count = MODBUS_HOLDING_REGISTER_COUNT;
-            break;
-        default:
-            return 0;
+    if (reg_type > 4 || bitmaps[reg_type] == NULL) {
+        return -1;
     }
     
-    /* Binary search in sorted map */
-    if (count == 0) {
-        return 0;
-    }
-    
-    left = 0;
-    right = count - 1;
-    while (left <= right) {
-        mid = (left + right) / 2;
-        if (map[mid].internal_addr == addr) {
-            return (map[mid].operation == 0) ? 1 : 0;  /* 0 = Read */
-        } else if (map[mid].internal_addr < addr) {
-            left = mid + 1;
-        } else {
-            right = mid - 1;
-        }
+    idx = modbus_get_register_index(addr, reg_type);
+    if (idx < 0) {
+        return -1;
     }
     
-    return 0;
+    return (bitmaps[reg_type][idx >> 3] >> (idx & 0x07)) & 0x01;
+}
+
+/**
+ * \\brief           Check if register is configured for Read operation
+ * \\param[in]       addr: Internal register address (0-based)
+ * \\param[in]       reg_type: Register type (0=coil, 1=DI, 3=IR, 4=HR)
+ * \\return          `1` if register is Read type, `0` otherwise
+ */
+uint8_t
+modbus_is_read_register(uint16_t addr, uint8_t reg_type) {
+    return (get_attribute_bit(addr, reg_type, g_modbus_write_bitmaps) == 0) ? 1 : 0;
 }
 
 /**
@@ -738,51 +780,7 @@ modbus_is_read_register(uint16_t addr, uint8_t reg_type) {
  */
 uint8_t
 modbus_is_write_register(uint16_t addr, uint8_t reg_type) {
-    const modbus_register_map_enhanced_t* map;
-    int32_t count;
-    int32_t left, right, mid;
-    
-    /* Select appropriate map */
-    switch (reg_type) {
-        case 0:
-            map = g_modbus_coil_map;
-            count = MODBUS_COIL_COUNT;
-            break;
-        case 1:
-            map = g_modbus_discrete_input_map;
-            count = MODBUS_DISCRETE_INPUT_COUNT;
-            break;
-        case 3:
-            map = g_modbus_input_register_map;
-            count = MODBUS_INPUT_REGISTER_COUNT;
-            break;
-        case 4:
-            map = g_modbus_holding_register_map;
-            count = MODBUS_HOLDING_REGISTER_COUNT;
-            break;
-        default:
-            return 0;
-    }
-    
-    /* Binary search in sorted map */
-    if (count == 0) {
-        return 0;
-    }
-    
-    left = 0;
-    right = count - 1;
-    while (left <= right) {
-        mid = (left + right) / 2;
-        if (map[mid].internal_addr == addr) {
-            return (map[mid].operation == 1) ? 1 : 0;  /* 1 = Write */
-        } else if (map[mid].internal_addr < addr) {
-            left = mid + 1;
-        } else {
-            right = mid - 1;
-        }
-    }
-    
-    return 0;
+    return (get_attribute_bit(addr, reg_type, g_modbus_write_bitmaps) == 1) ? 1 : 0;
 }
 
 /**
@@ -793,125 +791,394 @@ modbus_is_write_register(uint16_t addr, uint8_t reg_type) {
  */
 uint8_t
 modbus_is_cyclic_write_register(uint16_t addr, uint8_t reg_type) {
-    const modbus_register_map_enhanced_t* map;
-    int32_t count;
-    int32_t left, right, mid;
-    
-    /* Select appropriate map */
-    switch (reg_type) {
-        case 0:
-            map = g_modbus_coil_map;
-            count = MODBUS_COIL_COUNT;
-            break;
-        case 1:
-            map = g_modbus_discrete_input_map;
-            count = MODBUS_DISCRETE_INPUT_COUNT;
-            break;
-        case 3:
-            map = g_modbus_input_register_map;
-            count = MODBUS_INPUT_REGISTER_COUNT;
-            break;
-        case 4:
-            map = g_modbus_holding_register_map;
-            count = MODBUS_HOLDING_REGISTER_COUNT;
-            break;
-        default:
-            return 0;
+    return (get_attribute_bit(addr, reg_type, g_modbus_cyclic_bitmaps) == 1) ? 1 : 0;
+}
+
+/**
+ * \\brief           Get total count of Read registers
+ * \\return          Number of Read registers
+ */
+int32_t
+modbus_get_read_registers_count(void) {
+    return MODBUS_READ_REGISTERS_COUNT;
+}
+
+/**
+ * \\brief           Get total count of Write registers
+ * \\return          Number of Write registers
+ */
+int32_t
+modbus_get_write_registers_count(void) {
+    return MODBUS_WRITE_REGISTERS_COUNT;
+}
+
+/**
+ * \\brief           Get pointer to master poll plan array
+ * \\param[in]       plan: Pointer to store poll plan array pointer
+ * \\return          Number of planned requests per cycle
+ */
+int32_t
+modbus_get_poll_plan(const modbus_poll_request_t** plan) {
+    if (plan != NULL) {
+        *plan = g_modbus_poll_plan;
     }
-    
-    /* Binary search in sorted map */
-    if (count == 0) {
-        return 0;
+    return MODBUS_POLL_PLAN_COUNT;
+}
+
+/**
+ * \\brief           Get pointer to pre-built read request frames
+ * \\param[in]       frames: Pointer to store read frame array pointer
+ * \\return          Number of pre-built read frames
+ */
+int32_t
+modbus_get_read_frames(const modbus_read_frame_t** frames) {
+    if (frames != NULL) {
+        *frames = g_modbus_read_frames;
     }
+    return MODBUS_READ_FRAME_COUNT;
+}
+
+#endif /* MODBUS_DEVICE_TYPE_MASTER */
+''')
+    
+    def _write_register_map(self, write, name, registers, tag_names):
+        """Stream one enhanced address to array index map"""
+        if not registers:
+            write(f"const modbus_register_map_enhanced_t g_modbus_{name}_map[1] = {{{{0, 0, 0, 0}}}};\n\n")
+            return
+        
+        write(f"const modbus_register_map_enhanced_t g_modbus_{name}_map[{len(registers)}] = {{\n")
+        # Registers are sorted, so the widest address is the last one
+        max_addr_width = len(str(registers[-1].internal_address))
+        max_idx_width = len(str(len(registers) - 1))
+        padding = max_addr_width + max_idx_width + 12  # Base padding for {}, spaces, commas
+        
+        for idx, (reg, tag_name) in enumerate(zip(registers, tag_names)):
+            operation, mode = self._get_register_attributes(reg)
+            
+            # Format with dynamic padding to align commas
+            data_str = f"{{{reg.internal_address}, {idx}, {operation}, {mode}}}"
+            write(f"    {data_str},{'':>{padding - len(data_str)}} /* {tag_name} - {reg.operation or 'N/A'}/{reg.mode or 'N/A'} */\n")
+        write("};\n\n")
+    
+    def _get_register_attributes(self, reg):
+        """Return the (operation, mode) flags stored in the enhanced maps"""
+        operation = 0 if (reg.operation or 'Read') == 'Read' else 1
+        mode = 0 if (reg.mode or 'One-time') == 'One-time' else 1
+        return operation, mode
+    
+    def _write_attribute_bitmaps(self, write, reg_by_type):
+        """Stream per-type write and cyclic bitmaps, bit n = array index n"""
+        write("/* Operation attribute bitmaps: a Read register is one whose write bit is clear */\n")
+        bitmap_names = {'write': [], 'cyclic': []}
+        
+        for modbus_type, name, title in self.LOOKUP_TYPES:
+            regs = reg_by_type[modbus_type]
+            write_bits = bytearray((len(regs) + 7) // 8)
+            cyclic_bits = bytearray((len(regs) + 7) // 8)
+            for idx, reg in enumerate(regs):
+                operation, mode = self._get_register_attributes(reg)
+                if operation == 1:
+                    write_bits[idx >> 3] |= 1 << (idx & 0x07)
+                    if mode == 1:
+                        cyclic_bits[idx >> 3] |= 1 << (idx & 0x07)
+            
+            for attribute, bits in (('write', write_bits), ('cyclic', cyclic_bits)):
+                table = f"g_modbus_{name}_{attribute}_bits"
+                if not regs:
+                    bitmap_names[attribute].append((modbus_type, "NULL"))
+                    continue
+                bitmap_names[attribute].append((modbus_type, table))
+                write(f"static const uint8_t {table}[{len(bits)}] = {{\n")
+                self._write_c_values(write, (f"0x{value:02X}" for value in bits))
+                write("};\n")
+        
+        for attribute, names in bitmap_names.items():
+            by_type = dict(names)
+            entries = ", ".join(by_type.get(t, "NULL") for t in range(5))
+            write(f"\n/* Indexed by register type (0=coil, 1=DI, 3=IR, 4=HR) */\n")
+            write(f"static const uint8_t* const g_modbus_{attribute}_bitmaps[5] = {{{entries}}};\n")
+        
+        write("\n")
+    
+    def _get_request_comment(self, req):
+        comment = f"Slave {req.slave_id}: {self.FUNCTION_NAMES[req.function_code]} {req.start_addr}"
+        if req.count > 1:
+            comment += f"-{req.start_addr + req.count - 1}"
+        if not req.is_read():
+            comment += f" ({req.mode})"
+        return comment
+    
+    def _write_poll_plan(self, write):
+        """Stream the master poll plan table"""
+        write(f"/* Master poll plan ({len(self.poll_plan)} requests per cycle) */\n")
+        write(f"const modbus_poll_request_t g_modbus_poll_plan[{max(1, len(self.poll_plan))}] = {{\n")
+        
+        if self.poll_plan:
+            for i, req in enumerate(self.poll_plan):
+                mode = 1 if req.is_cyclic() else 0
+                data_str = f"{{{req.slave_id}, 0x{req.function_code:02X}, {req.start_addr}, {req.count}, {mode}}}"
+                comment = self._get_request_comment(req)
+                write(f"    {data_str}{',' if i < len(self.poll_plan) - 1 else ' '}{'':>{max(1, 32 - len(data_str))}} /* {comment} */\n")
+        else:
+            write("    {0, 0, 0, 0, 0}                             /* No requests planned */\n")
+        
+        write("};\n\n")
+    
+    def _write_read_frames(self, write):
+        """Stream the pre-built read request ADUs, CRC included, with their expected response lengths"""
+        write(f"/* Pre-built read requests ({len(self.read_frames)} frames): copied and sent without building or CRC */\n")
+        write(f"const modbus_read_frame_t g_modbus_read_frames[{max(1, len(self.read_frames))}] = {{\n")
+        
+        if self.read_frames:
+            for i, (index, req, adu, response_length) in enumerate(self.read_frames):
+                adu_str = ', '.join(f"0x{byte:02X}" for byte in adu)
+                data_str = f"{{{{{adu_str}}}, {response_length}, {index}}}"
+                write(f"    {data_str}{',' if i < len(self.read_frames) - 1 else ' '}{'':>{max(1, 62 - len(data_str))}} /* {self._get_request_comment(req)} */\n")
+        else:
+            write("    {{0, 0, 0, 0, 0, 0, 0, 0}, 0, 0}                              /* No reads planned */\n")
+        
+        write("};\n\n")
+    
+    def _choose_lookup_strategy(self, pairs, runs):
+        """Pick the lookup strategy for one register type from density and flash budget"""
+        if self.lookup_strategy != 'auto':
+            return self.lookup_strategy
+        
+        span = pairs[-1][0] - pairs[0][0] + 1
+        dense_bytes = span * 2
+        range_bytes = len(runs) * 6
+        eytzinger_bytes = (len(pairs) + 1) * 4
+        
+        # Dense is O(1): use it whenever it fits the budget or is not larger than the alternatives
+        if dense_bytes <= max(self.lookup_flash_budget, min(range_bytes, eytzinger_bytes)):
+            return 'dense'
+        if range_bytes <= eytzinger_bytes:
+            return 'range'
+        return 'eytzinger'
+    
+    def _write_c_values(self, write, values, per_line=12):
+        """Stream values as indented C initializer lines"""
+        separator = '    '
+        line = []
+        for value in values:
+            line.append(value)
+            if len(line) == per_line:
+                write(separator + ', '.join(line))
+                separator = ',\n    '
+                line = []
+        if line:
+            write(separator + ', '.join(line))
+        write('\n')
+    
+    def _write_runs(self, write, layout):
+        """Stream contiguous run tables and modbus_get_register_block()"""
+        write("/* Contiguous address runs: validate and locate a whole request block in one search */\n")
+        
+        for modbus_type, name, title in self.LOOKUP_TYPES:
+            runs = layout.runs[modbus_type]
+            write(f"const modbus_register_run_t g_modbus_{name}_runs[{max(1, len(runs))}] = {{\n")
+            if runs:
+                self._write_c_values(write, (f"{{{start}, {count}, {base}}}" for start, count, base in runs), 6)
+            else:
+                write(f"    {{0, 0, 0}}                                   /* No {title}s defined */\n")
+            write("};\n\n")
+        
+        write('''/**
+ * \\brief           Find the run containing an internal address
+ * \\param[in]       runs: Run table sorted by start address
+ * \\param[in]       count: Number of runs in the table
+ * \\param[in]       addr: Internal register address (0-based)
+ * \\return          Pointer to the run, `NULL` if address is not defined
+ */
+static const modbus_register_run_t*
+find_run(const modbus_register_run_t* runs, int32_t count, uint16_t addr) {
+    int32_t left, right, mid;
     
     left = 0;
     right = count - 1;
     while (left <= right) {
         mid = (left + right) / 2;
-        if (map[mid].internal_addr == addr) {
-            return (map[mid].operation == 1 && map[mid].mode == 1) ? 1 : 0;  /* Write + Cyclic */
-        } else if (map[mid].internal_addr < addr) {
+        if (addr < runs[mid].start_addr) {
+            right = mid - 1;
+        } else if ((uint16_t)(addr - runs[mid].start_addr) >= runs[mid].count) {
             left = mid + 1;
         } else {
-            right = mid - 1;
+            return &runs[mid];
         }
     }
-    
-    return 0;
+    return NULL;
 }
 
 /**
- * \\brief           Get total count of Read registers
- * \\return          Number of Read registers
+ * \\brief           Validate a multi-register request and locate its data
+ * \\param[in]       addr: First internal register address (0-based)
+ * \\param[in]       count: Number of consecutive registers
+ * \\param[in]       reg_type: Register type (0=coil, 1=DI, 3=IR, 4=HR)
+ * \\return          Array index of `addr` if all `count` registers are stored
+ *                  consecutively, `-1` otherwise
  */
 int32_t
-modbus_get_read_registers_count(void) {
-    int32_t count = 0;
-    int32_t i;
+modbus_get_register_block(uint16_t addr, uint16_t count, uint8_t reg_type) {
+    const modbus_register_run_t* run;
     
-    /* Count Read registers in all types */
-    for (i = 0; i < MODBUS_HOLDING_REGISTER_COUNT; ++i) {
-        if (g_modbus_holding_register_map[i].operation == 0) {
-            count++;
-        }
-    }
-    for (i = 0; i < MODBUS_INPUT_REGISTER_COUNT; ++i) {
-        if (g_modbus_input_register_map[i].operation == 0) {
-            count++;
-        }
-    }
-    for (i = 0; i < MODBUS_COIL_COUNT; ++i) {
-        if (g_modbus_coil_map[i].operation == 0) {
-            count++;
-        }
+    if (count == 0) {
+        return -1;
     }
-    for (i = 0; i < MODBUS_DISCRETE_INPUT_COUNT; ++i) {
-        if (g_modbus_discrete_input_map[i].operation == 0) {
-            count++;
-        }
+    
+    switch (reg_type) {
+        case 0:                                     /* Coil */
+            run = find_run(g_modbus_coil_runs, MODBUS_COIL_RUN_COUNT, addr);
+            break;
+        case 1:                                     /* Discrete Input */
+            run = find_run(g_modbus_discrete_input_runs, MODBUS_DISCRETE_INPUT_RUN_COUNT, addr);
+            break;
+        case 3:                                     /* Input Register */
+            run = find_run(g_modbus_input_register_runs, MODBUS_INPUT_REGISTER_RUN_COUNT, addr);
+            break;
+        case 4:                                     /* Holding Register */
+            run = find_run(g_modbus_holding_register_runs, MODBUS_HOLDING_REGISTER_RUN_COUNT, addr);
+            break;
+        default:
+            return -1;
     }
     
-    return count;
+    if (run == NULL || (uint32_t)(addr - run->start_addr) + count > run->count) {
+        return -1;
+    }
+    return run->base_index + (addr - run->start_addr);
 }
 
-/**
- * \\brief           Get total count of Write registers
- * \\return          Number of Write registers
+''')
+    
+    def _write_lookup(self, write, layout):
+        """Generate address to array index lookup tables and modbus_get_register_index()"""
+        self.lookup_strategies = {}
+        self._write_runs(write, layout)
+        write("/* Address to array index lookup, strategy chosen per type from density and flash budget */\n")
+        
+        for modbus_type, name, title in self.LOOKUP_TYPES:
+            pairs = layout.pairs[modbus_type]
+            
+            if not pairs:
+                self.lookup_strategies[modbus_type] = 'none'
+                write(f'''static int32_t
+lookup_{name}(uint16_t addr) {{
+    (void)addr;
+    return -1;                                      /* No {title}s defined */
+}}
+
+''')
+                continue
+            
+            runs = layout.runs[modbus_type]
+            strategy = self._choose_lookup_strategy(pairs, runs)
+            self.lookup_strategies[modbus_type] = strategy
+            
+            if strategy == 'dense':
+                base = pairs[0][0]
+                span = pairs[-1][0] - base + 1
+                table = ['0xFFFF'] * span
+                for addr, idx in pairs:
+                    table[addr - base] = str(idx)
+                write(f"/* {title} lookup: dense offset table, addresses {base}-{base + span - 1} ({span * 2} bytes) */\n")
+                write(f"static const uint16_t g_modbus_{name}_index[{span}] = {{\n")
+                self._write_c_values(write, table)
+                write(f'''}};
+
+static int32_t
+lookup_{name}(uint16_t addr) {{
+    uint32_t offset = (uint16_t)(addr - {base}U);
+    
+    if (offset >= {span}U || g_modbus_{name}_index[offset] == 0xFFFF) {{
+        return -1;
+    }}
+    return g_modbus_{name}_index[offset];
+}}
+
+''')
+            elif strategy == 'range':
+                write(f"/* {title} lookup: binary search over the run table ({len(runs)} runs) */\n")
+                write(f'''static int32_t
+lookup_{name}(uint16_t addr) {{
+    const modbus_register_run_t* run;
+    
+    run = find_run(g_modbus_{name}_runs, MODBUS_{name.upper()}_RUN_COUNT, addr);
+    if (run == NULL) {{
+        return -1;
+    }}
+    return run->base_index + (addr - run->start_addr);
+}}
+
+''')
+            else:
+                count = len(pairs)
+                eytzinger = [None] * (count + 1)
+                position = iter(pairs)
+                
+                # In-order walk of the implicit tree fills the Eytzinger (BFS) layout
+                stack = []
+                k = 1
+                while stack or k <= count:
+                    while k <= count:
+                        stack.append(k)
+                        k = 2 * k
+                    k = stack.pop()
+                    eytzinger[k] = next(position)
+                    k = 2 * k + 1
+                
+                write(f"/* {title} lookup: Eytzinger-ordered search array ({count} entries, {(count + 1) * 4} bytes) */\n")
+                write(f"static const uint16_t g_modbus_{name}_eytzinger_addr[{count + 1}] = {{\n")
+                self._write_c_values(write, itertools.chain(['0'], (str(addr) for addr, idx in eytzinger[1:])))
+                write("};\n\n")
+                write(f"static const uint16_t g_modbus_{name}_eytzinger_index[{count + 1}] = {{\n")
+                self._write_c_values(write, itertools.chain(['0'], (str(idx) for addr, idx in eytzinger[1:])))
+                write(f'''}};
+
+static int32_t
+lookup_{name}(uint16_t addr) {{
+    uint32_t k = 1;
+    
+    while (k <= {count}U) {{
+        k = 2 * k + (g_modbus_{name}_eytzinger_addr[k] < addr);
+    }}
+    /* Drop the trailing right turns to land on the lower bound */
+    while (k & 1U) {{
+        k >>= 1;
+    }}
+    k >>= 1;
+    
+    if (k == 0 || g_modbus_{name}_eytzinger_addr[k] != addr) {{
+        return -1;
+    }}
+    return g_modbus_{name}_eytzinger_index[k];
+}}
+
+''')
+        
+        write('''/**
+ * \\brief           Get array index of a register from its internal address
+ * \\param[in]       addr: Internal register address (0-based)
+ * \\param[in]       reg_type: Register type (0=coil, 1=DI, 3=IR, 4=HR)
+ * \\return          Index in g_modbus_xxx array, `-1` if register is not defined
  */
 int32_t
-modbus_get_write_registers_count(void) {
-    int32_t count = 0;
-    int32_t i;
-    
-    /* Count Write registers in all types */
-    for (i = 0; i < MODBUS_HOLDING_REGISTER_COUNT; ++i) {
-        if (g_modbus_holding_register_map[i].operation == 1) {
-            count++;
-        }
-    }
-    for (i = 0; i < MODBUS_INPUT_REGISTER_COUNT; ++i) {
-        if (g_modbus_input_register_map[i].operation == 1) {
-            count++;
-        }
-    }
-    for (i = 0; i < MODBUS_COIL_COUNT; ++i) {
-        if (g_modbus_coil_map[i].operation == 1) {
-            count++;
-        }
-    }
-    for (i = 0; i < MODBUS_DISCRETE_INPUT_COUNT; ++i) {
-        if (g_modbus_discrete_input_map[i].operation == 1) {
-            count++;
-        }
+modbus_get_register_index(uint16_t addr, uint8_t reg_type) {
+    switch (reg_type) {
+        case 0:                                     /* Coil */
+            return lookup_coil(addr);
+        case 1:                                     /* Discrete Input */
+            return lookup_discrete_input(addr);
+        case 3:                                     /* Input Register */
+            return lookup_input_register(addr);
+        case 4:                                     /* Holding Register */
+            return lookup_holding_register(addr);
+        default:
+            return -1;
     }
-    
-    return count;
 }
 
-#endif /* MODBUS_DEVICE_TYPE_MASTER */
-'''
-        
-        return source
+''')
     
     def _get_range_comment(self, rng):
         """Get comment for register range"""
@@ -931,9 +1198,16 @@ modbus_get_write_registers_count(void) {
             return f"{type_name} {rng['start']}-{end_addr}"
     
     def parse_header(self, filename):
-        """Parse enhanced .h file and return config"""
-        with open(filename, 'r', encoding='utf-8') as f:
-            content = f.read()
+        """
+        Parse enhanced .h file and return config
+        Headers with a config block are read back losslessly, older headers are
+        tokenized line by line, register types taken from their address sections.
+        """
+        config = read_config_block(filename)
+        if config is not None:
+            if 'settings' not in config:
+                config['settings'] = self._get_default_settings()
+            return config
         
         config = {
             'slave_id': 1,
@@ -944,66 +1218,56 @@ modbus_get_write_registers_count(void) {
             'settings': self._get_default_settings()
         }
         
-        if '#define MODBUS_DEVICE_TYPE_MASTER' in content:
-            config['is_master'] = True
-            
-            target_match = re.search(r'/\* Target slave IDs: ([0-9, ]+) \*/', content)
-            if target_match:
-                slave_ids = [int(x.strip()) for x in target_match.group(1).split(',')]
-                config['target_slaves'] = slave_ids
-                for slave_id in slave_ids:
-                    config['slave_registers'][slave_id] = []
-        
-        # Enhanced pattern to capture operation and mode info
-        tag_pattern = r'#define\s+([A-Z0-9_]+)_ADDR\s+\((\d+)\)\s+/\*\s*(?:Slave\s+(\d+),\s*)?.*?(?:Op:\s*(\w+),\s*Mode:\s*(\w+))?'
-        matches = re.findall(tag_pattern, content)
-        
-        for match in matches:
-            tag_name = match[0]
-            internal_addr = int(match[1])
-            slave_id_str = match[2]
-            operation = match[3] if match[3] else 'Read'
-            mode = match[4] if match[4] else 'N/A'
-            
-            if 'COIL' in tag_name and 'DISCRETE' not in tag_name:
-                modbus_type = 0
-                combo_index = 0
-                mapped_addr = internal_addr + 1
-            elif 'DI' in tag_name or 'DISCRETE' in tag_name:
-                modbus_type = 1
-                combo_index = 1
-                mapped_addr = 10000 + internal_addr + 1
-            elif 'INPUT_REG' in tag_name or 'IR' in tag_name:
-                modbus_type = 3
-                combo_index = 2
-                mapped_addr = 30000 + internal_addr + 1
-            elif 'HOLDING_REG' in tag_name or 'HR' in tag_name:
-                modbus_type = 4
-                combo_index = 3
-                mapped_addr = 40000 + internal_addr + 1
-            else:
-                continue
-            
-            register = {
-                'tag_name': tag_name,
-                'internal_address': internal_addr,
-                'mapped_address': mapped_addr,
-                'type': combo_index,
-                'modbus_type': modbus_type,
-                'type_name': ['Coil (0x)', 'Discrete Input (1x)', 'Input Register (3x)', 'Holding Register (4x)'][combo_index],
-                'operation': operation,
-                'mode': mode
-            }
-            
-            if config['is_master'] and slave_id_str:
-                slave_id = int(slave_id_str)
-                if slave_id not in config['target_slaves']:
-                    config['target_slaves'].append(slave_id)
-                if slave_id not in config['slave_registers']:
-                    config['slave_registers'][slave_id] = []
-                config['slave_registers'][slave_id].append(register)
-            else:
-                config['registers'].append(register)
+        with open(filename, 'r', encoding='utf-8') as f:
+            section_type = None
+            for line in f:
+                if line.startswith('/* '):
+                    # Only the "<Type> internal addresses" sections hold register defines
+                    section_type = None
+                    if line.startswith('/* Target slave IDs: '):
+                        slave_ids = [int(x) for x in line[len('/* Target slave IDs: '):].split(' */')[0].split(',')]
+                        config['target_slaves'] = slave_ids
+                        for slave_id in slave_ids:
+                            config['slave_registers'].setdefault(slave_id, [])
+                    elif line.rstrip().endswith(' internal addresses */'):
+                        section_type = SECTION_TYPES.get(line.rstrip()[3:-len(' internal addresses */')])
+                    continue
+                if not line.startswith('#define '):
+                    continue
+                
+                fields = line.split(None, 2)
+                if len(fields) < 3:
+                    continue
+                if fields[1] == 'MODBUS_DEVICE_TYPE_MASTER':
+                    config['is_master'] = True
+                    continue
+                if section_type is None or not fields[1].endswith('_ADDR'):
+                    continue
+                
+                # (<address>)  /* Slave <id>, Addr <address>, Op: <op>, Mode: <mode> */
+                value, _, comment = fields[2].partition(')')
+                internal_addr = int(value.lstrip('(').strip())
+                slave_id = None
+                operation = 'N/A'
+                mode = 'N/A'
+                for item in comment.strip().lstrip('/*').rstrip('*/').split(','):
+                    key, _, item_value = item.strip().partition(' ')
+                    if key == 'Slave':
+                        slave_id = int(item_value)
+                    elif key == 'Op:':
+                        operation = item_value.strip()
+                    elif key == 'Mode:':
+                        mode = item_value.strip()
+                
+                tag_name = fields[1][:-len('_ADDR')]
+                type_index = MODBUS_TYPES.index(section_type)
+                if config['is_master'] and slave_id is not None:
+                    if slave_id not in config['target_slaves']:
+                        config['target_slaves'].append(slave_id)
+                    config['slave_registers'].setdefault(slave_id, []).append(
+                        make_register(tag_name, internal_addr, type_index, operation, mode, slave_id))
+                else:
+                    config['registers'].append(make_register(tag_name, internal_addr, type_index, operation, mode))
         
         return config
     
@@ -1021,6 +1285,7 @@ modbus_get_write_registers_count(void) {
                 {'var_name': 'MODBUS_FRAME_INTERVAL_MS', 'value': '10', 'description': 'Time between frames in one cycle (ms)'},
                 {'var_name': 'MODBUS_CYCLE_INTERVAL_MS', 'value': '100', 'description': 'Time between complete cycles (ms)'},
                 {'var_name': 'MODBUS_MAX_RETRIES', 'value': '3', 'description': 'Maximum retry attempts'},
+                {'var_name': 'MODBUS_BRIDGE_GAPS', 'value': '0', 'description': 'Read across register gaps: 1 only if every target slave answers unmapped addresses'},
             ],
             'slave': [
                 {'var_name': 'MODBUS_SLAVE_ID', 'value': '1', 'description': 'Modbus slave address (1-247)'},
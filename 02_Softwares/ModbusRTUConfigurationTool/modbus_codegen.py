@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+modbus_codegen.py
+Headless command line generator: saved JSON or project configs to modbus_registers.h/.c without PyQt5
+
+Usage: python modbus_codegen.py CONFIG [CONFIG | DIR ...] [-o OUTPUT_DIR] [-j JOBS] [--bridge-gaps | --no-bridge-gaps]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from modbus_code_generator import MANIFEST_FILENAME, ModbusCodeGenerator
+from modbus_project_store import PROJECT_EXTENSION, load_config_file
+
+
+LOOKUP_STRATEGIES = ['auto', 'dense', 'range', 'eytzinger']
+
+
+def load_config(filename):
+    """Load a config saved by the GUI, filling in default settings like open_config() does"""
+    config = load_config_file(filename)
+    if 'settings' not in config:
+        config['settings'] = ModbusCodeGenerator(config)._get_default_settings()
+    return config
+
+
+def collect_configs(paths):
+    """Expand directories to the *.json and project files they contain, keep files as given"""
+    config_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            # A directory that was generated into holds the manifest, which is no config
+            config_files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                       if name.lower().endswith(('.json', PROJECT_EXTENSION))
+                                       and name != MANIFEST_FILENAME))
+        else:
+            config_files.append(path)
+    return config_files
+
+
+def get_output_dirs(config_files, output_dir):
+    """
+    One config writes into output_dir, several write into output_dir/<config name>
+    Configs sharing a name keep their extension in it (slave_json, slave_mbproj).
+    Raises ValueError when two configs would still write into the same directory.
+    """
+    if len(config_files) == 1:
+        return [output_dir]
+    
+    stems = [os.path.splitext(os.path.basename(filename))[0] for filename in config_files]
+    names = []
+    for filename, stem in zip(config_files, stems):
+        if stems.count(stem) > 1:
+            stem, extension = os.path.splitext(os.path.basename(filename))
+            stem = f"{stem}_{extension.lstrip('.')}" if extension else stem
+        names.append(stem)
+    
+    clashes = {}
+    for filename, name in zip(config_files, names):
+        clashes.setdefault(os.path.normcase(name), []).append(filename)
+    clashes = [filenames for filenames in clashes.values() if len(filenames) > 1]
+    if clashes:
+        raise ValueError('Configs would write into the same output directory: '
+                         + '; '.join(', '.join(filenames) for filenames in clashes))
+    return [os.path.join(output_dir, name) for name in names]
+
+
+def generate_config(job):
+    """Generate one config, returns (config_file, output_dir, status, error message or None)"""
+    config_file, output_dir, lookup_strategy, lookup_flash_budget, bridge_gaps, force = job
+    try:
+        config = load_config(config_file)
+        os.makedirs(output_dir, exist_ok=True)
+        generator = ModbusCodeGenerator(config, lookup_strategy=lookup_strategy,
+                                        lookup_flash_budget=lookup_flash_budget, bridge_gaps=bridge_gaps)
+        if not force and generator.is_up_to_date(output_dir):
+            return config_file, output_dir, 'up to date', None
+        written = generator.generate_files(output_dir, manifest=True)
+    except Exception as e:
+        return config_file, output_dir, 'failed', str(e)
+    return config_file, output_dir, f"wrote {', '.join(written)}" if written else 'unchanged', None
+
+
+def run_jobs(jobs, workers):
+    """Yield job results, in a process pool when there is more than one worker"""
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield generate_config(job)
+        return
+    
+    # Only the batch path pays for importing the pool machinery
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        for result in executor.map(generate_config, jobs):
+            yield result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate modbus_registers.h/.c from saved JSON configs')
+    parser.add_argument('configs', nargs='+', help='Config files, or directories of *.json and project configs')
+    parser.add_argument('-o', '--output-dir', default='.',
+                        help='Output directory, one subdirectory per config when several are given')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='Parallel worker processes')
+    parser.add_argument('--lookup-strategy', choices=LOOKUP_STRATEGIES, default='auto',
+                        help='Address lookup table strategy')
+    parser.add_argument('--lookup-flash-budget', type=int, default=1024,
+                        help='Flash bytes a dense lookup table may use in auto mode')
+    bridging = parser.add_mutually_exclusive_group()
+    bridging.add_argument('--bridge-gaps', dest='bridge_gaps', action='store_true', default=None,
+                          help='Let Master reads span register gaps; target slaves must answer unmapped '
+                               'addresses. The MODBUS_BRIDGE_GAPS setting decides by default')
+    bridging.add_argument('--no-bridge-gaps', dest='bridge_gaps', action='store_false',
+                          help='Never let Master reads span register gaps, whatever the config says')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='Regenerate even when the manifest says the outputs are up to date')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only report failures')
+    args = parser.parse_args(argv)
+    
+    config_files = collect_configs(args.configs)
+    if not config_files:
+        print('No config files found', file=sys.stderr)
+        return 2
+    
+    try:
+        output_dirs = get_output_dirs(config_files, args.output_dir)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    
+    jobs = [(config_file, output_dir, args.lookup_strategy, args.lookup_flash_budget, args.bridge_gaps, args.force)
+            for config_file, output_dir in zip(config_files, output_dirs)]
+    
+    start = time.perf_counter()
+    failed = 0
+    skipped = 0
+    for config_file, output_dir, status, error in run_jobs(jobs, args.jobs):
+        if error is not None:
+            failed += 1
+            print(f'FAILED {config_file}: {error}', file=sys.stderr)
+            continue
+        if status == 'up to date':
+            skipped += 1
+        if not args.quiet:
+            print(f'{config_file} -> {output_dir}: {status}')
+    
+    if not args.quiet:
+        print(f'Generated {len(jobs) - failed - skipped}/{len(jobs)} configs, {skipped} up to date, '
+              f'in {time.perf_counter() - start:.2f} s')
+    
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,19 +4,187 @@ modbus_config_tool.py - Enhanced Main Logic
 Run this file to start the enhanced application
 """
 
+import os
 import sys
-import json
 import re
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from ui_modbus_config import Ui_MainWindow
+from modbus_bus_model import BusCostModel
+from modbus_edit_journal import EditJournal
+from modbus_poll_planner import CycleEstimate, IncrementalPlan, PollPlanner
+from modbus_project_store import PROJECT_EXTENSION, load_config_file, save_config_file
+from modbus_register_model import MODBUS_TYPES, RegisterIndex, make_register
 
 
-class RegisterRange:
-    def __init__(self, start_addr, count, reg_type):
-        self.start_addr = start_addr
-        self.count = count
-        self.reg_type = reg_type
+# Project files keep large configs compact and load slave lists on demand
+CONFIG_FILE_FILTER = f'Config Files (*.json *{PROJECT_EXTENSION});;JSON Files (*.json);;Project Files (*{PROJECT_EXTENSION})'
+
+# Edit journals and snapshots, one per running instance, recovered on the next start after a crash
+AUTOSAVE_DIR = os.path.join(os.path.expanduser('~'), '.modbus_config_tool')
+AUTOSAVE_INTERVAL_MS = 30000
+
+
+class RegisterTableModel(QAbstractTableModel):
+    """
+    Table model over one register list, edited in place so it stays the config's list
+    Rows are only materialized by the view when visible; adds and removes send
+    row notifications instead of rebuilding the table.
+    """
+    
+    HEADERS = ['Tag Name', 'Internal', 'Mapped', 'Type', 'Operation', 'Mode', 'Actions']
+    OPERATION_COLUMN = 4
+    MODE_COLUMN = 5
+    ACTION_COLUMN = 6
+    
+    # row, field, new value
+    register_edited = pyqtSignal(int, str, str)
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.registers = []
+        self.is_master = False
+    
+    def set_registers(self, registers, is_master):
+        self.beginResetModel()
+        self.registers = registers
+        self.is_master = is_master
+        self.endResetModel()
+    
+    def append_registers(self, registers):
+        if not registers:
+            return
+        first = len(self.registers)
+        self.beginInsertRows(QModelIndex(), first, first + len(registers) - 1)
+        self.registers.extend(registers)
+        self.endInsertRows()
+    
+    def remove_register(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        reg = self.registers.pop(row)
+        self.endRemoveRows()
+        return reg
+    
+    def clear_registers(self):
+        self.beginResetModel()
+        self.registers.clear()
+        self.endResetModel()
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.registers)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        
+        reg = self.registers[index.row()]
+        column = index.column()
+        if column == 0:
+            return reg.tag_name
+        elif column == 1:
+            return str(reg.internal_address)
+        elif column == 2:
+            return str(reg.mapped_address)
+        elif column == 3:
+            return reg.type_name
+        elif column == self.OPERATION_COLUMN:
+            return (reg.operation or 'Read') if self.is_master else 'N/A'
+        elif column == self.MODE_COLUMN:
+            if not self.is_master:
+                return 'N/A'
+            mode = reg.mode if reg.mode in ('One-time', 'Cyclic') else 'One-time'
+            # Read registers show the mode they get back when switched to Write
+            return mode if reg.is_write() or role == Qt.EditRole else 'N/A'
+        return 'Remove'
+    
+    def flags(self, index):
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if self.is_master:
+            column = index.column()
+            reg = self.registers[index.row()]
+            if column == self.OPERATION_COLUMN or (column == self.MODE_COLUMN and reg.is_write()):
+                flags |= Qt.ItemIsEditable
+        return flags
+    
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid():
+            return False
+        
+        row = index.row()
+        reg = self.registers[row]
+        if index.column() == self.OPERATION_COLUMN:
+            reg.operation = value
+            
+            # Update mode based on operation
+            if value == 'Read':
+                reg.mode = 'N/A'
+            elif reg.mode in (None, 'N/A'):
+                reg.mode = 'One-time'
+            self.dataChanged.emit(self.index(row, self.OPERATION_COLUMN), self.index(row, self.MODE_COLUMN))
+            self.register_edited.emit(row, 'operation', value)
+            return True
+        elif index.column() == self.MODE_COLUMN:
+            reg.mode = value
+            self.dataChanged.emit(index, index)
+            self.register_edited.emit(row, 'mode', value)
+            return True
+        return False
+
+
+class ComboBoxDelegate(QStyledItemDelegate):
+    """Drop-down editor, created only for the cell being edited"""
+    
+    def __init__(self, items, parent=None):
+        super().__init__(parent)
+        self.items = items
+    
+    def createEditor(self, parent, option, index):
+        editor = QComboBox(parent)
+        editor.addItems(self.items)
+        # Commit as soon as an entry is picked, like the old per-row combo boxes
+        editor.activated.connect(lambda: self.commit_and_close(editor))
+        return editor
+    
+    def commit_and_close(self, editor):
+        self.commitData.emit(editor)
+        self.closeEditor.emit(editor)
+    
+    def setEditorData(self, editor, index):
+        editor.setCurrentText(index.data(Qt.EditRole))
+    
+    def setModelData(self, editor, model, index):
+        if editor.currentText() != index.data(Qt.EditRole):
+            model.setData(index, editor.currentText(), Qt.EditRole)
+    
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect)
+
+
+class ButtonDelegate(QStyledItemDelegate):
+    """Painted push button, emits the row when clicked"""
+    
+    clicked = pyqtSignal(int)
+    
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data()
+        button.state = QStyle.State_Enabled
+        QApplication.style().drawControl(QStyle.CE_PushButton, button, painter)
+    
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and option.rect.contains(event.pos()):
+            self.clicked.emit(index.row())
+            return True
+        return False
 
 
 class ModbusConfigTool(QMainWindow, Ui_MainWindow):
@@ -33,6 +201,12 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
             'settings': self.get_default_settings()
         }
         self.current_selected_slave = None
+        self.range_plan = None
+        self.cycle_estimate = None
+        self.range_costs = []
+        self.register_index = RegisterIndex()
+        self.journal = EditJournal(AUTOSAVE_DIR)
+        self.setup_register_table()
         
         self.connect_signals()
         self.update_slave_config_display()
@@ -40,7 +214,34 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
         self.update_register_management_state()
         self.update_operation_mode_visibility()
         self.statusbar.showMessage('Ready - Enhanced Modbus RTU Configuration Tool v2.0')
-        
+        self.recover_autosave()
+        
+        # Compaction keeps the journal short, appending already saved every edit
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.timeout.connect(lambda: self.journal.compact_if_needed(self.config))
+        self.autosave_timer.start(AUTOSAVE_INTERVAL_MS)
+        
+    def recover_autosave(self):
+        """Offer the edits journaled by a session that did not close, then start a new journal"""
+        edits = 0
+        recovered = self.journal.recover()
+        if recovered is not None and recovered[1] > 0:
+            config, count = recovered
+            reply = QMessageBox.question(self, 'Recover',
+                                         f'Recover {count} unsaved edits from the last session?',
+                                         QMessageBox.Yes | QMessageBox.No,
+                                         QMessageBox.Yes)
+            if reply == QMessageBox.Yes:
+                self.config = config
+                self.update_ui_from_config()
+                self.statusbar.showMessage(f'Recovered {count} unsaved edits')
+                edits = count
+        self.journal.reset(self.config, edits=edits)
+    
+    def closeEvent(self, event):
+        self.journal.discard()
+        super().closeEvent(event)
+    
     def get_default_settings(self):
         return {
             'common': [
@@ -54,6 +255,7 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
                 {'var_name': 'MODBUS_FRAME_INTERVAL_MS', 'value': '10', 'description': 'Time between frames in one cycle (ms)'},
                 {'var_name': 'MODBUS_CYCLE_INTERVAL_MS', 'value': '100', 'description': 'Time between complete cycles (ms)'},
                 {'var_name': 'MODBUS_MAX_RETRIES', 'value': '3', 'description': 'Maximum retry attempts'},
+                {'var_name': 'MODBUS_BRIDGE_GAPS', 'value': '0', 'description': 'Read across register gaps: 1 only if every target slave answers unmapped addresses'},
             ],
             'slave': [
                 {'var_name': 'MODBUS_SLAVE_ID', 'value': '1', 'description': 'Modbus slave address (1-247)'},
@@ -61,6 +263,18 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
             ]
         }
     
+    def setup_register_table(self):
+        self.register_model = RegisterTableModel(self)
+        self.register_table.setModel(self.register_model)
+        
+        self.operation_delegate = ComboBoxDelegate(['Read', 'Write'], self.register_table)
+        self.mode_delegate = ComboBoxDelegate(['One-time', 'Cyclic'], self.register_table)
+        self.remove_delegate = ButtonDelegate(self.register_table)
+        self.register_table.setItemDelegateForColumn(RegisterTableModel.OPERATION_COLUMN, self.operation_delegate)
+        self.register_table.setItemDelegateForColumn(RegisterTableModel.MODE_COLUMN, self.mode_delegate)
+        self.register_table.setItemDelegateForColumn(RegisterTableModel.ACTION_COLUMN, self.remove_delegate)
+        self.register_table.setEditTriggers(QAbstractItemView.CurrentChanged | QAbstractItemView.SelectedClicked)
+    
     def connect_signals(self):
         self.action_new.triggered.connect(self.new_config)
         self.action_open.triggered.connect(self.open_config)
@@ -83,6 +297,9 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
         self.quick_add_5_btn.clicked.connect(lambda: self.quick_add_consecutive_registers(5))
         self.quick_add_10_btn.clicked.connect(lambda: self.quick_add_consecutive_registers(10))
         self.remove_all_btn.clicked.connect(self.remove_all_registers)
+        
+        self.register_model.register_edited.connect(self.on_register_edited)
+        self.remove_delegate.clicked.connect(self.remove_register)
     
     def validate_tag_name(self, text):
         if text:
@@ -100,14 +317,25 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
         return f'{type_prefix}_{internal_addr:04d}'
     
     def open_settings_dialog(self):
-        dialog = SettingsDialog(self.config, self)
+        # Settings added after a config was saved are listed with their defaults
+        settings = {}
+        for group, defaults in self.get_default_settings().items():
+            current = list(self.config.get('settings', {}).get(group, []))
+            names = {setting['var_name'] for setting in current}
+            settings[group] = current + [setting for setting in defaults if setting['var_name'] not in names]
+        dialog = SettingsDialog(dict(self.config, settings=settings), self)
         if dialog.exec_() == QDialog.Accepted:
             self.config['settings'] = dialog.get_settings()
+            self.journal.set_config('settings', self.config['settings'])
+            self.cycle_estimate = None
+            self.optimize_ranges()
             self.statusbar.showMessage('Configuration settings updated')
     
     def on_device_type_changed(self, text):
         self.config['is_master'] = (text == 'Master')
+        self.journal.set_config('is_master', self.config['is_master'])
         self.current_selected_slave = None
+        self.cycle_estimate = None
         self.update_slave_config_display()
         self.update_register_management_state()
         self.update_operation_mode_visibility()
@@ -190,6 +418,7 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
         if 'slave_registers' not in self.config:
             self.config['slave_registers'] = {}
         self.config['slave_registers'][slave_id] = []
+        self.journal.add_slave(slave_id)
         
         self.target_slave_input.setValue(slave_id + 1)
         self.statusbar.showMessage(f'Added target slave {slave_id}')
@@ -212,13 +441,18 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
                 if slave_id in self.config['target_slaves']:
                     self.config['target_slaves'].remove(slave_id)
                 if 'slave_registers' in self.config and slave_id in self.config['slave_registers']:
-                    del self.config['slave_registers'][slave_id]
+                    self.register_index.remove_slave(slave_id, self.config['slave_registers'].pop(slave_id))
+                self.journal.remove_slave(slave_id)
+                if self.cycle_estimate is not None:
+                    self.cycle_estimate.remove_slave(slave_id)
                 
                 self.target_slaves_list.takeItem(self.target_slaves_list.row(current_item))
                 
                 if self.current_selected_slave == slave_id:
                     self.current_selected_slave = None
                     self.update_register_management_state()
+                else:
+                    self.update_range_stats()
                 
                 self.statusbar.showMessage(f'Deleted slave {slave_id}')
         except Exception as e:
@@ -286,46 +520,30 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
             QMessageBox.warning(self, 'Error', f'Invalid register type!')
             return
         
-        current_registers = self.get_current_register_list()
-        
-        for reg in current_registers:
-            if reg.get('tag_name', '') == tag_name:
-                QMessageBox.warning(self, 'Warning', f'Tag name "{tag_name}" already exists!')
-                return
+        slave_id = self.get_current_slave_id()
         
-        for reg in current_registers:
-            if reg['internal_address'] == internal_addr and reg['type'] == reg_type:
-                QMessageBox.warning(self, 'Warning', f'Register {mapped_addr} already exists!')
-                return
+        if self.register_index.has_tag_name(tag_name, slave_id):
+            QMessageBox.warning(self, 'Warning', f'Tag name "{tag_name}" already exists!')
+            return
         
-        register = {
-            'tag_name': tag_name,
-            'internal_address': internal_addr,
-            'mapped_address': mapped_addr,
-            'type': reg_type,
-            'modbus_type': [0, 1, 3, 4][reg_type],
-            'type_name': self.reg_type.currentText()
-        }
+        if self.register_index.has_address(internal_addr, MODBUS_TYPES[reg_type], slave_id):
+            QMessageBox.warning(self, 'Warning', f'Register {mapped_addr} already exists!')
+            return
         
         # Add operation and mode for Master mode
         if self.config['is_master']:
-            register['operation'] = self.reg_operation.currentText()
-            register['mode'] = self.reg_mode.currentText() if self.reg_operation.currentText() == 'Write' else 'N/A'
+            operation = self.reg_operation.currentText()
+            mode = self.reg_mode.currentText() if operation == 'Write' else 'N/A'
         else:
-            register['operation'] = 'N/A'  # Slave doesn't have operation concept
-            register['mode'] = 'N/A'
+            operation = 'N/A'  # Slave doesn't have operation concept
+            mode = 'N/A'
         
-        if self.config['is_master'] and self.current_selected_slave is not None:
-            if 'slave_registers' not in self.config:
-                self.config['slave_registers'] = {}
-            if self.current_selected_slave not in self.config['slave_registers']:
-                self.config['slave_registers'][self.current_selected_slave] = []
-            self.config['slave_registers'][self.current_selected_slave].append(register)
-        else:
-            self.config['registers'].append(register)
+        register = make_register(tag_name, internal_addr, reg_type, operation, mode, slave_id)
+        self.register_model.append_registers([register])
+        self.register_index.add(register)
+        self.journal.add_register(register)
         
-        self.update_register_table()
-        self.optimize_ranges()
+        self.apply_range_changes(self.range_plan.add(register))
         
         self.reg_address.setValue(internal_addr + 1)
         self.reg_tag_name.clear()
@@ -333,19 +551,27 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
         
         self.statusbar.showMessage(f'Added register {tag_name} ({mapped_addr})')
     
+    def get_current_slave_id(self):
+        """Slave the register list being edited belongs to, None in Slave mode"""
+        if self.config['is_master'] and self.current_selected_slave is not None:
+            return self.current_selected_slave
+        return None
+    
     def get_current_register_list(self):
         if self.config['is_master'] and self.current_selected_slave is not None:
             if 'slave_registers' not in self.config:
                 self.config['slave_registers'] = {}
-            if self.current_selected_slave not in self.config['slave_registers']:
-                self.config['slave_registers'][self.current_selected_slave] = []
-            return self.config['slave_registers'][self.current_selected_slave]
+            slave_registers = self.config['slave_registers']
+            if self.current_selected_slave not in slave_registers:
+                slave_registers[self.current_selected_slave] = []
+            # First look at a slave list, whether the project was read for it here, on a save or by the journal
+            self.register_index.add_slave(self.current_selected_slave, slave_registers[self.current_selected_slave])
+            return slave_registers[self.current_selected_slave]
         else:
             return self.config['registers']
     
     def update_register_table(self):
-        current_registers = self.get_current_register_list()
-        self.register_table.setRowCount(len(current_registers))
+        self.register_model.set_registers(self.get_current_register_list(), self.config['is_master'])
         
         # Hide/Show Operation and Mode columns based on device type
         if self.config['is_master']:
@@ -354,78 +580,21 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
         else:
             self.register_table.setColumnHidden(4, True)   # Hide Operation
             self.register_table.setColumnHidden(5, True)   # Hide Mode
-        
-        for i, reg in enumerate(current_registers):
-            self.register_table.setItem(i, 0, QTableWidgetItem(reg.get('tag_name', 'N/A')))
-            self.register_table.setItem(i, 1, QTableWidgetItem(str(reg['internal_address'])))
-            self.register_table.setItem(i, 2, QTableWidgetItem(str(reg['mapped_address'])))
-            self.register_table.setItem(i, 3, QTableWidgetItem(reg['type_name']))
-            
-            # Operation column - dropdown for Master mode
-            if self.config['is_master']:
-                operation_combo = QComboBox()
-                operation_combo.addItems(['Read', 'Write'])
-                operation_combo.setCurrentText(reg.get('operation', 'Read'))
-                operation_combo.currentTextChanged.connect(lambda text, row=i: self.on_table_operation_changed(row, text))
-                self.register_table.setCellWidget(i, 4, operation_combo)
-            else:
-                self.register_table.setItem(i, 4, QTableWidgetItem('N/A'))
-            
-            # Mode column - dropdown for Master mode, only enabled for Write
-            if self.config['is_master']:
-                mode_combo = QComboBox()
-                mode_combo.addItems(['One-time', 'Cyclic'])
-                current_mode = reg.get('mode', 'One-time')
-                if current_mode != 'N/A':
-                    mode_combo.setCurrentText(current_mode)
-                mode_combo.setEnabled(reg.get('operation', 'Read') == 'Write')
-                mode_combo.currentTextChanged.connect(lambda text, row=i: self.on_table_mode_changed(row, text))
-                self.register_table.setCellWidget(i, 5, mode_combo)
-            else:
-                self.register_table.setItem(i, 5, QTableWidgetItem('N/A'))
-            
-            remove_btn = QPushButton('Remove')
-            remove_btn.clicked.connect(lambda checked, idx=i: self.remove_register(idx))
-            self.register_table.setCellWidget(i, 6, remove_btn)
-    
-    def on_table_operation_changed(self, row, operation):
-        """Handle operation change in table"""
-        current_registers = self.get_current_register_list()
-        if 0 <= row < len(current_registers):
-            current_registers[row]['operation'] = operation
-            
-            # Update mode based on operation
-            if operation == 'Read':
-                current_registers[row]['mode'] = 'N/A'
-                # Disable mode combo for this row
-                mode_combo = self.register_table.cellWidget(row, 5)
-                if isinstance(mode_combo, QComboBox):
-                    mode_combo.setEnabled(False)
-                    mode_combo.setCurrentText('One-time')  # Reset to default
-            else:  # Write
-                if current_registers[row]['mode'] == 'N/A':
-                    current_registers[row]['mode'] = 'One-time'
-                # Enable mode combo for this row
-                mode_combo = self.register_table.cellWidget(row, 5)
-                if isinstance(mode_combo, QComboBox):
-                    mode_combo.setEnabled(True)
-            
-            self.statusbar.showMessage(f'Updated {current_registers[row]["tag_name"]} operation to {operation}')
     
-    def on_table_mode_changed(self, row, mode):
-        """Handle mode change in table"""
-        current_registers = self.get_current_register_list()
-        if 0 <= row < len(current_registers):
-            current_registers[row]['mode'] = mode
-            self.statusbar.showMessage(f'Updated {current_registers[row]["tag_name"]} mode to {mode}')
+    def on_register_edited(self, row, field, value):
+        """Handle operation or mode change in table"""
+        reg = self.register_model.registers[row]
+        self.journal.update_register(self.get_current_slave_id(), row, reg)
+        self.apply_range_changes(self.range_plan.update(reg))
+        self.statusbar.showMessage(f'Updated {reg.tag_name} {field} to {value}')
     
     def remove_register(self, index):
-        current_registers = self.get_current_register_list()
-        if 0 <= index < len(current_registers):
-            removed_reg = current_registers.pop(index)
-            self.update_register_table()
-            self.optimize_ranges()
-            self.statusbar.showMessage(f'Removed register {removed_reg.get("tag_name", "N/A")}')
+        if 0 <= index < self.register_model.rowCount():
+            removed_reg = self.register_model.remove_register(index)
+            self.register_index.remove(removed_reg)
+            self.journal.remove_register(self.get_current_slave_id(), index)
+            self.apply_range_changes(self.range_plan.remove(removed_reg))
+            self.statusbar.showMessage(f'Removed register {removed_reg.tag_name}')
     
     def remove_all_registers(self):
         current_registers = self.get_current_register_list()
@@ -439,8 +608,10 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
                                    QMessageBox.No)
         
         if reply == QMessageBox.Yes:
-            current_registers.clear()
-            self.update_register_table()
+            for reg in current_registers:
+                self.register_index.remove(reg)
+            self.register_model.clear_registers()
+            self.journal.clear_registers(self.get_current_slave_id())
             self.optimize_ranges()
             self.statusbar.showMessage('Removed all registers')
     
@@ -448,60 +619,38 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
         start_addr = self.reg_address.value()
         reg_type = self.reg_type.currentIndex()
         
+        if not 0 <= reg_type < len(MODBUS_TYPES):
+            return
+        
         added_count = 0
         
+        # Add operation and mode for Master mode
+        if self.config['is_master']:
+            operation = self.reg_operation.currentText()
+            mode = self.reg_mode.currentText() if operation == 'Write' else 'N/A'
+        else:
+            operation = 'N/A'
+            mode = 'N/A'
+        
+        slave_id = self.get_current_slave_id()
+        new_registers = []
+        
         for i in range(count):
             internal_addr = start_addr + i
             
-            if reg_type == 0:
-                mapped_addr = internal_addr + 1
-            elif reg_type == 1:
-                mapped_addr = 10000 + internal_addr + 1
-            elif reg_type == 2:
-                mapped_addr = 30000 + internal_addr + 1
-            elif reg_type == 3:
-                mapped_addr = 40000 + internal_addr + 1
-            else:
-                continue
-            
-            current_registers = self.get_current_register_list()
-            
-            exists = any(reg['internal_address'] == internal_addr and reg['type'] == reg_type 
-                        for reg in current_registers)
-            
-            if not exists:
+            if not self.register_index.has_address(internal_addr, MODBUS_TYPES[reg_type], slave_id):
                 tag_name = self.generate_default_tag_name(internal_addr, reg_type)
-                
-                register = {
-                    'tag_name': tag_name,
-                    'internal_address': internal_addr,
-                    'mapped_address': mapped_addr,
-                    'type': reg_type,
-                    'modbus_type': [0, 1, 3, 4][reg_type],
-                    'type_name': self.reg_type.currentText()
-                }
-                
-                # Add operation and mode for Master mode
-                if self.config['is_master']:
-                    register['operation'] = self.reg_operation.currentText()
-                    register['mode'] = self.reg_mode.currentText() if self.reg_operation.currentText() == 'Write' else 'N/A'
-                else:
-                    register['operation'] = 'N/A'
-                    register['mode'] = 'N/A'
-                
-                if self.config['is_master'] and self.current_selected_slave is not None:
-                    if 'slave_registers' not in self.config:
-                        self.config['slave_registers'] = {}
-                    if self.current_selected_slave not in self.config['slave_registers']:
-                        self.config['slave_registers'][self.current_selected_slave] = []
-                    self.config['slave_registers'][self.current_selected_slave].append(register)
-                else:
-                    self.config['registers'].append(register)
-                
+                register = make_register(tag_name, internal_addr, reg_type, operation, mode, slave_id)
+                new_registers.append(register)
+                self.register_index.add(register)
+                self.journal.add_register(register)
                 added_count += 1
         
-        self.update_register_table()
-        self.optimize_ranges()
+        self.register_model.append_registers(new_registers)
+        changes = []
+        for register in new_registers:
+            changes.extend(self.range_plan.add(register))
+        self.apply_range_changes(changes)
         
         self.reg_address.setValue(start_addr + count)
         self.update_mapped_address()
@@ -509,73 +658,104 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
         self.statusbar.showMessage(f'Added {added_count} registers')
     
     def optimize_ranges(self):
-        self.ranges_table.setRowCount(0)
-        
+        """Rebuild the range plan and the ranges view for the current register list"""
         current_registers = self.get_current_register_list()
-        if not current_registers:
-            self.update_ranges_table([])
-            return
-        
-        optimized_ranges = self.get_optimized_ranges_for_registers(current_registers)
-        self.update_ranges_table(optimized_ranges)
-    
-    def get_optimized_ranges_for_registers(self, registers):
-        if not registers:
-            return []
         
-        type_groups = {}
-        for reg in registers:
-            modbus_type = reg.get('modbus_type', [0, 1, 3, 4][reg['type']])
-            
-            if modbus_type not in type_groups:
-                type_groups[modbus_type] = []
-            type_groups[modbus_type].append(reg['internal_address'])
-        
-        optimized_ranges = []
-        for modbus_type, addresses in type_groups.items():
-            addresses.sort()
-            ranges = self.create_ranges(addresses, modbus_type)
-            optimized_ranges.extend(ranges)
-        
-        return optimized_ranges
-    
-    def create_ranges(self, addresses, reg_type):
-        if not addresses:
-            return []
-        
-        ranges = []
-        start = addresses[0]
-        count = 1
+        # Master ranges are the planned requests for the selected slave
+        if self.config['is_master'] and self.current_selected_slave is not None:
+            planner = PollPlanner(self.config)
+            self.range_plan = IncrementalPlan(current_registers, planner, self.current_selected_slave)
+        else:
+            self.range_plan = IncrementalPlan(current_registers)
         
-        for i in range(1, len(addresses)):
-            if addresses[i] == addresses[i-1] + 1:
-                count += 1
+        if self.cycle_estimate is None:
+            # Every indexed slave is planned once; edits then only update the selected slave's total
+            if self.config['is_master']:
+                self.cycle_estimate = CycleEstimate.from_config(
+                    self.config, skip=lambda slave_id: not self.register_index.has_slave(slave_id))
             else:
-                ranges.append(RegisterRange(start, count, reg_type))
-                start = addresses[i]
-                count = 1
+                self.cycle_estimate = CycleEstimate(BusCostModel.from_settings(self.config.get('settings', {})), 0)
         
-        ranges.append(RegisterRange(start, count, reg_type))
+        ranges = self.range_plan.requests()
+        self.range_costs = [self.cycle_estimate.cycle_us(rng) for rng in ranges]
+        if not self.config['is_master'] or self.current_selected_slave is not None:
+            self.cycle_estimate.set_slave(self.current_selected_slave, ranges)
         
-        return ranges
-    
-    def update_ranges_table(self, ranges):
         self.ranges_table.setRowCount(len(ranges))
-        
+        for i, rng in enumerate(ranges):
+            self.set_range_row(i, rng)
+        self.update_range_stats()
+    
+    def apply_range_changes(self, changes):
+        """Replace only the ranges view rows an incremental plan update touched"""
+        for row, removed, ranges in changes:
+            for _ in range(removed - len(ranges)):
+                self.ranges_table.removeRow(row)
+            for i in range(removed, len(ranges)):
+                self.ranges_table.insertRow(row + i)
+            for i, rng in enumerate(ranges):
+                self.set_range_row(row + i, rng)
+            
+            costs = [self.cycle_estimate.cycle_us(rng) for rng in ranges]
+            # Like optimize_ranges(), a Master without a selected slave has no entry to adjust
+            if not self.config['is_master'] or self.current_selected_slave is not None:
+                self.cycle_estimate.adjust_slave(self.current_selected_slave,
+                                                 sum(costs) - sum(self.range_costs[row:row + removed]))
+            self.range_costs[row:row + removed] = costs
+        self.update_range_stats()
+    
+    def set_range_row(self, i, rng):
         type_names = {0: 'Coil', 1: 'Discrete Input', 3: 'Input Register', 4: 'Holding Register'}
         
-        for i, rng in enumerate(ranges):
-            self.ranges_table.setItem(i, 0, QTableWidgetItem(str(rng.start_addr)))
-            self.ranges_table.setItem(i, 1, QTableWidgetItem(str(rng.count)))
-            self.ranges_table.setItem(i, 2, QTableWidgetItem(type_names.get(rng.reg_type, 'Unknown')))
+        self.ranges_table.setItem(i, 0, QTableWidgetItem(str(rng.start_addr)))
+        self.ranges_table.setItem(i, 1, QTableWidgetItem(str(rng.count)))
+        self.ranges_table.setItem(i, 2, QTableWidgetItem(type_names.get(rng.reg_type, 'Unknown')))
+        if rng.function_code is not None:
+            self.ranges_table.setItem(i, 3, QTableWidgetItem(f"{rng.count} regs/1 req (FC{rng.function_code:02X})"))
+        else:
             self.ranges_table.setItem(i, 3, QTableWidgetItem(f"{rng.count} regs/1 req"))
         
+        # One-time writes are not part of every cycle
+        cost_ms = self.cycle_estimate.request_us(rng) / 1000.0
+        once = '' if rng.is_every_cycle() else ' (once)'
+        self.ranges_table.setItem(i, 4, QTableWidgetItem(f"{cost_ms:.2f} ms{once}"))
+    
+    def update_range_stats(self):
+        range_count = len(self.range_plan)
         current_registers = self.get_current_register_list()
         if len(current_registers) > 0:
-            efficiency = ((len(current_registers) - len(ranges)) / len(current_registers) * 100)
-            self.stats_label.setText(f'Statistics: {len(current_registers)} registers, {len(ranges)} ranges ({efficiency:.1f}% reduction)')
+            efficiency = ((len(current_registers) - range_count) / len(current_registers) * 100)
+            stats = f'Statistics: {len(current_registers)} registers, {range_count} ranges ({efficiency:.1f}% reduction)'
+            report = self.range_plan.report
+            if report is not None and report['saved_requests'] > 0:
+                stats += (f'\nGap bridging: {report["strict_requests"]} -> {report["requests"]} requests, '
+                          f'saves {report["saved_time_us"] / 1000.0:.2f} ms wire time per cycle')
         else:
-            self.stats_label.setText('Statistics: 0 registers, 0 ranges')
+            stats = 'Statistics: 0 registers, 0 ranges'
+        
+        estimate = self.cycle_estimate
+        overloaded = False
+        tooltip = ''
+        if not self.config['is_master']:
+            if current_registers:
+                stats += f'\nBus time to read every range once: {estimate.total_us / 1000.0:.2f} ms'
+        elif estimate.slave_us:
+            stats += (f'\nCycle estimate: {estimate.total_us / 1000.0:.2f} ms of {estimate.cycle_interval_ms} ms '
+                      f'({estimate.utilization * 100:.1f}% bus utilization)')
+            if self.current_selected_slave in estimate.slave_us:
+                stats += f', Slave {self.current_selected_slave}: {estimate.slave_us[self.current_selected_slave] / 1000.0:.2f} ms'
+            not_opened = len(self.config.get('slave_registers', {})) - len(estimate.slave_us)
+            if not_opened > 0:
+                stats += f' ({not_opened} slaves not opened yet)'
+            overloaded = estimate.utilization > 1.0
+            if overloaded:
+                stats += '\nPlanned requests do not fit in MODBUS_CYCLE_INTERVAL_MS'
+            tooltip = '\n'.join(f'Slave {slave_id}: {slave_us / 1000.0:.2f} ms'
+                                 for slave_id, slave_us in estimate.slave_us.items())
+        
+        self.stats_label.setText(stats)
+        self.stats_label.setToolTip(tooltip)
+        self.stats_label.setStyleSheet('color: red;' if overloaded else '')
     
     def new_config(self):
         self.config = {
@@ -588,6 +768,7 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
         }
         self.current_selected_slave = None
         self.update_ui_from_config()
+        self.journal.reset(self.config)
     
     def update_ui_from_config(self):
         self.device_type.setCurrentText('Master' if self.config['is_master'] else 'Slave')
@@ -600,6 +781,9 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
         if 'settings' not in self.config:
             self.config['settings'] = self.get_default_settings()
         
+        self.register_index = RegisterIndex.from_config(self.config)
+        self.cycle_estimate = None
+        
         self.update_slave_config_display()
         self.update_operation_mode_visibility()
         self.update_register_table()
@@ -616,25 +800,25 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
                 self.config['target_slaves'].append(slave_id)
     
     def open_config(self):
-        filename, _ = QFileDialog.getOpenFileName(self, 'Open Config', '', 'JSON Files (*.json)')
+        filename, _ = QFileDialog.getOpenFileName(self, 'Open Config', '', CONFIG_FILE_FILTER)
         if filename:
             try:
-                with open(filename, 'r') as f:
-                    self.config = json.load(f)
+                self.config = load_config_file(filename)
                 if 'settings' not in self.config:
                     self.config['settings'] = self.get_default_settings()
                 self.update_ui_from_config()
+                self.journal.reset(self.config, filename)
                 self.statusbar.showMessage(f'Loaded config from {filename}')
             except Exception as e:
                 QMessageBox.critical(self, 'Error', f'Failed to load config: {str(e)}')
     
     def save_config(self):
         self.update_config_from_ui()
-        filename, _ = QFileDialog.getSaveFileName(self, 'Save Config', '', 'JSON Files (*.json)')
+        filename, _ = QFileDialog.getSaveFileName(self, 'Save Config', '', CONFIG_FILE_FILTER)
         if filename:
             try:
-                with open(filename, 'w') as f:
-                    json.dump(self.config, f, indent=2)
+                save_config_file(self.config, filename)
+                self.journal.reset(self.config, filename)
                 self.statusbar.showMessage(f'Saved config to {filename}')
             except Exception as e:
                 QMessageBox.critical(self, 'Error', f'Failed to save config: {str(e)}')
@@ -649,9 +833,12 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
         try:
             from modbus_code_generator import ModbusCodeGenerator
             generator = ModbusCodeGenerator(self.config)
-            generator.generate_files(output_dir)
+            written = generator.generate_files(output_dir)
             self.statusbar.showMessage(f'Exported to {output_dir}')
-            QMessageBox.information(self, 'Success', f'Files generated:\n- modbus_registers.h\n- modbus_registers.c')
+            if written:
+                QMessageBox.information(self, 'Success', 'Files generated:\n' + '\n'.join(f'- {name}' for name in written))
+            else:
+                QMessageBox.information(self, 'Success', 'Files are up to date, nothing was rewritten')
         except Exception as e:
             QMessageBox.critical(self, 'Error', f'Failed to export: {str(e)}')
     
@@ -663,6 +850,8 @@ class ModbusConfigTool(QMainWindow, Ui_MainWindow):
                 generator = ModbusCodeGenerator(self.config)
                 self.config = generator.parse_header(filename)
                 self.update_ui_from_config()
+                # Imported registers are not saved anywhere yet: count the import as an edit
+                self.journal.reset(self.config, edits=1)
                 self.statusbar.showMessage(f'Imported from {filename}')
             except Exception as e:
                 QMessageBox.critical(self, 'Error', f'Failed to import: {str(e)}')
@@ -795,6 +984,12 @@ class SettingsDialog(QDialog):
             combo.setCurrentText(current_value)
             return combo
             
+        elif var_name == 'MODBUS_BRIDGE_GAPS':
+            combo = QComboBox()
+            combo.addItems(['0', '1'])  # 0=Strict ranges, 1=Read across gaps
+            combo.setCurrentText(current_value)
+            return combo
+            
         elif 'SLAVE_ID' in var_name:
             spinbox = QSpinBox()
             spinbox.setRange(1, 247)
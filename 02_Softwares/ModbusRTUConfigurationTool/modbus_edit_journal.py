@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+modbus_edit_journal.py
+Append-only journal of config edits for autosave and crash recovery
+
+The journal is a JSON lines file: a header naming the file the edits apply to,
+then one short record per edit. Appending costs a few microseconds whatever the
+config size; compaction writes the whole config to a snapshot project file and
+starts a new journal on it. Every running instance keeps its own journal next to
+a lock file it holds, so only journals of instances that are gone are recovered.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+
+from modbus_project_store import PROJECT_EXTENSION, load_config_file, save_project
+from modbus_register_model import Register
+
+
+JOURNAL_VERSION = 1
+
+# Records after which compact_if_needed() rewrites the snapshot
+COMPACT_RECORDS = 2000
+
+# autosave-<key>.lock, .journal and .mbproj make up the journal of one instance
+JOURNAL_PREFIX = 'autosave-'
+JOURNAL_EXTENSION = '.journal'
+LOCK_EXTENSION = '.lock'
+
+
+def get_file_signature(filename):
+    """(size, mtime in ns) telling whether a base file changed after the journal started"""
+    stat = os.stat(filename)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def lock_file(f):
+    """Exclusive lock on an open file without waiting, False when another process holds it"""
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def remove_files(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def get_register_list(config, slave_id):
+    if slave_id is None:
+        return config['registers']
+    # The GUI creates a target slave's list when it is first shown
+    return config.setdefault('slave_registers', {}).setdefault(slave_id, [])
+
+
+def apply_record(config, record):
+    """Replay one journal record on a normalized config"""
+    op = record[0]
+    if op == 'add':
+        _, slave_id, (tag, addr, modbus_type, operation, mode) = record
+        get_register_list(config, slave_id).append(Register(tag, addr, modbus_type, operation, mode, slave_id))
+    elif op == 'remove':
+        _, slave_id, row = record
+        del get_register_list(config, slave_id)[row]
+    elif op == 'clear':
+        get_register_list(config, record[1]).clear()
+    elif op == 'set':
+        _, slave_id, row, operation, mode = record
+        reg = get_register_list(config, slave_id)[row]
+        reg.operation = operation
+        reg.mode = mode
+    elif op == 'add_slave':
+        config.setdefault('target_slaves', []).append(record[1])
+        config.setdefault('slave_registers', {})[record[1]] = []
+    elif op == 'remove_slave':
+        slave_id = record[1]
+        if slave_id in config.get('target_slaves', []):
+            config['target_slaves'].remove(slave_id)
+        config.get('slave_registers', {}).pop(slave_id, None)
+    elif op == 'config':
+        _, key, value = record
+        config[key] = value
+    else:
+        raise ValueError(f'Unknown journal record {op!r}')
+
+
+class EditJournal:
+    """
+    Journal of the edits made to one config since it was opened, saved or compacted
+    Write errors disable the journal instead of interrupting editing. The journal
+    files are created on the first reset() and locked until discard().
+    """
+    
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = None
+        self.snapshot_path = None
+        self.lock = None
+        self.file = None
+        self.records = 0
+        self.edits = 0
+        # (lock file, path without extension) of recovered journals, removed once this one started
+        self.claimed = []
+    
+    def _acquire(self):
+        """Create and lock the files of this instance's journal"""
+        if self.lock is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, lock_path = tempfile.mkstemp(prefix=JOURNAL_PREFIX, suffix=LOCK_EXTENSION, dir=self.directory)
+        lock = os.fdopen(fd, 'w')
+        if not lock_file(lock):
+            lock.close()
+            remove_files(lock_path)
+            raise OSError(f'Cannot lock {lock_path}')
+        self.lock = lock
+        stem = lock_path[:-len(LOCK_EXTENSION)]
+        self.path = stem + JOURNAL_EXTENSION
+        self.snapshot_path = stem + PROJECT_EXTENSION
+    
+    def reset(self, config, base_file=None, edits=0):
+        """
+        Start a new journal on config
+        base_file is a saved file config is identical to; without one the config
+        is written to the snapshot first. edits counts the unsaved edits config
+        already holds, so a crash before the next edit still offers them.
+        """
+        self.close()
+        self.records = 0
+        self.edits = edits
+        try:
+            self._acquire()
+            if base_file is None:
+                save_project(config, self.snapshot_path)
+                base_file = self.snapshot_path
+            header = {'journal': JOURNAL_VERSION, 'base': os.path.abspath(base_file),
+                      'signature': get_file_signature(base_file), 'edits': edits}
+            self.file = open(self.path, 'w', encoding='utf-8')
+            self.file.write(json.dumps(header) + '\n')
+            self.file.flush()
+        except (OSError, sqlite3.Error):
+            self.close()
+        self._release_claimed()
+    
+    def append(self, *record):
+        if self.file is None:
+            return
+        try:
+            # Flushed to the OS on every edit, so a crash of the tool loses nothing
+            self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self.file.flush()
+            self.records += 1
+            self.edits += 1
+        except OSError:
+            self.close()
+    
+    def add_register(self, reg):
+        self.append('add', reg.slave_id, [reg.tag_name, reg.internal_address, reg.modbus_type, reg.operation, reg.mode])
+    
+    def remove_register(self, slave_id, row):
+        self.append('remove', slave_id, row)
+    
+    def clear_registers(self, slave_id):
+        self.append('clear', slave_id)
+    
+    def update_register(self, slave_id, row, reg):
+        """Operation and mode of a register after a table edit"""
+        self.append('set', slave_id, row, reg.operation, reg.mode)
+    
+    def add_slave(self, slave_id):
+        self.append('add_slave', slave_id)
+    
+    def remove_slave(self, slave_id):
+        self.append('remove_slave', slave_id)
+    
+    def set_config(self, key, value):
+        """Any other top level config key, e.g. is_master or settings"""
+        self.append('config', key, value)
+    
+    def compact_if_needed(self, config):
+        if self.file is not None and self.records >= COMPACT_RECORDS:
+            self.reset(config, edits=self.edits)
+    
+    def recover(self):
+        """
+        (config, unsaved edit count) of the latest journal left by a session that did not close
+        Journals a running instance holds the lock of are skipped. The recovered one,
+        and newer ones with nothing to recover, are removed by the next reset().
+        None when no journal is left with edits.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return None
+        journals = []
+        for name in names:
+            if name.startswith(JOURNAL_PREFIX) and name.endswith(JOURNAL_EXTENSION):
+                path = os.path.join(self.directory, name)
+                try:
+                    journals.append((os.path.getmtime(path), path))
+                except OSError:
+                    # Removed by its instance on exit while listing
+                    pass
+        
+        for _, path in sorted(journals, reverse=True):
+            stem = path[:-len(JOURNAL_EXTENSION)]
+            try:
+                lock = open(stem + LOCK_EXTENSION, 'a')
+            except OSError:
+                continue
+            if not lock_file(lock):
+                lock.close()
+                continue
+            self.claimed.append((lock, stem))
+            recovered = self._replay(path)
+            if recovered is not None and recovered[1] > 0:
+                return recovered
+        return None
+    
+    def _replay(self, path):
+        """
+        (config, edit count) of one journal, None when its base file changed or it does not replay
+        A torn last record, e.g. from a crash in the middle of a write, is dropped.
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.read().split('\n')
+            header = json.loads(lines[0])
+            if header.get('journal') != JOURNAL_VERSION:
+                return None
+            if get_file_signature(header['base']) != header['signature']:
+                return None
+            config = load_config_file(header['base'])
+            
+            count = header.get('edits', 0)
+            for line in lines[1:]:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                apply_record(config, record)
+                count += 1
+        except (OSError, sqlite3.Error, ValueError, LookupError, TypeError):
+            return None
+        return config, count
+    
+    def close(self):
+        if self.file is not None:
+            try:
+                self.file.close()
+            except OSError:
+                pass
+            self.file = None
+    
+    def _release_claimed(self):
+        for lock, stem in self.claimed:
+            remove_files(stem + JOURNAL_EXTENSION, stem + PROJECT_EXTENSION)
+            lock.close()
+            remove_files(stem + LOCK_EXTENSION)
+        self.claimed = []
+    
+    def discard(self):
+        """Close and remove the journal, its snapshot and lock, e.g. on a clean exit"""
+        self.close()
+        self._release_claimed()
+        if self.lock is not None:
+            # The journal goes first, so no other instance recovers it in between
+            remove_files(self.path, self.snapshot_path)
+            self.lock.close()
+            remove_files(self.path[:-len(JOURNAL_EXTENSION)] + LOCK_EXTENSION)
+            self.lock = None
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+modbus_frame_delimiter.py
+Incremental Modbus RTU frame splitting for timestamped byte chunks from any transport
+
+Frames end on a T3.5 silence like in modbus_rtu.c, or as soon as the length
+predicted from the function code is reached and the CRC checks, so a reader
+does not have to wait out the silence after every frame.
+"""
+
+from modbus_bus_model import BusCostModel
+from modbus_rtu_codec import (FC_WRITE_MULTIPLE_COILS, FC_WRITE_MULTIPLE_REGISTERS, FRAME_MIN_SIZE,
+                              MAX_ADU_LENGTH, READ_FUNCTION_CODES, WRITE_FUNCTION_CODES, check_crc)
+
+
+# What the receiving side expects: requests on a slave, responses on a master
+EXPECT_REQUESTS = 'requests'
+EXPECT_RESPONSES = 'responses'
+
+# Above 19200 baud the Modbus serial line spec fixes the silent intervals
+FIXED_INTERVAL_BAUDRATE = 19200
+FIXED_T15_US = 750
+FIXED_T35_US = 1750
+
+
+def get_silent_intervals_us(cost_model):
+    """(T1.5, T3.5) in microseconds for a bus cost model's serial line"""
+    if cost_model.baudrate > FIXED_INTERVAL_BAUDRATE:
+        return FIXED_T15_US, FIXED_T35_US
+    return 1.5 * cost_model.char_time_us, 3.5 * cost_model.char_time_us
+
+
+def predict_request_length(adu, length):
+    """
+    ADU length of a request from its first bytes
+    None while more bytes are needed, 0 when the function code gives no length.
+    """
+    if length < 2:
+        return None
+    function_code = adu[1]
+    if function_code in (FC_WRITE_MULTIPLE_COILS, FC_WRITE_MULTIPLE_REGISTERS):
+        return 9 + adu[6] if length >= 7 else None
+    if function_code in READ_FUNCTION_CODES or function_code in WRITE_FUNCTION_CODES:
+        return 8
+    return 0
+
+
+def predict_response_length(adu, length):
+    """ADU length of a response from its first bytes, same conventions as predict_request_length()"""
+    if length < 2:
+        return None
+    function_code = adu[1]
+    if function_code & 0x80:
+        return 5
+    if function_code in READ_FUNCTION_CODES:
+        return 5 + adu[2] if length >= 3 else None
+    if function_code in WRITE_FUNCTION_CODES:
+        return 8
+    return 0
+
+
+class FrameDelimiter:
+    """
+    Split timestamped byte chunks into complete ADUs
+    Bytes are copied chunk-wise into one preallocated buffer; the only allocation
+    is the bytes object of each finished frame. A T1.5 gap inside a frame only
+    discards it with check_t15=True: host-side timestamps of USB adapters and OS
+    reads are rarely precise enough for it.
+    """
+    
+    def __init__(self, cost_model=None, expect=EXPECT_RESPONSES, check_t15=False):
+        self.cost_model = cost_model or BusCostModel()
+        self.char_time_us = self.cost_model.char_time_us
+        self.t15_us, self.t35_us = get_silent_intervals_us(self.cost_model)
+        self.predict_length = predict_request_length if expect == EXPECT_REQUESTS else predict_response_length
+        self.check_t15 = check_t15
+        
+        self.buffer = bytearray(MAX_ADU_LENGTH)
+        self.length = 0
+        self.expected = None        # predicted frame length, None until known
+        self.unpredictable = False  # wait for T3.5: unknown function code or prediction failed
+        self.broken = False         # T1.5 gap seen inside the frame
+        self.last_time_us = None
+        
+        self.frames = 0
+        self.early_frames = 0
+        self.discarded = 0
+    
+    def reset(self):
+        """Drop any partial frame, e.g. after the transport reopened"""
+        self.length = 0
+        self._start_frame()
+        self.last_time_us = None
+    
+    def _start_frame(self):
+        self.expected = None
+        self.unpredictable = False
+        self.broken = False
+    
+    def feed(self, data, timestamp_us):
+        """
+        Add a chunk received at timestamp_us (arrival of its last byte), return the finished frames
+        The bytes of one chunk are taken as back to back on the wire.
+        """
+        frames = []
+        count = len(data)
+        if not count:
+            return frames
+        
+        if self.length and self.last_time_us is not None:
+            silence_us = timestamp_us - count * self.char_time_us - self.last_time_us
+            if silence_us >= self.t35_us:
+                self._end_frame(frames)
+            elif self.check_t15 and silence_us > self.t15_us:
+                self.broken = True
+        self.last_time_us = timestamp_us
+        
+        pos = 0
+        while pos < count:
+            if self.length == MAX_ADU_LENGTH:
+                # No frame is that long: drop it and resynchronize on the next silence
+                self.discarded += 1
+                self.length = 0
+                self._start_frame()
+                self.unpredictable = True
+            take = min(MAX_ADU_LENGTH - self.length, count - pos)
+            self.buffer[self.length:self.length + take] = data[pos:pos + take]
+            self.length += take
+            pos += take
+            while self._complete_frame(frames):
+                pass
+        return frames
+    
+    def poll(self, now_us):
+        """Finish a frame the T3.5 silence ended, return it in a list like feed()"""
+        frames = []
+        if self.length and self.last_time_us is not None and now_us - self.last_time_us >= self.t35_us:
+            self._end_frame(frames)
+        return frames
+    
+    def _complete_frame(self, frames):
+        """Emit the frame once its predicted length is buffered, True when one was emitted"""
+        if self.unpredictable:
+            return False
+        if self.expected is None:
+            expected = self.predict_length(self.buffer, self.length)
+            if expected is None:
+                return False
+            if expected == 0 or expected > MAX_ADU_LENGTH:
+                self.unpredictable = True
+                return False
+            self.expected = expected
+        
+        expected = self.expected
+        if self.length < expected:
+            return False
+        if self.broken or not check_crc(self.buffer, expected):
+            # Misaligned or corrupt: let the T3.5 silence delimit it instead
+            self.expected = None
+            self.unpredictable = True
+            return False
+        
+        frames.append(bytes(self.buffer[:expected]))
+        self.frames += 1
+        self.early_frames += 1
+        
+        # Bytes after the frame already belong to the next one
+        rest = self.length - expected
+        if rest:
+            self.buffer[:rest] = self.buffer[expected:self.length]
+        self.length = rest
+        self._start_frame()
+        return rest > 0
+    
+    def _end_frame(self, frames):
+        """T3.5 silence: emit the buffered bytes if they form a valid frame"""
+        if not self.broken and self.length >= FRAME_MIN_SIZE and check_crc(self.buffer, self.length):
+            frames.append(bytes(self.buffer[:self.length]))
+            self.frames += 1
+        else:
+            self.discarded += 1
+        self.length = 0
+        self._start_frame()
+
+
+def iter_frames(chunks, delimiter):
+    """Frames of an iterable of (data, timestamp_us) chunks, ending with the last pending frame"""
+    last_time_us = None
+    for data, timestamp_us in chunks:
+        yield from delimiter.feed(data, timestamp_us)
+        last_time_us = timestamp_us
+    if last_time_us is not None:
+        yield from delimiter.poll(last_time_us + delimiter.t35_us)
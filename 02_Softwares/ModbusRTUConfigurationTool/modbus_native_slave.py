@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+modbus_native_slave.py
+Slaves running the firmware's modbus_rtu.c request handler, built as host shared libraries and loaded with ctypes
+
+Each slave gets its generated modbus_registers.c compiled with a copy of
+01_Firmwares/ModbusRTU/modbus_rtu.c and a host porting layer: request bytes go
+through modbus_rtu_rx_byte(), the T3.5 timer callback and modbus_rtu_slave_process(),
+and modbus_port_send() copies the response into a buffer Python reads back.
+NativeSlave can replace SimulatedSlave on a SimulatedBus.
+"""
+
+import ctypes
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+
+from modbus_code_generator import ModbusCodeGenerator
+from modbus_rtu_codec import FrameError
+
+
+FIRMWARE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '01_Firmwares', 'ModbusRTU')
+FIRMWARE_FILES = ['modbus_rtu.c', 'modbus_rtu.h', 'modbus_port.h']
+
+DEFAULT_BUILD_DIR = os.path.join(tempfile.gettempdir(), 'modbus_native_slaves')
+DEFAULT_CFLAGS = ('-O2',)
+LIBRARY_NAME = 'libmodbus_slave.so'
+
+# modbus_easy_poll() calls the CubeMX Error_Handler() without a prototype in scope
+PROTOTYPES_HEADER = '''void Error_Handler(void);
+'''
+
+PORT_SOURCE = '''#include <string.h>
+#include "modbus_rtu.h"
+#include "modbus_port.h"
+
+/* Host porting layer: the clock only moves when a request is fed, responses land in native_tx_buffer */
+static uint32_t native_time_us;
+static modbus_rtu_ctx_t native_ctx;
+
+uint8_t native_tx_buffer[MODBUS_MAX_ADU_LENGTH];
+uint16_t native_tx_length;
+
+void
+native_slave_init(uint8_t slave_id) {
+    modbus_rtu_init(&native_ctx, slave_id, false, 19200);
+}
+
+/**
+ * \\brief           Feed one request ADU to the slave state machine
+ * \\return          Length of the response in native_tx_buffer, `0` if the firmware sent none
+ */
+uint16_t
+native_slave_request(const uint8_t* adu, uint16_t length) {
+    native_tx_length = 0;
+    for (uint16_t i = 0; i < length; i++) {
+        modbus_rtu_rx_byte(&native_ctx, adu[i]);
+    }
+    native_time_us += native_ctx.t35_us;
+    modbus_rtu_timer_callback(&native_ctx);
+    modbus_rtu_slave_process(&native_ctx);
+
+    /* A dropped frame must not leave bytes behind for the next request */
+    native_ctx.state = MODBUS_STATE_IDLE;
+    native_ctx.rx_length = 0;
+    return native_tx_length;
+}
+
+void
+modbus_port_send(const uint8_t* data, uint16_t length) {
+    memcpy(native_tx_buffer, data, length);
+    native_tx_length = length;
+}
+
+uint32_t
+modbus_port_get_time_ms(void) {
+    return native_time_us / 1000;
+}
+
+uint32_t
+modbus_port_get_time_us(void) {
+    return native_time_us;
+}
+
+void
+modbus_port_delay_us(uint32_t us) {
+    native_time_us += us;
+}
+
+void
+modbus_port_uart_init(uint32_t baudrate, uint8_t parity, uint8_t stop_bits) {
+    (void)baudrate;
+    (void)parity;
+    (void)stop_bits;
+}
+
+void
+modbus_port_set_interrupts(bool enable) {
+    (void)enable;
+}
+
+void
+modbus_port_timer_init(uint32_t period_us) {
+    (void)period_us;
+}
+
+void
+modbus_port_timer_enable(bool enable) {
+    (void)enable;
+}
+
+void*
+modbus_port_get_timer_handle(void) {
+    return NULL;
+}
+
+uint8_t
+modbus_port_get_rx_byte(void) {
+    return 0;
+}
+
+void
+modbus_port_uart_receive_next(void) {
+}
+
+void
+modbus_port_rs485_tx_enable(void) {
+}
+
+void
+modbus_port_rs485_rx_enable(void) {
+}
+
+void
+Error_Handler(void) {
+}
+'''
+
+# Firmware accessor pairs per register type
+ACCESSORS = {
+    0: ('modbus_rtu_get_coil', 'modbus_rtu_set_coil', ctypes.c_bool),
+    1: ('modbus_rtu_get_discrete_input', 'modbus_rtu_set_discrete_input', ctypes.c_bool),
+    3: ('modbus_rtu_get_input_register', 'modbus_rtu_set_input_register', ctypes.c_uint16),
+    4: ('modbus_rtu_get_holding_register', 'modbus_rtu_set_holding_register', ctypes.c_uint16)
+}
+
+# Library paths already loaded: dlopen() hands out the same handle, and so the same registers, for a path
+_loaded_paths = set()
+
+
+def get_slave_config(slave_id, registers):
+    """Slave config the firmware of one slave is generated from"""
+    return {
+        'slave_id': slave_id,
+        'is_master': False,
+        'target_slaves': [],
+        'slave_registers': {},
+        'registers': registers,
+        'settings': ModbusCodeGenerator({})._get_default_settings()
+    }
+
+
+def get_build_hash(generator, cflags):
+    """Hash of the generator inputs, firmware sources, porting layer and compiler flags"""
+    digest = hashlib.sha256()
+    digest.update(generator.get_input_hash().encode('ascii'))
+    for filename in FIRMWARE_FILES:
+        with open(os.path.join(FIRMWARE_DIR, filename), 'rb') as f:
+            digest.update(f.read())
+    digest.update(PORT_SOURCE.encode('utf-8'))
+    digest.update(' '.join(cflags).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def build_library(slave_id, registers, build_dir=DEFAULT_BUILD_DIR, cflags=DEFAULT_CFLAGS, cc='gcc'):
+    """
+    Shared library of one slave's firmware, returns its path
+    Builds are kept under build_dir by content hash, so an unchanged slave is
+    not compiled again. Raises RuntimeError when the compiler fails.
+    """
+    generator = ModbusCodeGenerator(get_slave_config(slave_id, registers))
+    workdir = os.path.join(build_dir, f'slave{slave_id}_{get_build_hash(generator, cflags)[:16]}')
+    library = os.path.join(workdir, LIBRARY_NAME)
+    if os.path.exists(library):
+        return library
+    
+    os.makedirs(workdir, exist_ok=True)
+    generator.generate_files(workdir)
+    # modbus_rtu.c includes "modbus_registers.h" from its own directory, so it is built from a copy
+    for filename in FIRMWARE_FILES:
+        shutil.copy(os.path.join(FIRMWARE_DIR, filename), workdir)
+    for filename, source in (('native_prototypes.h', PROTOTYPES_HEADER), ('native_port.c', PORT_SOURCE)):
+        with open(os.path.join(workdir, filename), 'w') as f:
+            f.write(source)
+    
+    # Linked under a temporary name so a concurrent build never loads a partial file
+    fd, partial = tempfile.mkstemp(suffix='.so', dir=workdir)
+    os.close(fd)
+    try:
+        result = subprocess.run([cc, *cflags, '-shared', '-fPIC',
+                                 '-include', os.path.join(workdir, 'native_prototypes.h'), '-I', workdir,
+                                 *(os.path.join(workdir, filename) for filename in
+                                   ('modbus_registers.c', 'modbus_rtu.c', 'native_port.c')),
+                                 '-o', partial], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f'Building slave {slave_id} failed:\n{result.stderr}')
+        os.replace(partial, library)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return library
+
+
+def build_libraries(slaves, build_dir=DEFAULT_BUILD_DIR, cflags=DEFAULT_CFLAGS, cc='gcc', workers=None):
+    """Libraries of several (slave_id, registers) pairs, built in parallel, in order"""
+    slaves = list(slaves)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(slaves) <= 1:
+        return [build_library(slave_id, registers, build_dir, cflags, cc) for slave_id, registers in slaves]
+    
+    # The compiler runs outside the interpreter, so threads are enough
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(workers, len(slaves))) as executor:
+        return list(executor.map(lambda slave: build_library(slave[0], slave[1], build_dir, cflags, cc), slaves))
+
+
+def load_library(path):
+    """ctypes handle of a library, loaded from a private copy when the path is loaded already"""
+    if path not in _loaded_paths:
+        _loaded_paths.add(path)
+        return ctypes.CDLL(path)
+    fd, copy = tempfile.mkstemp(suffix='.so', dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        shutil.copy(path, copy)
+        return ctypes.CDLL(copy)
+    finally:
+        # The mapping stays valid once the file is unlinked
+        os.remove(copy)
+
+
+class NativeSlave:
+    """
+    One slave answered by its compiled firmware
+    Validation follows modbus_rtu.c, so requests must fall in one run of
+    consecutive addresses: a Master poll plan bridging gaps with MODBUS_BRIDGE_GAPS
+    gets exception responses, as the real slave would give. The firmware also answers
+    broadcasts; that response is dropped, as it never goes on the wire.
+    """
+    
+    def __init__(self, slave_id, library, response_delay_ms=0):
+        self.slave_id = slave_id
+        self.response_delay_ms = response_delay_ms
+        self.library = load_library(library)
+        
+        self._request = self.library.native_slave_request
+        self._request.argtypes = [ctypes.c_char_p, ctypes.c_uint16]
+        self._request.restype = ctypes.c_uint16
+        self._tx_address = ctypes.addressof((ctypes.c_uint8 * 256).in_dll(self.library, 'native_tx_buffer'))
+        
+        self._accessors = {}
+        for reg_type, (getter_name, setter_name, value_type) in ACCESSORS.items():
+            getter = getattr(self.library, getter_name)
+            getter.argtypes = [ctypes.c_uint16, ctypes.POINTER(value_type)]
+            getter.restype = ctypes.c_bool
+            setter = getattr(self.library, setter_name)
+            setter.argtypes = [ctypes.c_uint16, value_type]
+            setter.restype = ctypes.c_bool
+            self._accessors[reg_type] = (getter, setter, value_type)
+        
+        self.library.native_slave_init.argtypes = [ctypes.c_uint8]
+        self.library.native_slave_init(slave_id)
+        
+        self.requests = 0
+        self.exceptions = 0
+    
+    @classmethod
+    def build(cls, slave_id, registers, response_delay_ms=0, build_dir=DEFAULT_BUILD_DIR):
+        return cls(slave_id, build_library(slave_id, registers, build_dir), response_delay_ms)
+    
+    def get_value(self, reg_type, addr):
+        getter, _, value_type = self._accessors[reg_type]
+        value = value_type()
+        if not getter(addr, ctypes.byref(value)):
+            raise KeyError(addr)
+        return int(value.value)
+    
+    def set_value(self, reg_type, addr, value):
+        """Set a register as the firmware application would, e.g. to feed an input"""
+        _, setter, _ = self._accessors[reg_type]
+        if not setter(addr, value if reg_type in (3, 4) else bool(value)):
+            raise KeyError(addr)
+    
+    def handle_request(self, adu, broadcast=False):
+        """
+        Response ADU of the firmware to a request, None for broadcasts
+        FrameError is raised when the firmware drops the frame, e.g. on a bad CRC.
+        """
+        adu = bytes(adu)
+        length = self._request(adu, len(adu))
+        if length == 0:
+            raise FrameError('Frame dropped by the firmware')
+        self.requests += 1
+        if broadcast:
+            return None
+        response = ctypes.string_at(self._tx_address, length)
+        if response[1] & 0x80:
+            self.exceptions += 1
+        return response
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""
+modbus_poll_planner.py
+Per-slave, PDU-limit-aware request planner for Master mode
+"""
+
+from modbus_bus_model import (BusCostModel, READ_FUNCTION_CODES, MAX_READ_COUNT, RangeSet, compare_ranges,
+                              get_setting_values)
+from modbus_range_engine import coalesce_ranges, get_ranges
+from modbus_register_model import normalize_config
+
+
+# Write function codes: (single, multiple) for each writable register type
+WRITE_FUNCTION_CODES = {0: (0x05, 0x0F), 4: (0x06, 0x10)}
+
+# Maximum quantity a single write-multiple request may carry
+MAX_WRITE_COUNT = {0: 1968, 4: 123}
+
+
+def get_bridge_gaps(settings):
+    """
+    MODBUS_BRIDGE_GAPS of a config's settings, False when missing
+    Slaves generated by this tool reject reads of addresses they do not map, so
+    reads only bridge register gaps when the config opts in.
+    """
+    try:
+        return int(get_setting_values(settings or {}).get('MODBUS_BRIDGE_GAPS', 0)) != 0
+    except (TypeError, ValueError):
+        return False
+
+
+class PollRequest:
+    def __init__(self, slave_id, function_code, start_addr, count, reg_type, operation='Read', mode='N/A'):
+        self.slave_id = slave_id
+        self.function_code = function_code
+        self.start_addr = start_addr
+        self.count = count
+        self.reg_type = reg_type
+        self.operation = operation
+        self.mode = mode
+    
+    def to_range(self):
+        return {'start': self.start_addr, 'count': self.count, 'type': self.reg_type}
+    
+    def is_read(self):
+        return self.operation == 'Read'
+    
+    def is_cyclic(self):
+        return self.operation == 'Write' and self.mode == 'Cyclic'
+    
+    def is_every_cycle(self):
+        """Reads and Cyclic writes; One-time writes only go out when a value changes"""
+        return self.operation != 'Write' or self.mode == 'Cyclic'
+
+
+class PollPlanner:
+    """
+    Turn the per-slave register lists of a Master config into Modbus requests
+    Reads cover runs of consecutive addresses only; with bridge_gaps, or
+    MODBUS_BRIDGE_GAPS when it is None, they also read across gaps whenever that
+    is cheaper on the bus, and report holds the requests and wire time saved.
+    """
+    
+    def __init__(self, config, cost_model=None, max_read_count=None, max_write_count=None, bridge_gaps=None):
+        self.config = normalize_config(config)
+        self.cost_model = cost_model
+        if self.cost_model is None:
+            self.cost_model = BusCostModel.from_settings(config.get('settings', {}))
+        if bridge_gaps is None:
+            bridge_gaps = get_bridge_gaps(self.config.get('settings', {}))
+        self.bridge_gaps = bridge_gaps
+        
+        # Optional tighter limits, e.g. when target slaves use small fixed arrays
+        self.max_read_count = dict(MAX_READ_COUNT)
+        self.max_read_count.update(max_read_count or {})
+        self.max_write_count = dict(MAX_WRITE_COUNT)
+        self.max_write_count.update(max_write_count or {})
+        
+        self.report = None
+        self.strict_read_count = 0
+        self.skipped = []
+    
+    def plan(self):
+        """Plan every target slave, in target slave order"""
+        registers_by_slave = self.config.get('slave_registers', {})
+        
+        slave_ids = [int(slave_id) for slave_id in self.config.get('target_slaves', [])]
+        for slave_id in sorted(registers_by_slave):
+            if slave_id not in slave_ids:
+                slave_ids.append(slave_id)
+        
+        self.skipped = []
+        strict_reads = []
+        planned_reads = []
+        requests = []
+        for slave_id in slave_ids:
+            slave_requests = self._plan_slave(slave_id, registers_by_slave.get(slave_id, []),
+                                              strict_reads)
+            planned_reads.extend(req.to_range() for req in slave_requests if req.is_read())
+            requests.extend(slave_requests)
+        
+        self.strict_read_count = len(strict_reads)
+        self.report = compare_ranges(strict_reads, planned_reads, self.cost_model) if self.bridge_gaps else None
+        return requests
+    
+    def plan_slave(self, slave_id, registers):
+        """Plan the requests for one slave's Register records"""
+        self.skipped = []
+        strict_reads = []
+        requests = self._plan_slave(slave_id, registers, strict_reads)
+        planned_reads = [req.to_range() for req in requests if req.is_read()]
+        self.strict_read_count = len(strict_reads)
+        self.report = compare_ranges(strict_reads, planned_reads, self.cost_model) if self.bridge_gaps else None
+        return requests
+    
+    def _plan_slave(self, slave_id, registers, strict_reads):
+        reads = {}
+        writes = {}
+        for reg in registers:
+            if reg.is_write():
+                if reg.modbus_type not in WRITE_FUNCTION_CODES:
+                    # Inputs and discrete inputs are read-only on the wire
+                    self.skipped.append((slave_id, reg))
+                    continue
+                mode = 'Cyclic' if reg.is_cyclic() else 'One-time'
+                writes.setdefault((reg.modbus_type, mode), []).append(reg.internal_address)
+            else:
+                reads.setdefault(reg.modbus_type, []).append(reg.internal_address)
+        
+        requests = []
+        for modbus_type in sorted(reads, key=lambda t: READ_FUNCTION_CODES[t]):
+            addresses = sorted(set(reads[modbus_type]))
+            max_count = self.max_read_count[modbus_type]
+            strict = get_ranges(addresses, modbus_type, max_count=max_count)
+            strict_reads.extend(strict)
+            # Without bridging the strict ranges are the requests: the slave rejects unmapped addresses
+            ranges = get_ranges(addresses, modbus_type, self.cost_model, max_count) if self.bridge_gaps else strict
+            for rng in ranges:
+                requests.append(PollRequest(slave_id, READ_FUNCTION_CODES[modbus_type],
+                                            rng['start'], rng['count'], modbus_type))
+        
+        # Writes never bridge gaps: padding would overwrite registers on the slave
+        for modbus_type, mode in sorted(writes, key=lambda key: (WRITE_FUNCTION_CODES[key[0]][1], key[1])):
+            addresses = sorted(set(writes[(modbus_type, mode)]))
+            single_fc, multiple_fc = WRITE_FUNCTION_CODES[modbus_type]
+            for rng in get_ranges(addresses, modbus_type, max_count=self.max_write_count[modbus_type]):
+                function_code = single_fc if rng['count'] == 1 else multiple_fc
+                requests.append(PollRequest(slave_id, function_code, rng['start'], rng['count'],
+                                            modbus_type, 'Write', mode))
+        
+        return requests
+
+
+class IncrementalPlan:
+    """
+    Requests of one register list, kept up to date as registers are edited
+    With a planner the list is planned like PollPlanner.plan_slave(), without one
+    it is only coalesced like a Slave map. Edits return the changed request rows
+    as (first row, removed row count, new requests) instead of a new plan.
+    """
+    
+    def __init__(self, registers, planner=None, slave_id=None):
+        self.planner = planner
+        self.slave_id = slave_id
+        self.bridge_gaps = planner is not None and planner.bridge_gaps
+        
+        # Request groups in plan_slave() order, each one RangeSet
+        if planner is None:
+            self.order = [('Read', modbus_type, 'N/A') for modbus_type in (0, 1, 3, 4)]
+        else:
+            self.order = [('Read', modbus_type, 'N/A')
+                          for modbus_type in sorted(READ_FUNCTION_CODES, key=lambda t: READ_FUNCTION_CODES[t])]
+            self.order += [('Write', modbus_type, mode)
+                           for modbus_type in sorted(WRITE_FUNCTION_CODES, key=lambda t: WRITE_FUNCTION_CODES[t][1])
+                           for mode in ('Cyclic', 'One-time')]
+        
+        self.keys = {}
+        addresses = {key: [] for key in self.order}
+        for reg in registers:
+            key = self._get_key(reg)
+            self.keys[reg] = key
+            if key is not None:
+                addresses[key].append(reg.internal_address)
+        
+        # Initial ranges come from the shared engine, so rebuilding an unchanged
+        # list or exporting it after editing reuses the memoized results
+        self.groups = {}
+        self.strict = {}
+        for key in self.order:
+            operation, modbus_type, mode = key
+            unique = sorted(set(addresses[key]))
+            if planner is None:
+                cost_model, max_count = None, None
+            elif operation == 'Read' and not self.bridge_gaps:
+                cost_model, max_count = None, planner.max_read_count[modbus_type]
+            elif operation == 'Read':
+                cost_model, max_count = planner.cost_model, planner.max_read_count[modbus_type]
+                self.strict[modbus_type] = RangeSet(modbus_type, max_count=max_count, addresses=addresses[key],
+                                                    ranges=coalesce_ranges(unique, modbus_type, max_count=max_count))
+            else:
+                # Writes never bridge gaps: padding would overwrite registers on the slave
+                cost_model, max_count = None, planner.max_write_count[modbus_type]
+            self.groups[key] = RangeSet(modbus_type, cost_model, max_count, addresses[key],
+                                        coalesce_ranges(unique, modbus_type, cost_model, max_count))
+        
+        # Running payload byte totals for the gap bridging report, integers so
+        # edits and rebuilds always report the same wire time
+        self.strict_payload_bytes = 0
+        self.payload_bytes = 0
+        for modbus_type, strict in self.strict.items():
+            self.strict_payload_bytes += self._payload_bytes(modbus_type, strict.ranges())
+            self.payload_bytes += self._payload_bytes(modbus_type, self.groups[('Read', modbus_type, 'N/A')].ranges())
+    
+    def _get_key(self, reg):
+        """Request group of a register, None for writes the slave cannot accept"""
+        if self.planner is None or not reg.is_write():
+            return ('Read', reg.modbus_type, 'N/A')
+        if reg.modbus_type not in WRITE_FUNCTION_CODES:
+            return None
+        return ('Write', reg.modbus_type, 'Cyclic' if reg.is_cyclic() else 'One-time')
+    
+    def _payload_bytes(self, reg_type, ranges):
+        return sum(self.planner.cost_model.payload_bytes(reg_type, end - start + 1) for start, end in ranges)
+    
+    def _make_request(self, key, start, end):
+        operation, modbus_type, mode = key
+        count = end - start + 1
+        if self.planner is None:
+            return PollRequest(self.slave_id, None, start, count, modbus_type)
+        if operation == 'Read':
+            return PollRequest(self.slave_id, READ_FUNCTION_CODES[modbus_type], start, count, modbus_type)
+        single_fc, multiple_fc = WRITE_FUNCTION_CODES[modbus_type]
+        return PollRequest(self.slave_id, single_fc if count == 1 else multiple_fc, start, count,
+                           modbus_type, 'Write', mode)
+    
+    def _apply(self, key, addr, add):
+        if key is None:
+            return []
+        
+        if key[0] == 'Read' and key[1] in self.strict:
+            strict = self.strict[key[1]]
+            change = strict.add(addr) if add else strict.remove(addr)
+            if change is not None:
+                self.strict_payload_bytes += (self._payload_bytes(key[1], change[2])
+                                              - self._payload_bytes(key[1], change[1]))
+        
+        group = self.groups[key]
+        change = group.add(addr) if add else group.remove(addr)
+        if change is None:
+            return []
+        
+        first, removed, ranges = change
+        if key[0] == 'Read' and self.bridge_gaps:
+            self.payload_bytes += self._payload_bytes(key[1], ranges) - self._payload_bytes(key[1], removed)
+        
+        row = first
+        for other in self.order:
+            if other == key:
+                break
+            row += len(self.groups[other])
+        return [(row, len(removed), [self._make_request(key, start, end) for start, end in ranges])]
+    
+    def add(self, reg):
+        key = self._get_key(reg)
+        self.keys[reg] = key
+        return self._apply(key, reg.internal_address, True)
+    
+    def remove(self, reg):
+        return self._apply(self.keys.pop(reg, None), reg.internal_address, False)
+    
+    def update(self, reg):
+        """Regroup a register whose operation or mode was edited"""
+        if self.keys.get(reg) == self._get_key(reg):
+            return []
+        return self.remove(reg) + self.add(reg)
+    
+    def requests(self):
+        return [self._make_request(key, start, end)
+                for key in self.order for start, end in self.groups[key].ranges()]
+    
+    def __len__(self):
+        return sum(len(self.groups[key]) for key in self.order)
+    
+    @property
+    def report(self):
+        """Same figures as compare_ranges() over the read requests, None unless the planner bridges gaps"""
+        if not self.bridge_gaps:
+            return None
+        strict_requests = sum(len(strict) for strict in self.strict.values())
+        requests = sum(len(self.groups[key]) for key in self.order if key[0] == 'Read')
+        strict_time_us = self.planner.cost_model.read_transactions_us(strict_requests, self.strict_payload_bytes)
+        time_us = self.planner.cost_model.read_transactions_us(requests, self.payload_bytes)
+        return {
+            'strict_requests': strict_requests,
+            'requests': requests,
+            'saved_requests': strict_requests - requests,
+            'strict_time_us': strict_time_us,
+            'time_us': time_us,
+            'saved_time_us': strict_time_us - time_us
+        }
+
+
+class CycleEstimate:
+    """
+    Bus time of a master poll cycle against MODBUS_CYCLE_INTERVAL_MS, totalled per slave
+    A slave's total is kept up to date by adding the cost of changed requests,
+    so an edit does not re-plan the other slaves.
+    """
+    
+    def __init__(self, cost_model, cycle_interval_ms):
+        self.cost_model = cost_model
+        self.cycle_interval_ms = cycle_interval_ms
+        self.slave_us = {}
+    
+    @classmethod
+    def from_config(cls, config, cost_model=None, skip=None):
+        """
+        Estimate over the slave lists of a normalized Master config
+        Lists skip() is True for, e.g. ones a project has not loaded, are left out.
+        """
+        settings = config.get('settings', {})
+        planner = PollPlanner(config, cost_model)
+        try:
+            cycle_interval_ms = int(get_setting_values(settings).get('MODBUS_CYCLE_INTERVAL_MS', 100))
+        except (TypeError, ValueError):
+            cycle_interval_ms = 100
+        estimate = cls(planner.cost_model, cycle_interval_ms)
+        slave_registers = config.get('slave_registers', {})
+        for slave_id in slave_registers:
+            if skip is None or not skip(slave_id):
+                estimate.set_slave(slave_id, planner.plan_slave(slave_id, slave_registers[slave_id]))
+        return estimate
+    
+    def request_us(self, request):
+        """Bus time of one request in whole microseconds, so adjusted totals match a rebuild exactly"""
+        return round(self.cost_model.transaction_us(request.reg_type, request.count, not request.is_read()))
+    
+    def cycle_us(self, request):
+        """Bus time a request adds to every cycle"""
+        return self.request_us(request) if request.is_every_cycle() else 0
+    
+    def set_slave(self, slave_id, requests):
+        self.slave_us[slave_id] = sum(self.cycle_us(request) for request in requests)
+    
+    def adjust_slave(self, slave_id, delta_us):
+        self.slave_us[slave_id] = self.slave_us.get(slave_id, 0) + delta_us
+    
+    def remove_slave(self, slave_id):
+        self.slave_us.pop(slave_id, None)
+    
+    @property
+    def total_us(self):
+        return sum(self.slave_us.values())
+    
+    @property
+    def utilization(self):
+        """Share of the cycle interval the bus is busy, above 1.0 when cycles overrun"""
+        if self.cycle_interval_ms <= 0:
+            return 0.0
+        return self.total_us / (self.cycle_interval_ms * 1000.0)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+modbus_project_store.py
+Compact SQLite project format with per-slave lazy loading, lossless to and from the JSON config
+
+Usage: python modbus_project_store.py INPUT OUTPUT   (converts .json <-> .mbproj)
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from collections.abc import MutableMapping
+
+from modbus_register_model import Register, config_to_json, normalize_config
+
+
+PROJECT_EXTENSION = '.mbproj'
+PROJECT_FORMAT_VERSION = 1
+
+SQLITE_MAGIC = b'SQLite format 3\x00'
+
+# Registers are stored once, without the derived type name and mapped address.
+# slave_id is NULL for the Slave mode list; rowid keeps the list order.
+PROJECT_SCHEMA = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE slaves (slave_id INTEGER PRIMARY KEY, position INTEGER NOT NULL, register_count INTEGER NOT NULL);
+CREATE TABLE registers (
+    slave_id INTEGER,
+    tag_name TEXT NOT NULL,
+    internal_address INTEGER NOT NULL,
+    modbus_type INTEGER NOT NULL,
+    operation TEXT,
+    mode TEXT
+);
+CREATE INDEX registers_slave ON registers (slave_id);
+'''
+
+
+class LazySlaveRegisters(MutableMapping):
+    """slave_registers mapping whose register lists are read from the project on first access"""
+    
+    def __init__(self, connection, slave_ids):
+        self._connection = connection
+        # None marks a list that was not read yet; the dict keeps the slave order
+        self._lists = dict.fromkeys(slave_ids)
+    
+    def __getitem__(self, slave_id):
+        registers = self._lists[slave_id]
+        if registers is None:
+            registers = _read_registers(self._connection, slave_id)
+            self._lists[slave_id] = registers
+        return registers
+    
+    def __setitem__(self, slave_id, registers):
+        self._lists[slave_id] = registers
+    
+    def __delitem__(self, slave_id):
+        del self._lists[slave_id]
+    
+    def __contains__(self, slave_id):
+        return slave_id in self._lists
+    
+    def __iter__(self):
+        return iter(self._lists)
+    
+    def __len__(self):
+        return len(self._lists)
+    
+    def is_loaded(self, slave_id):
+        return self._lists.get(slave_id) is not None
+    
+    def load_all(self):
+        for slave_id in self._lists:
+            self[slave_id]
+    
+    def close(self):
+        """Read every remaining list and release the project file"""
+        if self._connection is not None:
+            self.load_all()
+            self._connection.close()
+            self._connection = None
+
+
+def _read_registers(connection, slave_id):
+    if slave_id is None:
+        rows = connection.execute('SELECT tag_name, internal_address, modbus_type, operation, mode '
+                                  'FROM registers WHERE slave_id IS NULL ORDER BY rowid')
+    else:
+        rows = connection.execute('SELECT tag_name, internal_address, modbus_type, operation, mode '
+                                  'FROM registers WHERE slave_id = ? ORDER BY rowid', (slave_id,))
+    return [Register(tag, addr, modbus_type, operation, mode, slave_id)
+            for tag, addr, modbus_type, operation, mode in rows]
+
+
+def is_project_file(filename):
+    """True for SQLite project files, whatever their extension"""
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+    except OSError:
+        return False
+
+
+def save_project(config, filename):
+    """Write config as a project file, replacing filename only once it is complete"""
+    slave_registers = config.get('slave_registers', {})
+    if isinstance(slave_registers, LazySlaveRegisters):
+        # The lists may still be read from the file about to be replaced
+        slave_registers.close()
+    
+    # Everything but the register lists, in key order; None keeps the lists' places
+    meta_config = {key: (None if key in ('registers', 'slave_registers') else value)
+                   for key, value in config.items()}
+    
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(filename) or '.',
+                                     prefix=f'.{os.path.basename(filename)}.', suffix='.tmp')
+    os.close(fd)
+    try:
+        connection = sqlite3.connect(temp_path)
+        try:
+            connection.executescript(PROJECT_SCHEMA)
+            connection.executemany('INSERT INTO meta VALUES (?, ?)', [
+                ('format_version', str(PROJECT_FORMAT_VERSION)),
+                ('config', json.dumps(meta_config, separators=(',', ':')))
+            ])
+            
+            def rows(registers, slave_id):
+                for reg in registers:
+                    if not isinstance(reg, Register):
+                        reg = Register.from_dict(reg)
+                    yield slave_id, reg.tag_name, reg.internal_address, reg.modbus_type, reg.operation, reg.mode
+            
+            insert = 'INSERT INTO registers VALUES (?, ?, ?, ?, ?, ?)'
+            connection.executemany(insert, rows(config.get('registers', []), None))
+            for position, (slave_id, registers) in enumerate(slave_registers.items()):
+                connection.execute('INSERT INTO slaves VALUES (?, ?, ?)', (int(slave_id), position, len(registers)))
+                connection.executemany(insert, rows(registers, int(slave_id)))
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(temp_path, filename)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def load_project(filename, lazy=True):
+    """
+    Read a project file into a normalized config
+    With lazy=True slave register lists are read on first access and the file
+    stays open until the config's slave_registers mapping is closed.
+    """
+    connection = sqlite3.connect(filename)
+    try:
+        meta = dict(connection.execute('SELECT key, value FROM meta'))
+        if int(meta.get('format_version', 0)) != PROJECT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported project format version {meta.get('format_version')}")
+        
+        slave_ids = [slave_id for slave_id, in connection.execute('SELECT slave_id FROM slaves ORDER BY position')]
+        slave_registers = LazySlaveRegisters(connection, slave_ids)
+        
+        config = json.loads(meta['config'])
+        if 'registers' in config:
+            config['registers'] = _read_registers(connection, None)
+        if 'slave_registers' in config:
+            config['slave_registers'] = slave_registers
+    except BaseException:
+        connection.close()
+        raise
+    
+    if not lazy or 'slave_registers' not in config:
+        slave_registers.close()
+    return config
+
+
+def load_config_file(filename):
+    """Normalized config from a JSON config or a project file"""
+    if is_project_file(filename):
+        return load_project(filename)
+    with open(filename, 'r') as f:
+        return normalize_config(json.load(f))
+
+
+def save_config_file(config, filename):
+    """Save as a project file for the project extension, as JSON otherwise"""
+    if filename.lower().endswith(PROJECT_EXTENSION):
+        save_project(config, filename)
+    else:
+        with open(filename, 'w') as f:
+            json.dump(config_to_json(config), f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f'Convert configs between JSON and {PROJECT_EXTENSION} projects')
+    parser.add_argument('input', help='JSON config or project file')
+    parser.add_argument('output', help=f'Output file, a project when it ends with {PROJECT_EXTENSION}')
+    args = parser.parse_args(argv)
+    
+    save_config_file(load_config_file(args.input), args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
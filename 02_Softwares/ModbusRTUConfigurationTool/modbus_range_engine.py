@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+modbus_range_engine.py
+Shared range optimization with results memoized per register type and address set
+"""
+
+import hashlib
+from array import array
+from collections import OrderedDict
+
+from modbus_bus_model import iter_coalesced_ranges
+
+
+# Distinct (type, options, address set) results kept, least recently used dropped first
+RANGE_CACHE_SIZE = 1024
+
+_range_cache = OrderedDict()
+_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def get_address_fingerprint(addresses):
+    """Digest of a sorted address list, so cache keys do not hold the addresses"""
+    return hashlib.blake2b(array('l', addresses).tobytes(), digest_size=16).digest()
+
+
+def get_cost_key(cost_model):
+    """Bus parameters a cost model bridges gaps with, None when gaps are never bridged"""
+    if cost_model is None:
+        return None
+    return (cost_model.baudrate, cost_model.data_bits, cost_model.parity,
+            cost_model.stop_bits, cost_model.frame_interval_ms)
+
+
+def coalesce_ranges(addresses, reg_type, cost_model=None, max_count=None):
+    """
+    Memoized coalesce_addresses() as a tuple of (start, end) pairs
+    addresses must be sorted and unique. The result is shared, do not modify it.
+    """
+    key = (reg_type, get_cost_key(cost_model), max_count, len(addresses), get_address_fingerprint(addresses))
+    ranges = _range_cache.get(key)
+    if ranges is not None:
+        _range_cache.move_to_end(key)
+        _cache_stats['hits'] += 1
+        return ranges
+    
+    _cache_stats['misses'] += 1
+    ranges = tuple(iter_coalesced_ranges(addresses, reg_type, cost_model, max_count))
+    _range_cache[key] = ranges
+    if len(_range_cache) > RANGE_CACHE_SIZE:
+        _range_cache.popitem(last=False)
+    return ranges
+
+
+def get_ranges(addresses, reg_type, cost_model=None, max_count=None):
+    """Memoized coalesce_addresses(), same {'start', 'count', 'type'} list"""
+    return [{'start': start, 'count': end - start + 1, 'type': reg_type}
+            for start, end in coalesce_ranges(addresses, reg_type, cost_model, max_count)]
+
+
+def get_register_ranges(registers):
+    """Strictly coalesced ranges of a register list, types in order of first appearance"""
+    type_groups = {}
+    for reg in registers:
+        if reg.modbus_type not in type_groups:
+            type_groups[reg.modbus_type] = []
+        type_groups[reg.modbus_type].append(reg.internal_address)
+    
+    ranges = []
+    for modbus_type, addresses in type_groups.items():
+        ranges.extend(get_ranges(sorted(set(addresses)), modbus_type))
+    return ranges
+
+
+def get_cache_info():
+    """Cache hits, misses and current size"""
+    return dict(_cache_stats, size=len(_range_cache))
+
+
+def clear_cache():
+    _range_cache.clear()
+    _cache_stats['hits'] = 0
+    _cache_stats['misses'] = 0
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+modbus_register_model.py
+Normalized register records and the per-type register table shared by the GUI and the generator
+"""
+
+import re
+
+
+# Register type combo index (0=Coil, 1=DI, 2=IR, 3=HR) to Modbus register type
+MODBUS_TYPES = [0, 1, 3, 4]
+
+TYPE_NAMES = ['Coil (0x)', 'Discrete Input (1x)', 'Input Register (3x)', 'Holding Register (4x)']
+
+# Mapped address offset of each combo index (40001 = holding register 0)
+MAPPED_ADDRESS_BASES = [1, 10001, 30001, 40001]
+
+# Any existing "S<slave id>_" prefix, whatever the number of digits
+SLAVE_PREFIX_PATTERN = re.compile(r'^S\d+_')
+
+
+class Register:
+    """
+    One configured register
+    Only the fields a user sets are stored; type name and mapped address are
+    derived. operation and mode are None when the config did not set them.
+    """
+    
+    __slots__ = ('tag_name', 'internal_address', 'modbus_type', 'operation', 'mode', 'slave_id')
+    
+    def __init__(self, tag_name, internal_address, modbus_type, operation=None, mode=None, slave_id=None):
+        self.tag_name = tag_name
+        self.internal_address = internal_address
+        self.modbus_type = modbus_type
+        self.operation = operation
+        self.mode = mode
+        self.slave_id = slave_id
+    
+    @classmethod
+    def from_dict(cls, data, slave_id=None):
+        """Build a record from the saved JSON / legacy dict format"""
+        if 'modbus_type' in data:
+            modbus_type = data['modbus_type']
+        else:
+            modbus_type = MODBUS_TYPES[data['type']]
+        internal_address = data['internal_address']
+        return cls(data.get('tag_name') or f'REG_{internal_address}', internal_address, modbus_type,
+                   data.get('operation'), data.get('mode'), slave_id)
+    
+    def to_dict(self):
+        """Saved JSON format, including the derived fields older tool versions expect"""
+        data = {
+            'tag_name': self.tag_name,
+            'internal_address': self.internal_address,
+            'mapped_address': self.mapped_address,
+            'type': self.type_index,
+            'modbus_type': self.modbus_type,
+            'type_name': self.type_name
+        }
+        if self.operation is not None:
+            data['operation'] = self.operation
+        if self.mode is not None:
+            data['mode'] = self.mode
+        return data
+    
+    @property
+    def type_index(self):
+        """Register type combo index (0=Coil, 1=DI, 2=IR, 3=HR)"""
+        return MODBUS_TYPES.index(self.modbus_type)
+    
+    @property
+    def type_name(self):
+        return TYPE_NAMES[self.type_index]
+    
+    @property
+    def mapped_address(self):
+        return MAPPED_ADDRESS_BASES[self.type_index] + self.internal_address
+    
+    def is_write(self):
+        return self.operation == 'Write'
+    
+    def is_cyclic(self):
+        return self.operation == 'Write' and self.mode == 'Cyclic'
+
+
+def make_register(tag_name, internal_address, type_index, operation=None, mode=None, slave_id=None):
+    """Create a record from a GUI register type combo index"""
+    return Register(tag_name, internal_address, MODBUS_TYPES[type_index], operation, mode, slave_id)
+
+
+def to_register(reg, slave_id=None):
+    """Return reg as a Register record, converting legacy dicts"""
+    if isinstance(reg, Register):
+        if slave_id is not None and reg.slave_id is None:
+            reg.slave_id = slave_id
+        return reg
+    return Register.from_dict(reg, slave_id)
+
+
+def normalize_config(config):
+    """
+    Return a shallow copy of config whose register lists hold Register records
+    Records already in the config are reused, slave_registers keys become ints.
+    Lazily loaded project lists already hold records and are kept as they are.
+    """
+    normalized = dict(config)
+    if 'registers' in config:
+        normalized['registers'] = [to_register(reg) for reg in config['registers']]
+    if 'slave_registers' in config and not hasattr(config['slave_registers'], 'is_loaded'):
+        normalized['slave_registers'] = {
+            int(slave_id): [to_register(reg, int(slave_id)) for reg in registers]
+            for slave_id, registers in config['slave_registers'].items()
+        }
+    return normalized
+
+
+def config_to_json(config):
+    """Shallow copy of config with records converted back to the saved JSON format"""
+    data = dict(config)
+    if 'registers' in config:
+        data['registers'] = [to_register(reg).to_dict() for reg in config['registers']]
+    if 'slave_registers' in config:
+        data['slave_registers'] = {slave_id: [to_register(reg).to_dict() for reg in registers]
+                                   for slave_id, registers in config['slave_registers'].items()}
+    return data
+
+
+def config_to_compact(config):
+    """
+    Compact JSON-ready form of a config, registers as [tag, address, Modbus type, operation, mode]
+    Lossless: compact_to_config() gives back the same keys, records, order and settings.
+    """
+    def pack(registers):
+        return [[reg.tag_name, reg.internal_address, reg.modbus_type, reg.operation, reg.mode]
+                for reg in map(to_register, registers)]
+    
+    data = {}
+    for key, value in config.items():
+        if key == 'registers':
+            value = pack(value)
+        elif key == 'slave_registers':
+            value = {str(slave_id): pack(registers) for slave_id, registers in value.items()}
+        data[key] = value
+    return data
+
+
+def compact_to_config(data):
+    """Normalized config from config_to_compact() output"""
+    config = {}
+    for key, value in data.items():
+        if key == 'registers':
+            value = [Register(tag, addr, modbus_type, operation, mode)
+                     for tag, addr, modbus_type, operation, mode in value]
+        elif key == 'slave_registers':
+            slave_registers = {}
+            for slave_id, registers in value.items():
+                slave_id = int(slave_id)
+                slave_registers[slave_id] = [Register(tag, addr, modbus_type, operation, mode, slave_id)
+                                             for tag, addr, modbus_type, operation, mode in registers]
+            value = slave_registers
+        config[key] = value
+    return config
+
+
+def resolve_tag_name(reg, is_master):
+    """Tag name used for the generated defines, slave-prefixed in Master mode"""
+    if is_master and reg.slave_id is not None:
+        return f'S{reg.slave_id}_{SLAVE_PREFIX_PATTERN.sub("", reg.tag_name, count=1)}'
+    return reg.tag_name
+
+
+def is_slave_loaded(slave_registers, slave_id):
+    """False only for a lazily loaded project list that was not read yet"""
+    is_loaded = getattr(slave_registers, 'is_loaded', None)
+    return is_loaded is None or is_loaded(slave_id)
+
+
+def get_config_registers(config):
+    """All records of a normalized config, Master slave lists in slave order"""
+    if config.get('is_master'):
+        registers = []
+        for slave_registers in config.get('slave_registers', {}).values():
+            registers.extend(slave_registers)
+        return registers
+    return config.get('registers', [])
+
+
+class RegisterTable:
+    """Records grouped by Modbus type and sorted once, with tag names resolved once"""
+    
+    def __init__(self, registers, is_master=False):
+        self.registers = registers
+        self.by_type = {0: [], 1: [], 3: [], 4: []}
+        for reg in registers:
+            self.by_type[reg.modbus_type].append(reg)
+        
+        self.tag_names = {}
+        self.pairs = {}
+        self.runs = {}
+        for modbus_type, regs in self.by_type.items():
+            regs.sort(key=lambda reg: reg.internal_address)
+            self.tag_names[modbus_type] = [resolve_tag_name(reg, is_master) for reg in regs]
+            
+            # (internal_address, array_index) pairs, first entry wins on duplicates
+            pairs = []
+            for idx, reg in enumerate(regs):
+                if pairs and pairs[-1][0] == reg.internal_address:
+                    continue
+                pairs.append((reg.internal_address, idx))
+            self.pairs[modbus_type] = pairs
+            
+            # Runs where both address and array index are consecutive
+            runs = []
+            for addr, idx in pairs:
+                if runs:
+                    start, count, base = runs[-1]
+                    if addr == start + count and idx == base + count:
+                        runs[-1] = (start, count + 1, base)
+                        continue
+                runs.append((addr, 1, idx))
+            self.runs[modbus_type] = runs
+    
+    @classmethod
+    def from_config(cls, config):
+        """Table over every register of a normalized config"""
+        return cls(get_config_registers(config), config.get('is_master', False))
+
+
+class RegisterIndex:
+    """
+    Hash indexes for duplicate checks, kept in step with the register lists
+    Tag names are unique per slave, addresses per (slave, Modbus type). slave_ids
+    holds the Master slaves whose lists are indexed.
+    """
+    
+    def __init__(self, registers=()):
+        self.tag_names = {}
+        self.addresses = {}
+        self.slave_ids = set()
+        for reg in registers:
+            self.add(reg)
+    
+    @classmethod
+    def from_config(cls, config):
+        """
+        Index of both the Slave mode list and every Master slave list
+        Lists a project file has not loaded yet are skipped, add them once read.
+        """
+        index = cls(config.get('registers', []))
+        slave_registers = config.get('slave_registers', {})
+        for slave_id in slave_registers:
+            if is_slave_loaded(slave_registers, slave_id):
+                index.add_slave(slave_id, slave_registers[slave_id])
+        return index
+    
+    def has_slave(self, slave_id):
+        return slave_id in self.slave_ids
+    
+    def add_slave(self, slave_id, registers):
+        """Index the list of a Master slave, once"""
+        if slave_id not in self.slave_ids:
+            self.slave_ids.add(slave_id)
+            for reg in registers:
+                self.add(reg)
+    
+    def remove_slave(self, slave_id, registers):
+        if slave_id in self.slave_ids:
+            self.slave_ids.discard(slave_id)
+            for reg in registers:
+                self.remove(reg)
+    
+    def add(self, reg):
+        tag_key = (reg.slave_id, reg.tag_name)
+        address_key = (reg.slave_id, reg.modbus_type, reg.internal_address)
+        self.tag_names[tag_key] = self.tag_names.get(tag_key, 0) + 1
+        self.addresses[address_key] = self.addresses.get(address_key, 0) + 1
+    
+    def remove(self, reg):
+        for index, key in ((self.tag_names, (reg.slave_id, reg.tag_name)),
+                           (self.addresses, (reg.slave_id, reg.modbus_type, reg.internal_address))):
+            # Counted, loaded configs may already hold duplicates
+            count = index.get(key, 0)
+            if count > 1:
+                index[key] = count - 1
+            else:
+                index.pop(key, None)
+    
+    def has_tag_name(self, tag_name, slave_id=None):
+        return (slave_id, tag_name) in self.tag_names
+    
+    def has_address(self, internal_address, modbus_type, slave_id=None):
+        return (slave_id, modbus_type, internal_address) in self.addresses
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+modbus_rtu_codec.py
+Host-side Modbus RTU framing mirroring 01_Firmwares/ModbusRTU/modbus_rtu.c and modbus_rtu_master.c
+
+Encoders write a complete ADU, CRC included, into a caller-owned buffer (see
+new_adu_buffer()) and return its length, so polling loops reuse one buffer per
+request. Decoders read from any bytes-like ADU and unpack values into a
+caller-owned destination list (or bytearray for bits).
+"""
+
+import struct
+
+
+# Function codes (modbus_rtu.h)
+FC_READ_COILS = 0x01
+FC_READ_DISCRETE_INPUTS = 0x02
+FC_READ_HOLDING_REGISTERS = 0x03
+FC_READ_INPUT_REGISTERS = 0x04
+FC_WRITE_SINGLE_COIL = 0x05
+FC_WRITE_SINGLE_REGISTER = 0x06
+FC_WRITE_MULTIPLE_COILS = 0x0F
+FC_WRITE_MULTIPLE_REGISTERS = 0x10
+
+# Exception codes (modbus_rtu.h)
+EX_ILLEGAL_FUNCTION = 0x01
+EX_ILLEGAL_DATA_ADDRESS = 0x02
+EX_ILLEGAL_DATA_VALUE = 0x03
+EX_SLAVE_DEVICE_FAILURE = 0x04
+
+EXCEPTION_NAMES = {
+    EX_ILLEGAL_FUNCTION: 'Illegal function',
+    EX_ILLEGAL_DATA_ADDRESS: 'Illegal data address',
+    EX_ILLEGAL_DATA_VALUE: 'Illegal data value',
+    EX_SLAVE_DEVICE_FAILURE: 'Slave device failure'
+}
+
+# Protocol limits (modbus_rtu.h)
+MAX_PDU_LENGTH = 253
+MAX_ADU_LENGTH = 256
+FRAME_MIN_SIZE = 4
+
+BIT_FUNCTION_CODES = (FC_READ_COILS, FC_READ_DISCRETE_INPUTS)
+REGISTER_FUNCTION_CODES = (FC_READ_HOLDING_REGISTERS, FC_READ_INPUT_REGISTERS)
+READ_FUNCTION_CODES = BIT_FUNCTION_CODES + REGISTER_FUNCTION_CODES
+WRITE_FUNCTION_CODES = (FC_WRITE_SINGLE_COIL, FC_WRITE_SINGLE_REGISTER,
+                        FC_WRITE_MULTIPLE_COILS, FC_WRITE_MULTIPLE_REGISTERS)
+
+# Largest quantity one request may carry, as checked by the firmware
+MAX_QUANTITY = {
+    FC_READ_COILS: 2000,
+    FC_READ_DISCRETE_INPUTS: 2000,
+    FC_READ_HOLDING_REGISTERS: 125,
+    FC_READ_INPUT_REGISTERS: 125,
+    FC_WRITE_MULTIPLE_COILS: 1968,
+    FC_WRITE_MULTIPLE_REGISTERS: 123
+}
+
+COIL_ON = 0xFF00
+COIL_OFF = 0x0000
+
+
+class FrameError(ValueError):
+    """Malformed frame, bad CRC, or a response that does not match its request"""
+
+
+class ModbusException(Exception):
+    """Exception response returned by a slave"""
+    
+    def __init__(self, slave_id, function_code, exception_code):
+        self.slave_id = slave_id
+        self.function_code = function_code
+        self.exception_code = exception_code
+        name = EXCEPTION_NAMES.get(exception_code, 'Unknown exception')
+        super().__init__(f'Slave {slave_id} FC{function_code:02X}: {name} ({exception_code:#04x})')
+
+
+def _make_crc16_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+
+# Same values as crc16_table[] in modbus_rtu.c (reflected polynomial 0xA001)
+CRC16_TABLE = _make_crc16_table()
+
+# Low and high table bytes as bytes.translate() tables for the bulk path
+_CRC16_LOW = bytes(value & 0xFF for value in CRC16_TABLE)
+_CRC16_HIGH = bytes(value >> 8 for value in CRC16_TABLE)
+
+# Frames of one length checked together before the bulk path pays off
+BULK_CRC_MIN_FRAMES = 8
+
+_HEADER = struct.Struct('>BBHH')
+_MULTIPLE_HEADER = struct.Struct('>BBHHB')
+_EXCEPTION = struct.Struct('>BBB')
+_CRC = struct.Struct('<H')
+
+# '>nH' register block formats for every quantity a frame can hold
+_REGISTER_STRUCTS = [struct.Struct(f'>{count}H') for count in range(MAX_QUANTITY[FC_READ_HOLDING_REGISTERS] + 1)]
+
+# 0/1 bytes of each byte value's 8 bits, least significant first as on the wire
+_BYTE_BITS = [bytes((value >> bit) & 1 for bit in range(8)) for value in range(256)]
+
+
+def new_adu_buffer():
+    """Buffer large enough for any ADU, for the encoders to write into"""
+    return bytearray(MAX_ADU_LENGTH)
+
+
+def calc_crc(data, length=None):
+    """Modbus CRC16 of data[:length], as modbus_rtu_calc_crc()"""
+    if length is not None:
+        data = data[:length]
+    crc = 0xFFFF
+    table = CRC16_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def check_crc(frame, length=None):
+    """True when the frame ends with its valid CRC, as modbus_rtu_check_crc()"""
+    if length is None:
+        length = len(frame)
+    # The CRC over a frame including its own CRC bytes is always zero
+    return length >= FRAME_MIN_SIZE and calc_crc(frame, length) == 0
+
+
+def _check_crc_columns(frames):
+    """
+    CRC check of equal-length frames, one frame byte position at a time
+    Each step applies the table to every frame at once: the CRC registers are
+    held as a low and a high byte string, XORed as big integers and looked up
+    with bytes.translate().
+    """
+    count = len(frames)
+    length = len(frames[0])
+    joined = b''.join(frames)
+    from_bytes = int.from_bytes
+    
+    low = b'\xff' * count
+    high = b'\xff' * count
+    for position in range(length):
+        index = (from_bytes(low, 'little') ^ from_bytes(joined[position::length], 'little')).to_bytes(count, 'little')
+        low = (from_bytes(high, 'little') ^ from_bytes(index.translate(_CRC16_LOW), 'little')).to_bytes(count, 'little')
+        high = index.translate(_CRC16_HIGH)
+    
+    invalid = (from_bytes(low, 'little') | from_bytes(high, 'little')).to_bytes(count, 'little')
+    return [not value for value in invalid]
+
+
+def check_crc_many(frames):
+    """
+    check_crc() of many frames, e.g. a capture, as a list of bools
+    Frames sharing a length are checked together, several times faster than
+    frame by frame.
+    """
+    results = [False] * len(frames)
+    by_length = {}
+    for i, frame in enumerate(frames):
+        by_length.setdefault(len(frame), []).append(i)
+    
+    for length, indexes in by_length.items():
+        if length < FRAME_MIN_SIZE:
+            continue
+        if len(indexes) < BULK_CRC_MIN_FRAMES:
+            for i in indexes:
+                results[i] = calc_crc(frames[i]) == 0
+            continue
+        valid = _check_crc_columns([bytes(frames[i]) for i in indexes])
+        for i, is_valid in zip(indexes, valid):
+            results[i] = is_valid
+    return results
+
+
+def append_crc(buf, length):
+    """Write the CRC of buf[:length] after it, returns the ADU length"""
+    _CRC.pack_into(buf, length, calc_crc(buf, length))
+    return length + 2
+
+
+def pack_bits(values):
+    """Coil/discrete input values as Modbus bytes, first value in bit 0 of byte 0"""
+    count = len(values)
+    if not count:
+        return b''
+    bits = ''.join(['1' if value else '0' for value in reversed(values)])
+    return int(bits, 2).to_bytes((count + 7) // 8, 'little')
+
+
+def get_response_length(function_code, count):
+    """ADU length of the normal response to a request, for reads from its quantity"""
+    if function_code in BIT_FUNCTION_CODES:
+        return 5 + (count + 7) // 8
+    if function_code in REGISTER_FUNCTION_CODES:
+        return 5 + count * 2
+    return 8
+
+
+def _check_quantity(function_code, count):
+    if not 1 <= count <= MAX_QUANTITY[function_code]:
+        raise ValueError(f'FC{function_code:02X} quantity must be 1-{MAX_QUANTITY[function_code]}, got {count}')
+
+
+def encode_read_request(buf, slave_id, function_code, addr, count):
+    """FC01-FC04 request"""
+    _check_quantity(function_code, count)
+    _HEADER.pack_into(buf, 0, slave_id, function_code, addr, count)
+    return append_crc(buf, 6)
+
+
+def encode_write_single_coil(buf, slave_id, addr, value):
+    """FC05 request, also the slave's echo response"""
+    _HEADER.pack_into(buf, 0, slave_id, FC_WRITE_SINGLE_COIL, addr, COIL_ON if value else COIL_OFF)
+    return append_crc(buf, 6)
+
+
+def encode_write_single_register(buf, slave_id, addr, value):
+    """FC06 request, also the slave's echo response"""
+    _HEADER.pack_into(buf, 0, slave_id, FC_WRITE_SINGLE_REGISTER, addr, value)
+    return append_crc(buf, 6)
+
+
+def encode_write_multiple_coils(buf, slave_id, addr, values):
+    """FC0F request writing values from addr on"""
+    count = len(values)
+    _check_quantity(FC_WRITE_MULTIPLE_COILS, count)
+    data = pack_bits(values)
+    _MULTIPLE_HEADER.pack_into(buf, 0, slave_id, FC_WRITE_MULTIPLE_COILS, addr, count, len(data))
+    buf[7:7 + len(data)] = data
+    return append_crc(buf, 7 + len(data))
+
+
+def encode_write_multiple_registers(buf, slave_id, addr, values):
+    """FC10 request writing values from addr on"""
+    count = len(values)
+    _check_quantity(FC_WRITE_MULTIPLE_REGISTERS, count)
+    _MULTIPLE_HEADER.pack_into(buf, 0, slave_id, FC_WRITE_MULTIPLE_REGISTERS, addr, count, count * 2)
+    _REGISTER_STRUCTS[count].pack_into(buf, 7, *values)
+    return append_crc(buf, 7 + count * 2)
+
+
+def encode_read_bits_response(buf, slave_id, function_code, values):
+    """FC01/FC02 response carrying values"""
+    data = pack_bits(values)
+    _EXCEPTION.pack_into(buf, 0, slave_id, function_code, len(data))
+    buf[3:3 + len(data)] = data
+    return append_crc(buf, 3 + len(data))
+
+
+def encode_read_registers_response(buf, slave_id, function_code, values):
+    """FC03/FC04 response carrying values"""
+    count = len(values)
+    _EXCEPTION.pack_into(buf, 0, slave_id, function_code, count * 2)
+    _REGISTER_STRUCTS[count].pack_into(buf, 3, *values)
+    return append_crc(buf, 3 + count * 2)
+
+
+def encode_write_response(buf, slave_id, function_code, addr, value):
+    """FC05/FC06 echo of address and value, FC0F/FC10 echo of address and quantity"""
+    _HEADER.pack_into(buf, 0, slave_id, function_code, addr, value)
+    return append_crc(buf, 6)
+
+
+def encode_exception_response(buf, slave_id, function_code, exception_code):
+    _EXCEPTION.pack_into(buf, 0, slave_id, function_code | 0x80, exception_code)
+    return append_crc(buf, 3)
+
+
+def decode_bits(adu, offset, count, dest, dest_offset=0):
+    """Unpack count bits starting at adu[offset] into dest as 0/1 values"""
+    data = adu[offset:offset + (count + 7) // 8]
+    dest[dest_offset:dest_offset + count] = b''.join([_BYTE_BITS[byte] for byte in data])[:count]
+
+
+def decode_registers(adu, offset, count, dest, dest_offset=0):
+    """Unpack count big-endian registers starting at adu[offset] into dest"""
+    dest[dest_offset:dest_offset + count] = _REGISTER_STRUCTS[count].unpack_from(adu, offset)
+
+
+def decode_request(adu, length=None):
+    """
+    (slave_id, function_code, addr, count or value) of a request ADU
+    Multiple-write data starts at adu[7]. Unknown function codes are returned
+    too, so a slave can answer them with an exception. Raises FrameError.
+    """
+    if length is None:
+        length = len(adu)
+    if length < 8:
+        raise FrameError(f'Request too short: {length} bytes')
+    if calc_crc(adu, length) != 0:
+        raise FrameError('Request CRC mismatch')
+    
+    slave_id, function_code, addr, count = _HEADER.unpack_from(adu, 0)
+    if function_code in (FC_WRITE_MULTIPLE_COILS, FC_WRITE_MULTIPLE_REGISTERS):
+        if length < 9 or length != 9 + adu[6]:
+            raise FrameError(f'FC{function_code:02X} byte count does not match the frame length')
+    elif length != 8:
+        raise FrameError(f'FC{function_code:02X} request must be 8 bytes, got {length}')
+    return slave_id, function_code, addr, count
+
+
+def decode_response(adu, length, slave_id, function_code, addr, count, dest=None, dest_offset=0):
+    """
+    Check a response against its request and unpack read values into dest
+    count is the written value for FC05/FC06. Returns the number of values read
+    (0 for writes); raises ModbusException for an exception response and
+    FrameError for anything the firmware master would reject.
+    """
+    if length is None:
+        length = len(adu)
+    if length < 5:
+        raise FrameError(f'Response too short: {length} bytes')
+    if calc_crc(adu, length) != 0:
+        raise FrameError('Response CRC mismatch')
+    if adu[0] != slave_id:
+        raise FrameError(f'Response from slave {adu[0]}, expected {slave_id}')
+    if adu[1] == function_code | 0x80:
+        raise ModbusException(slave_id, function_code, adu[2])
+    if adu[1] != function_code:
+        raise FrameError(f'Response FC{adu[1]:02X}, expected FC{function_code:02X}')
+    
+    if function_code in READ_FUNCTION_CODES:
+        expected = get_response_length(function_code, count)
+        if length != expected or adu[2] != expected - 5:
+            raise FrameError(f'FC{function_code:02X} response byte count does not match {count} values')
+        if dest is not None:
+            if function_code in BIT_FUNCTION_CODES:
+                decode_bits(adu, 3, count, dest, dest_offset)
+            else:
+                decode_registers(adu, 3, count, dest, dest_offset)
+        return count
+    
+    if function_code == FC_WRITE_SINGLE_COIL:
+        count = COIL_ON if count else COIL_OFF
+    if length != 8 or _HEADER.unpack_from(adu, 0)[2:] != (addr, count):
+        raise FrameError(f'FC{function_code:02X} echo does not match the request')
+    return 0
+
@@ -0,0 +1,454 @@
+# -*- coding: utf-8 -*-
+"""
+modbus_slave_simulator.py
+Modbus RTU slaves simulated from saved configs, sharing one virtual RS485 bus on a pseudo-terminal
+
+Every slave holds register images sized like the generated modbus_registers.c
+and answers requests like modbus_rtu_slave_process(). All slaves are served by
+one single-threaded loop, so a master opening the pty sees up to 247 slave IDs.
+Requests are checked like the firmware does, which a Master poll plan passes
+unless its config sets MODBUS_BRIDGE_GAPS. --tolerant stands in for third-party
+slaves that answer unmapped addresses, the only targets such a plan is meant
+for. With --native the slaves run the firmware's modbus_rtu.c compiled for the
+host.
+
+Usage: python modbus_slave_simulator.py CONFIG [CONFIG ...] [--link PATH] [--baudrate N] [--no-wire-time]
+                                        [--native | --tolerant]
+"""
+
+import argparse
+import heapq
+import os
+import selectors
+import signal
+import sys
+import time
+import tty
+from bisect import bisect_right
+
+from modbus_bus_model import BusCostModel, get_setting_values
+from modbus_frame_delimiter import EXPECT_REQUESTS, FrameDelimiter, get_silent_intervals_us
+from modbus_native_slave import NativeSlave, build_libraries
+from modbus_project_store import load_config_file
+from modbus_register_model import RegisterTable
+from modbus_rtu_codec import (BIT_FUNCTION_CODES, COIL_OFF, COIL_ON, EX_ILLEGAL_DATA_ADDRESS, EX_ILLEGAL_DATA_VALUE,
+                              EX_ILLEGAL_FUNCTION, FC_WRITE_MULTIPLE_COILS, FC_WRITE_SINGLE_COIL, FC_WRITE_SINGLE_REGISTER,
+                              MAX_QUANTITY, REGISTER_FUNCTION_CODES, FrameError, append_crc, decode_registers,
+                              decode_request, encode_exception_response, encode_read_registers_response,
+                              encode_write_response, new_adu_buffer)
+
+
+BROADCAST_ID = 0
+
+# Register type served by each function code
+FUNCTION_REG_TYPES = {0x01: 0, 0x02: 1, 0x03: 4, 0x04: 3, 0x05: 0, 0x06: 4, 0x0F: 0, 0x10: 4}
+
+READ_CHUNK = 4096
+
+
+def get_int_setting(values, var_name, default):
+    try:
+        return int(values.get(var_name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class SimulatedSlave:
+    """
+    Register images and request handling of one slave
+    Images are sized like the generated arrays: one entry per configured register,
+    bits packed eight to a byte, one placeholder entry for an empty type. With
+    strict=True a request must fall in one run of consecutive addresses, as
+    modbus_get_register_block() checks; otherwise unconfigured addresses read as
+    0 and drop writes, like a third-party device polled with MODBUS_BRIDGE_GAPS.
+    """
+    
+    def __init__(self, slave_id, registers, response_delay_ms=0, strict=True):
+        self.slave_id = slave_id
+        self.response_delay_ms = response_delay_ms
+        self.strict = strict
+        
+        table = RegisterTable(registers)
+        self.counts = {reg_type: len(regs) for reg_type, regs in table.by_type.items()}
+        self.images = {
+            0: bytearray(max(1, (self.counts[0] + 7) // 8)),
+            1: bytearray(max(1, (self.counts[1] + 7) // 8)),
+            3: [0] * max(1, self.counts[3]),
+            4: [0] * max(1, self.counts[4])
+        }
+        self.indexes = {reg_type: dict(pairs) for reg_type, pairs in table.pairs.items()}
+        self.runs = table.runs
+        self.run_starts = {reg_type: [start for start, count, base in runs] for reg_type, runs in table.runs.items()}
+        self.buffer = new_adu_buffer()
+        
+        self.requests = 0
+        self.exceptions = 0
+    
+    def get_block(self, reg_type, addr, count):
+        """Array index of a block inside one run, -1 otherwise like modbus_get_register_block()"""
+        pos = bisect_right(self.run_starts[reg_type], addr) - 1
+        if pos < 0:
+            return -1
+        start, run_count, base = self.runs[reg_type][pos]
+        if addr + count > start + run_count:
+            return -1
+        return base + addr - start
+    
+    def get_indexes(self, reg_type, addr, count):
+        """
+        Array index of each address of a block, None for unconfigured addresses in non-strict mode
+        None when the block is not served at all.
+        """
+        base = self.get_block(reg_type, addr, count)
+        if base >= 0:
+            return range(base, base + count)
+        if self.strict:
+            return None
+        index = self.indexes[reg_type]
+        indexes = [index.get(a) for a in range(addr, addr + count)]
+        if all(idx is None for idx in indexes):
+            return None
+        return indexes
+    
+    def get_value(self, reg_type, addr):
+        idx = self.indexes[reg_type][addr]
+        image = self.images[reg_type]
+        if reg_type in (0, 1):
+            return (image[idx >> 3] >> (idx & 0x07)) & 0x01
+        return image[idx]
+    
+    def set_value(self, reg_type, addr, value):
+        """Set a register as the firmware application would, e.g. to feed an input"""
+        self._set(reg_type, self.indexes[reg_type][addr], value)
+    
+    def _set(self, reg_type, idx, value):
+        image = self.images[reg_type]
+        if reg_type in (0, 1):
+            if value:
+                image[idx >> 3] |= 1 << (idx & 0x07)
+            else:
+                image[idx >> 3] &= ~(1 << (idx & 0x07)) & 0xFF
+        else:
+            image[idx] = value & 0xFFFF
+    
+    def _read_bits(self, reg_type, indexes):
+        image = self.images[reg_type]
+        if isinstance(indexes, range):
+            # Shift the packed bits of the whole block down to bit 0 at once
+            start = indexes.start
+            first = start >> 3
+            last = (start + len(indexes) + 7) >> 3
+            bits = int.from_bytes(image[first:last], 'little') >> (start & 0x07)
+            return bits & ((1 << len(indexes)) - 1)
+        bits = 0
+        for n, idx in enumerate(indexes):
+            if idx is not None and (image[idx >> 3] >> (idx & 0x07)) & 0x01:
+                bits |= 1 << n
+        return bits
+    
+    def handle_request(self, adu, broadcast=False):
+        """
+        Response ADU to a request addressed to this slave, None for broadcasts
+        The request is the same ADU as in modbus_rtu_slave_process(); FrameError is
+        raised for a malformed one, which a slave does not answer.
+        """
+        _, function_code, addr, count = decode_request(adu)
+        self.requests += 1
+        length = self._process(adu, function_code, addr, count)
+        if broadcast:
+            return None
+        if self.buffer[1] & 0x80:
+            self.exceptions += 1
+        return bytes(self.buffer[:length])
+    
+    def _exception(self, function_code, exception_code):
+        return encode_exception_response(self.buffer, self.slave_id, function_code, exception_code)
+    
+    def _process(self, adu, function_code, addr, count):
+        buf = self.buffer
+        reg_type = FUNCTION_REG_TYPES.get(function_code)
+        if reg_type is None:
+            return self._exception(function_code, EX_ILLEGAL_FUNCTION)
+        
+        if function_code in BIT_FUNCTION_CODES or function_code in REGISTER_FUNCTION_CODES:
+            if not 1 <= count <= MAX_QUANTITY[function_code]:
+                return self._exception(function_code, EX_ILLEGAL_DATA_VALUE)
+            indexes = self.get_indexes(reg_type, addr, count)
+            if indexes is None:
+                return self._exception(function_code, EX_ILLEGAL_DATA_ADDRESS)
+            
+            if function_code in BIT_FUNCTION_CODES:
+                byte_count = (count + 7) // 8
+                buf[0] = self.slave_id
+                buf[1] = function_code
+                buf[2] = byte_count
+                buf[3:3 + byte_count] = self._read_bits(reg_type, indexes).to_bytes(byte_count, 'little')
+                return append_crc(buf, 3 + byte_count)
+            
+            image = self.images[reg_type]
+            if isinstance(indexes, range):
+                values = image[indexes.start:indexes.stop]
+            else:
+                values = [0 if idx is None else image[idx] for idx in indexes]
+            return encode_read_registers_response(buf, self.slave_id, function_code, values)
+        
+        if function_code in (FC_WRITE_SINGLE_COIL, FC_WRITE_SINGLE_REGISTER):
+            idx = self.indexes[reg_type].get(addr)
+            if idx is None:
+                return self._exception(function_code, EX_ILLEGAL_DATA_ADDRESS)
+            if function_code == FC_WRITE_SINGLE_COIL:
+                if count not in (COIL_ON, COIL_OFF):
+                    return self._exception(function_code, EX_ILLEGAL_DATA_VALUE)
+                self._set(0, idx, count == COIL_ON)
+            else:
+                self._set(4, idx, count)
+            return encode_write_response(buf, self.slave_id, function_code, addr, count)
+        
+        byte_count = adu[6]
+        expected = (count + 7) // 8 if function_code == FC_WRITE_MULTIPLE_COILS else count * 2
+        if not 1 <= count <= MAX_QUANTITY[function_code] or byte_count != expected:
+            return self._exception(function_code, EX_ILLEGAL_DATA_VALUE)
+        indexes = self.get_indexes(reg_type, addr, count)
+        if indexes is None:
+            return self._exception(function_code, EX_ILLEGAL_DATA_ADDRESS)
+        
+        if function_code == FC_WRITE_MULTIPLE_COILS:
+            bits = int.from_bytes(adu[7:7 + byte_count], 'little')
+            for n, idx in enumerate(indexes):
+                if idx is not None:
+                    self._set(0, idx, (bits >> n) & 0x01)
+        elif isinstance(indexes, range):
+            decode_registers(adu, 7, count, self.images[4], indexes.start)
+        else:
+            values = [0] * count
+            decode_registers(adu, 7, count, values)
+            for idx, value in zip(indexes, values):
+                if idx is not None:
+                    self.images[4][idx] = value
+        return encode_write_response(buf, self.slave_id, function_code, addr, count)
+
+
+def get_config_slaves(config, native=False, tolerant=False):
+    """
+    SimulatedSlaves of a normalized config
+    A Slave config gives one slave at MODBUS_SLAVE_ID, a Master config one per
+    target slave. They are strict like the firmware unless tolerant=True.
+    With native=True every slave is a NativeSlave running the compiled firmware,
+    which is always strict.
+    """
+    values = get_setting_values(config.get('settings', {}))
+    response_delay_ms = get_int_setting(values, 'MODBUS_RESPONSE_DELAY_MS', 0)
+    if config.get('is_master'):
+        slaves = [(int(slave_id), registers) for slave_id, registers in config.get('slave_registers', {}).items()]
+    else:
+        slave_id = get_int_setting(values, 'MODBUS_SLAVE_ID', config.get('slave_id', 1))
+        slaves = [(slave_id, config.get('registers', []))]
+    
+    if native:
+        return [NativeSlave(slave_id, library, response_delay_ms)
+                for (slave_id, _), library in zip(slaves, build_libraries(slaves))]
+    return [SimulatedSlave(slave_id, registers, response_delay_ms, not tolerant) for slave_id, registers in slaves]
+
+
+class SimulatedBus:
+    """
+    Dispatch of delimited request frames to the slaves on one bus
+    With emulate_wire_time a response is held back until it would have been
+    received on the real line: request and response transmission, the T3.5
+    silence the slave waits out and its response delay.
+    """
+    
+    def __init__(self, slaves, cost_model=None, emulate_wire_time=True):
+        self.cost_model = cost_model or BusCostModel()
+        self.slaves = {}
+        for slave in slaves:
+            if not 1 <= slave.slave_id <= 247:
+                raise ValueError(f'Slave ID {slave.slave_id} is not in 1-247')
+            if slave.slave_id in self.slaves:
+                raise ValueError(f'Slave ID {slave.slave_id} is simulated twice')
+            self.slaves[slave.slave_id] = slave
+        self.emulate_wire_time = emulate_wire_time
+        self.t35_us = get_silent_intervals_us(self.cost_model)[1]
+        
+        self.requests = 0
+        self.responses = 0
+        self.broadcasts = 0
+        self.unanswered = 0
+        self.frame_errors = 0
+    
+    def process(self, frame):
+        """(response ADU, delay in seconds after the request was written) or None"""
+        self.requests += 1
+        slave_id = frame[0]
+        try:
+            if slave_id == BROADCAST_ID:
+                # Writes reach every slave, nobody answers
+                self.broadcasts += 1
+                for slave in self.slaves.values():
+                    slave.handle_request(frame, broadcast=True)
+                return None
+            slave = self.slaves.get(slave_id)
+            if slave is None:
+                self.unanswered += 1
+                return None
+            response = slave.handle_request(frame)
+        except FrameError:
+            self.frame_errors += 1
+            return None
+        
+        self.responses += 1
+        delay_us = slave.response_delay_ms * 1000.0
+        if self.emulate_wire_time:
+            char_time_us = self.cost_model.char_time_us
+            delay_us += (len(frame) + len(response)) * char_time_us + self.t35_us
+        return response, delay_us / 1e6
+    
+    def report(self):
+        return {
+            'slaves': len(self.slaves),
+            'requests': self.requests,
+            'responses': self.responses,
+            'exceptions': sum(slave.exceptions for slave in self.slaves.values()),
+            'broadcasts': self.broadcasts,
+            'unanswered': self.unanswered,
+            'frame_errors': self.frame_errors
+        }
+
+
+class PtyBus:
+    """
+    SimulatedBus served on the master side of a pseudo-terminal
+    A master opens .path (or a symlink to it) like a serial port. Baud rate
+    settings made on it are ignored by the pty; wire timing is emulated.
+    """
+    
+    def __init__(self, bus, link=None):
+        self.bus = bus
+        self.delimiter = FrameDelimiter(bus.cost_model, EXPECT_REQUESTS)
+        self.master_fd, self.slave_fd = os.openpty()
+        # Raw mode: no echo, no newline translation
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.path = os.ttyname(self.slave_fd)
+        self.link = link
+        if link:
+            if os.path.islink(link):
+                os.remove(link)
+            os.symlink(self.path, link)
+        
+        self.pending = []   # heap of (due time, sequence, response)
+        self.sequence = 0
+        self.running = False
+    
+    def _handle_frames(self, frames, received):
+        for frame in frames:
+            result = self.bus.process(frame)
+            if result is not None:
+                response, delay_s = result
+                heapq.heappush(self.pending, (received + delay_s, self.sequence, response))
+                self.sequence += 1
+    
+    def _send_due(self, now):
+        while self.pending and self.pending[0][0] <= now:
+            _, _, response = heapq.heappop(self.pending)
+            os.set_blocking(self.master_fd, True)
+            try:
+                os.write(self.master_fd, response)
+            finally:
+                os.set_blocking(self.master_fd, False)
+    
+    def serve(self, duration_s=None):
+        """Serve requests until stop() or for duration_s seconds"""
+        selector = selectors.DefaultSelector()
+        selector.register(self.master_fd, selectors.EVENT_READ)
+        silence_s = self.delimiter.t35_us / 1e6
+        end = None if duration_s is None else time.monotonic() + duration_s
+        self.running = True
+        try:
+            while self.running:
+                now = time.monotonic()
+                if end is not None and now >= end:
+                    break
+                # Wake for the next due response or, with a partial frame, its T3.5 silence
+                timeout = 0.1
+                if self.pending:
+                    timeout = min(timeout, max(0.0, self.pending[0][0] - now))
+                if self.delimiter.length:
+                    timeout = min(timeout, silence_s)
+                if end is not None:
+                    timeout = min(timeout, end - now)
+                
+                if selector.select(timeout):
+                    try:
+                        data = os.read(self.master_fd, READ_CHUNK)
+                    except BlockingIOError:
+                        data = b''
+                    now = time.monotonic()
+                    if data:
+                        self._handle_frames(self.delimiter.feed(data, now * 1e6), now)
+                else:
+                    now = time.monotonic()
+                    self._handle_frames(self.delimiter.poll(now * 1e6), now)
+                self._send_due(now)
+        finally:
+            selector.close()
+    
+    def stop(self):
+        self.running = False
+    
+    def close(self):
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+        for fd in (self.master_fd, self.slave_fd):
+            os.close(fd)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate the slaves of configs on a pseudo-terminal')
+    parser.add_argument('configs', nargs='+', help='JSON configs or project files')
+    parser.add_argument('--link', help='Symlink to create to the pty, e.g. /tmp/ttyMODBUS')
+    parser.add_argument('--baudrate', type=int, help='Emulated baud rate, the first config\'s by default')
+    parser.add_argument('--no-wire-time', action='store_true', help='Answer as fast as possible')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--native', action='store_true',
+                      help='Run the firmware request handler compiled for the host (needs gcc)')
+    mode.add_argument('--tolerant', action='store_true',
+                      help='Answer unconfigured addresses like a third-party slave; the firmware rejects them')
+    parser.add_argument('--duration', type=float, help='Seconds to serve, until interrupted by default')
+    args = parser.parse_args(argv)
+    
+    slaves = []
+    configs = [load_config_file(filename) for filename in args.configs]
+    try:
+        for config in configs:
+            slaves.extend(get_config_slaves(config, args.native, args.tolerant))
+    except (OSError, RuntimeError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    cost_model = BusCostModel.from_settings(configs[0].get('settings', {}))
+    if args.baudrate:
+        cost_model = BusCostModel(args.baudrate, cost_model.data_bits, cost_model.parity, cost_model.stop_bits)
+    
+    try:
+        bus = SimulatedBus(slaves, cost_model, not args.no_wire_time)
+    except ValueError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    
+    pty_bus = PtyBus(bus, args.link)
+    signal.signal(signal.SIGTERM, lambda signum, frame: pty_bus.stop())
+    print(f'Serving {len(bus.slaves)} slaves on {args.link or pty_bus.path}', flush=True)
+    try:
+        pty_bus.serve(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pty_bus.close()
+    
+    for key, value in bus.report().items():
+        print(f'{key:>14}: {value}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
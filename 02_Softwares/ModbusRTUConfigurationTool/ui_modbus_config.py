@@ -228,33 +228,21 @@ class Ui_MainWindow(object):
         
         self.reg_layout.addLayout(self.quick_add_layout)
         
-        # Register Table with enhanced columns
-        self.register_table = QtWidgets.QTableWidget(self.reg_group)
-        self.register_table.setColumnCount(7)  # Increased from 5 to 7
-        self.register_table.setHorizontalHeaderLabels(['Tag Name', 'Internal', 'Mapped', 'Type', 'Operation', 'Mode', 'Actions'])
+        # Register Table, a view over the register model set up by the main window
+        self.register_table = QtWidgets.QTableView(self.reg_group)
         self.register_table.setObjectName("register_table")
+        self.register_table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         
         header = self.register_table.horizontalHeader()
-        header.setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)     # Tag Name
-        header.setSectionResizeMode(1, QtWidgets.QHeaderView.Stretch)     # Internal
-        header.setSectionResizeMode(2, QtWidgets.QHeaderView.Stretch)     # Mapped
-        header.setSectionResizeMode(3, QtWidgets.QHeaderView.Stretch)     # Type
-        header.setSectionResizeMode(4, QtWidgets.QHeaderView.Stretch)     # Operation
-        header.setSectionResizeMode(5, QtWidgets.QHeaderView.Stretch)     # Mode
-        header.setSectionResizeMode(6, QtWidgets.QHeaderView.Stretch)     # Actions
-        
+        header.setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
         header.setStretchLastSection(True)
+        header.setMinimumSectionSize(60)
         
-        # Set proportional widths
-        header.resizeSection(0, 150)  # Tag Name
-        header.resizeSection(1, 80)   # Internal
-        header.resizeSection(2, 80)   # Mapped
-        header.resizeSection(3, 120)  # Type
-        header.resizeSection(4, 80)   # Operation
-        header.resizeSection(5, 80)   # Mode
-        header.resizeSection(6, 80)   # Actions
+        # Fixed row height so large tables never measure rows
+        vertical_header = self.register_table.verticalHeader()
+        vertical_header.setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        vertical_header.setDefaultSectionSize(26)
         
-        header.setMinimumSectionSize(60)
         self.register_table.setMinimumWidth(600)
         
         self.reg_layout.addWidget(self.register_table)
@@ -269,8 +257,8 @@ class Ui_MainWindow(object):
         
         # Ranges Table
         self.ranges_table = QtWidgets.QTableWidget(self.ranges_group)
-        self.ranges_table.setColumnCount(4)
-        self.ranges_table.setHorizontalHeaderLabels(['Start', 'Count', 'Type', 'Efficiency'])
+        self.ranges_table.setColumnCount(5)
+        self.ranges_table.setHorizontalHeaderLabels(['Start', 'Count', 'Type', 'Efficiency', 'Bus Time'])
         self.ranges_table.setObjectName("ranges_table")
         
         ranges_header = self.ranges_table.horizontalHeader()
@@ -278,6 +266,7 @@ class Ui_MainWindow(object):
         ranges_header.setSectionResizeMode(1, QtWidgets.QHeaderView.Stretch)
         ranges_header.setSectionResizeMode(2, QtWidgets.QHeaderView.Stretch)
         ranges_header.setSectionResizeMode(3, QtWidgets.QHeaderView.Stretch)
+        ranges_header.setSectionResizeMode(4, QtWidgets.QHeaderView.Stretch)
         
         ranges_header.setStretchLastSection(True)
         
@@ -285,6 +274,7 @@ class Ui_MainWindow(object):
         ranges_header.resizeSection(1, 80)
         ranges_header.resizeSection(2, 160)
         ranges_header.resizeSection(3, 120)
+        ranges_header.resizeSection(4, 90)
         
         ranges_header.setMinimumSectionSize(70)
         self.ranges_table.setMinimumWidth(400)